@@ -18,302 +18,266 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import math
-from datetime import datetime
+import argparse
+import shutil
+import sys
+from pathlib import Path
+from time import perf_counter, sleep
 
-from ansi.colour import fg, fx
-
-from consoletable import ConsoleTable, ColumnDefinition, TextAlignment
-from filewatcher import FileWatcher
-from gamedata import ProductLicenseSO
-from products import ProductsData, Product
+from startupcache import StartupCache
 from windows_console import enable_coloring_in_windows_console
 
-enable_coloring_in_windows_console()
-
-
-
-def as_price(value: float) -> str:
-    return "-.--$" if value is None else f"{'%.2f' % (value)}$"
-
-
-watcher = FileWatcher()
-
-
-while True:
-    watcher.wait_update()
-    gameData = watcher.gameData
-    saveData = watcher.saveData
-
-    productsData = ProductsData(gameData, saveData)
 
 
+def show_cached_screen(cache: StartupCache):
+    """Shows the last screen of the previous run, while the modules are imported and the current save is loaded.
+    It is replaced by the current report as soon as it is ready."""
+    cached = cache.load_screen()
+    if cached is None:
+        return
+    columns, text = cached
+    if columns > shutil.get_terminal_size((120, 40)).columns:
+        return # the lines would be wrapped
     print("\033c", end="")
-
-    # #############################################################################
-    # ############################### General data ################################
-    # #############################################################################
-
-    print(f"{fg.brightgreen}General game data:{fx.reset}")
-
-    ConsoleTable.print_objects([None], [
-        ColumnDefinition("Save time", lambda _: datetime.fromtimestamp(int(saveData.modificationTime)), alignment=TextAlignment.RIGHT),
-        ColumnDefinition("Game day", lambda _: saveData.progression.currentDay, alignment=TextAlignment.RIGHT),
-        ColumnDefinition("Money"   , lambda _: as_price(saveData.progression.money), alignment=TextAlignment.RIGHT),
-        ColumnDefinition("Level"   , lambda _: saveData.progression.currentStoreLevel, alignment=TextAlignment.RIGHT),
-    ])
-    print()
-
-    # #############################################################################
-    # ############################ Show awaiting bills ############################
-    # #############################################################################
-
-
-    bills = saveData.expenses.bills + saveData.expenses.rents + saveData.expenses.loanRepayments
-
-    if len(bills) > 0:
-        print(f"{fg.brightred}Bills to pay:{fx.reset}")
-
-        ConsoleTable.print_objects(bills, [
-            ColumnDefinition("Expense Day", lambda b: b.date, alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Type"       , lambda b: gameData.playerPaymentTypeLocalization[b.paymentType.value]),
-            ColumnDefinition("Amount"     , lambda b: as_price(b.amount), alignment=TextAlignment.RIGHT),
-        ])
-        print()
-    billsSum = sum([b.amount for b in bills])
-    playerMoneyAfterBills = saveData.progression.money - billsSum
-
-    # #############################################################################
-    # ############################# Show pricing data #############################
-    # #############################################################################
-
-    maxCheckoutsToDo = max([c.checkoutGoalToUnlock for c in gameData.cashiers.byId.values()])
-    exactPrices = saveData.progression.completedCheckoutCount >= maxCheckoutsToDo
-
-    productList: list[Product] = list(productsData.unlocked)
-    if exactPrices:
-        productList = list(filter(lambda p: abs(p.get_sell_price_for_best_profit_per_chance() - p.selling_price()) > 0.01, productList))
-    else:
-        productList = list(filter(lambda p: abs(p.get_best_rounded_price() - p.selling_price()) > 0.01, productList))
-
-    if len(productList) > 0:
-        
-        print(f"{fg.brightred}Products to update prices:{fx.reset}")
-
-        if exactPrices:
-            print(f"{fg.green}Using exact prices because you have reached the maximum checkout goal to hire all cashiers.{fx.reset}")
-        else:
-            remainingCheckouts = maxCheckoutsToDo - saveData.progression.completedCheckoutCount
-            print(f"{fg.green}Using rounded prices because you still need to do {remainingCheckouts} checkout{'s' if remainingCheckouts > 1 else ''} before you can hire all cashiers.{fx.reset}")
-            
-        ConsoleTable.print_objects(productList, [
-            #ColumnDefinition("Id"           , lambda b: b.productSO.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
-            #ColumnDefinition("Lic."         , lambda b: b.productSO.license.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Name"         , lambda b: b.localizedName),
-            ColumnDefinition("Brand"        , lambda b: b.productSO.brand),
-            ColumnDefinition("Curr. $"      , lambda b: as_price(b.selling_price()),
-                                              lambda _: fg.red, alignment=TextAlignment.RIGHT),
-            ColumnDefinition("New $"        , lambda b: as_price(b.get_sell_price_for_best_profit_per_chance() if exactPrices else b.get_best_rounded_price()),
-                                              lambda _: fg.brightgreen, alignment=TextAlignment.RIGHT),
-            #ColumnDefinition("Base price"   , lambda b: as_price(b.productSO.basePrice), alignment=TextAlignment.RIGHT),
-            #ColumnDefinition("Price range"  , lambda b: f"{as_price(b.productSO.minDynamicPrice)} - {as_price(b.productSO.maxDynamicPrice)}", alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Opt/Max rate" , lambda b: f"{round(b.productSO.optimumProfitRate)}%-{str(round(b.productSO.maxProfitRate)).rjust(3)}%", alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Buy $"        , lambda b: as_price(b.currentPrice), alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Opt $"        , lambda b: as_price(b.optimum_price()), alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Opt+ $"       , lambda b: as_price(b.optimum_price_100prcent_sell()), alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Opt00$/chance", lambda b: as_price(b.get_best_rounded_price()) + f"-{str(round(b.get_purchase_chance_of_sell_price(b.get_best_rounded_price()))).rjust(3)}%",
-                                              alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Opt++$/chance", lambda b: as_price(b.get_sell_price_for_best_profit_per_chance()) + f"-{str(round(b.get_purchase_chance_of_sell_price(b.get_sell_price_for_best_profit_per_chance()))).rjust(3)}%",
-                                              alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Max $"        , lambda b: as_price(b.max_price()), alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Curr $/chance", lambda b: as_price(b.selling_price()) + f"-{str(round(b.get_purchase_chance(), 1)).rjust(5)}%", alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Profit/sell"  , lambda b: as_price(b.selling_price() - b.currentPrice), alignment=TextAlignment.RIGHT),
-            #ColumnDefinition("Profit*chance", lambda b: as_price(b.get_profit_per_chance()), alignment=TextAlignment.RIGHT),
-            #ColumnDefinition("Avg cost"     , lambda b: as_price(b.averageCosts), alignment=TextAlignment.RIGHT),
-            #ColumnDefinition("Sell price change", lambda b: "" if b.dailyPriceChange is None else f"{as_price(b.previousPrice)} -> {as_price(b.dailyPriceChange)}"),
-        ])
-        print()
-
-
-
-    # #############################################################################
-    # ############################# Displays to fill ##############################
-    # #############################################################################
-
-    productList: list[Product] = list(productsData.unlocked)
-    productList = list(filter(lambda p: (len(p.displaySlots) == 0 or p.get_nb_displayed_items() < p.get_max_displayed_items_total()), productList)) # keep products with no display slot or when existing slots are not full
-    productList = list(filter(lambda p: (p.get_nb_stored_items() + p.get_nb_unstored_box_items()) > 0, productList)) # keep product that have stock in existing boxes
-    if len(saveData.employees.restockers) > 0: # if there is restockers
-        productList = list(filter(lambda p: p.get_nb_stored_items() < p.get_max_displayed_items_total() - p.get_nb_displayed_items() and p.get_nb_unstored_box_items() > 0, productList)) # keep product that restockers can't fully restock themselves
-
-    if len(productList) > 0:
-        productList = sorted(productList, key=lambda p: p.get_by_license_sort_key())
-
-        if len(saveData.employees.restockers) > 0: # if there is restockers
-            print(f"{fg.brightred}Store shelves that restockers can't fully restock themselves:{fx.reset}")
-        else:
-            print(f"{fg.brightred}Store shelves to fill:{fx.reset}")
-
-        ConsoleTable.print_objects(productList, [
-            #ColumnDefinition("Id"      , lambda b: b.productSO.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
-            #ColumnDefinition("Lic."    , lambda b: b.productSO.license.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Name"    , lambda b: b.localizedName),
-            ColumnDefinition("Brand"   , lambda b: b.productSO.brand),
-            ColumnDefinition("Max/slot", lambda b: b.productSO.productAmountOnDisplay),
-            ColumnDefinition("Display #it #/slot", lambda b: f"{str(b.get_nb_displayed_items()).rjust(2)} [{','.join([str(v) for v in b.get_nb_displayed_items_per_slot()])}]"),
-            ColumnDefinition("Storage #it #boxes #/boxes", lambda b: f"{str(b.get_nb_stored_items()).rjust(3)} {str(b.get_nb_stored_boxes()).rjust(2)} {','.join(['[' + ','.join([str(vv) for vv in v]) + ']' for v in b.get_nb_items_in_stored_boxes()])}"),
-            ColumnDefinition("Unstored", lambda b: f"{str(b.get_nb_unstored_box_items()).rjust(3)} {str(b.get_nb_unstored_boxes()).rjust(2)} [{','.join([str(v) for v in b.get_nb_items_in_unstored_boxes()])}]"),
-        ])
-        print()
-
-
-
-    # #############################################################################
-    # ############################## Boxes to store ###############################
-    # #############################################################################
-
-    productList: list[Product] = list(productsData.unlocked)
-    productList = list(filter(lambda p: p.get_nb_unstored_boxes() > 0 and p.get_nb_box_spots_in_storage() > 0
-                            , productList))
-
-    if len(productList) > 0:
-        productList = sorted(productList, key=lambda p: p.get_by_license_sort_key())
-
-        print(f"{fg.brightred}Boxes to put in storage shelves:{fx.reset}")
-
-        ConsoleTable.print_objects(productList, [
-            #ColumnDefinition("Id"      , lambda b: b.productSO.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
-            #ColumnDefinition("Lic."    , lambda b: b.productSO.license.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Name"    , lambda b: b.localizedName),
-            ColumnDefinition("Brand"   , lambda b: b.productSO.brand),
-            ColumnDefinition("Storage #it #boxes #/boxes", lambda b: f"{str(b.get_nb_stored_items()).rjust(3)} {str(b.get_nb_stored_boxes()).rjust(2)} {','.join(['[' + ','.join([str(vv) for vv in v]) + ']' for v in b.get_nb_items_in_stored_boxes()])}"),
-            ColumnDefinition("Unstored", lambda b: f"{str(b.get_nb_unstored_box_items()).rjust(3)} {str(b.get_nb_unstored_boxes()).rjust(2)} [{','.join([str(v) for v in b.get_nb_items_in_unstored_boxes()])}]"),
-        ])
-        print()
-
-
-
-    # #############################################################################
-    # ############################## Boxes to merge ###############################
-    # #############################################################################
-
-    productList: list[Product] = list(productsData.unlocked)
-    productList = list(filter(lambda p: math.ceil(sum(p.get_nb_items_in_all_nonfull_boxes()) / p.productSO.productAmountOnPurchase) < len(p.get_nb_items_in_all_nonfull_boxes()), productList))
-
-    if len(productList) > 0:
-        productList = sorted(productList, key=lambda p: p.get_by_license_sort_key())
-
-        print(f"{fg.brightred}Boxes to merge contents:{fx.reset}")
-
-        ConsoleTable.print_objects(productList, [
-            #ColumnDefinition("Id"      , lambda b: b.productSO.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
-            #ColumnDefinition("Lic."    , lambda b: b.productSO.license.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Name"    , lambda b: b.localizedName),
-            ColumnDefinition("Brand"   , lambda b: b.productSO.brand),
-            ColumnDefinition("Storage #it #boxes #/boxes", lambda b: f"{str(b.get_nb_stored_items()).rjust(3)} {str(b.get_nb_stored_boxes()).rjust(2)} {','.join(['[' + ','.join([str(vv) for vv in v]) + ']' for v in b.get_nb_items_in_stored_boxes()])}"),
-            ColumnDefinition("Unstored", lambda b: f"{str(b.get_nb_unstored_box_items()).rjust(3)} {str(b.get_nb_unstored_boxes()).rjust(2)} [{','.join([str(v) for v in b.get_nb_items_in_unstored_boxes()])}]"),
-        ])
-        print()
-
-
-
-
-    # #############################################################################
-    # ############################# Show boxes to buy #############################
-    # #############################################################################
-
-
-
-
-    productList: list[Product] = list(productsData.unlocked)
-    productList = list(filter(lambda p: p.get_nb_box_to_buy() > 0, productList))
-
-    if (len(productList) > 0):
-
-        productBuyColumns: list[ColumnDefinition[Product]] = [
-            #ColumnDefinition("Id"      , lambda b: b.productSO.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
-            #ColumnDefinition("Lic."    , lambda b: b.productSO.license.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Name"    , lambda b: b.localizedName),
-            ColumnDefinition("Brand"   , lambda b: b.productSO.brand),
-            ColumnDefinition("To buy"  , lambda b: b.get_nb_box_to_buy(),
-                                        lambda _: fg.boldgreen, alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Total"   , lambda b: as_price(b.get_nb_box_to_buy() * b.currentPrice * b.productSO.productAmountOnPurchase),
-                                        lambda _: fg.boldcyan, alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Unit $"  , lambda b: as_price(b.currentPrice), alignment=TextAlignment.RIGHT),
-            ColumnDefinition("#/box"   , lambda b: b.productSO.productAmountOnPurchase, alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Box $"   , lambda b: as_price(b.currentPrice * b.productSO.productAmountOnPurchase), alignment=TextAlignment.RIGHT),
-            #ColumnDefinition("Prio"    , lambda b: round(b.get_estimated_duration_stock_emptying(), 1), alignment=TextAlignment.RIGHT),
-            #ColumnDefinition("Storage #it #boxes #/boxes", lambda b: f"{str(b.get_nb_stored_items()).rjust(3)} {str(b.get_nb_stored_boxes()).rjust(2)} {','.join(['[' + ','.join([str(vv) for vv in v]) + ']' for v in b.get_nb_items_in_stored_boxes()])}"),
-            #ColumnDefinition("Unstored", lambda b: f"{str(b.get_nb_unstored_box_items()).rjust(3)} {str(b.get_nb_unstored_boxes()).rjust(2)} [{','.join([str(v) for v in b.get_nb_items_in_unstored_boxes()])}]"),
-        ]
-
-        productListUrgentBase = list(filter(lambda p: p.get_nb_box_to_buy() >= p.get_max_storable_boxes() / 2, productList))
-        productListUrgentBase.sort(key=lambda p: p.get_estimated_duration_stock_emptying())
-        productListUrgent: list[Product] = []
-        productListUrgentIds: set[int] = set()
-        productListBuySum = 0
-
-        for p in productListUrgentBase:
-            productTotal = p.get_nb_box_to_buy() * p.currentPrice * p.productSO.productAmountOnPurchase + 1 # +1 for shipping cost, even if it's more complicated than that
-            if productListBuySum + productTotal > playerMoneyAfterBills:
-                break
-            productListUrgent.append(p)
-            productListUrgentIds.add(p.productSO.id)
-            productListBuySum += productTotal
-
-        if len(productListUrgent) > 0:
-            print(f"{fg.brightred}Boxes to buy urgently:{fx.reset}")
-
-            productListUrgent.sort(key=lambda p: p.get_by_license_sort_key())
-            ConsoleTable.print_objects(productListUrgent, productBuyColumns)
-            print(f"{fg.brightblue}Total amount with estimated shipping: {fg.boldcyan}{as_price(productListBuySum)}{fx.reset}")
-            print()
-
-
-        productListNonUrgent = list(filter(lambda p: not p.productSO.id in productListUrgentIds, productList))
-        if len(productListNonUrgent) > 0:
-            print(f"{fg.red}Boxes to buy eventually:{fx.reset}")
-
-            productListNonUrgent.sort(key=lambda p: p.get_by_license_sort_key())
-            total = sum([b.get_nb_box_to_buy() * b.currentPrice * b.productSO.productAmountOnPurchase for b in productListNonUrgent])
-            ConsoleTable.print_objects(productListNonUrgent, productBuyColumns)
-            print(f"{fg.brightblue}Total amount without shipping: {fg.boldcyan}{as_price(total)}{fx.reset}")
-            print()
-
-
-
-
-    # #############################################################################
-    # ############################ Show next licenses #############################
-    # #############################################################################
-
-
-
-    unlockableLicenses: list[ProductLicenseSO] = list(filter(lambda l: l.id not in saveData.progression.unlockedLicenses and saveData.progression.currentStoreLevel >= l.requiredPlayerLevel, gameData.licenses.byId.values()))
-
-    if (len(unlockableLicenses) > 0):
-        print(f"{fg.brightgreen}Next unlockable licenses:{fx.reset}")
-
-        licenseColumns: list[ColumnDefinition[ProductLicenseSO]] = [
-            ColumnDefinition("License: Id"        , lambda l: l.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Cost"              , lambda l: as_price(l.purchasingCost), alignment=TextAlignment.RIGHT)
-        ]
-
-        productColumns: list[ColumnDefinition[Product]] = [
-            ColumnDefinition("Products: Name"     , lambda b: b.localizedName),
-            ColumnDefinition("Brand"              , lambda b: b.productSO.brand),
-            ColumnDefinition("Price (min-max)"    , lambda b: f"{as_price(b.productSO.minDynamicPrice).rjust(7)}-{as_price(b.productSO.maxDynamicPrice).rjust(7)}", alignment=TextAlignment.RIGHT),
-            ColumnDefinition("#/box"              , lambda b: b.productSO.productAmountOnPurchase, alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Box price (min-max)", lambda b: f"{as_price(b.productSO.minDynamicPrice * b.productSO.productAmountOnPurchase).rjust(7)}-{as_price(b.productSO.maxDynamicPrice * b.productSO.productAmountOnPurchase).rjust(7)}", alignment=TextAlignment.RIGHT),
-            ColumnDefinition("Box size (#/stor.)" , lambda b: f"{b.productSO.boxSize.name.lower()} ({gameData.boxes.byBoxSize[b.productSO.boxSize].boxCountInStorage})"),
-            ColumnDefinition("Display"            , lambda b: gameData.displayTypeLocalization[b.productSO.productDisplayType.value]),
-            ColumnDefinition("#/display"          , lambda b: b.productSO.productAmountOnDisplay),
-        ]
-
-        for l in unlockableLicenses:
-            ConsoleTable.print_objects([l], licenseColumns)
-            ConsoleTable.print_objects([productsData.byId[pSO.id] for pSO in l.products], productColumns)
-            print()
-
-
-
+    print(text)
+    print("\033[2m(last report of the previous run, loading the current save...)\033[0m", flush=True)
+
+
+
+def export_price_sweep(watcher, path: Path, nbPrices: int, allProducts: bool):
+    from pricesweep import PriceSweep
+    from products import ProductsData
+    while watcher.gameData is None or watcher.saveData is None:
+        watcher.wait_update()
+    start = perf_counter()
+    sweep = PriceSweep(PriceSweep.get_products(ProductsData(watcher.gameData, watcher.saveData), allProducts), nbPrices)
+    sweep.write(path)
+    print(f"Price sweep of {len(sweep.products)} products written to {path} in {perf_counter() - start:.2f}s.", file=sys.stderr)
+
+
+
+def run_backtest(es3Password: str, directory: Path, strategies):
+    from backtest import print_backtest_results, run_backtest
+    from gamedata import GameData
+    from savedirectory import SaveDirectoryIndex
+    index = SaveDirectoryIndex(directory)
+    index.refresh()
+    savePaths = [e.path for e in reversed(index.get_history())]
+    if len(savePaths) < 2:
+        print(f"The backtest needs at least two saves in {directory}, found {len(savePaths)}.", file=sys.stderr)
+        return
+    start = perf_counter()
+    results = run_backtest(GameData.get_path(), savePaths, strategies, es3Password)
+    print_backtest_results(results)
+    print(f"{len(strategies)} strategies evaluated on {len(savePaths)} saves in {perf_counter() - start:.2f}s.", file=sys.stderr)
+
+
+
+def parse_list(itemType):
+    return lambda text: [itemType(v) for v in text.split(",")]
+
+
+
+def main():
+    enable_coloring_in_windows_console()
+
+    argParser = argparse.ArgumentParser(prog="SupermarketAssistant", description="Tells you what to do next in your supermarket, each time the game is saved.")
+    argParser.add_argument("--output", choices=["console", "interactive", "ndjson"], default="console",
+                           help="console: colored tables in the terminal (default). interactive: same, but the sections can be collapsed, "
+                                "scrolled, sorted and filtered with the keyboard. ndjson: one JSON report per line on the standard output.")
+    argParser.add_argument("--socket", metavar="PATH",
+                           help="also publish the NDJSON reports on a local Unix socket at the provided path.")
+    argParser.add_argument("--deltas", action="store_true",
+                           help="after the first whole report, only publish the changes of each NDJSON report.")
+    argParser.add_argument("--web", metavar="PORT", type=int,
+                           help="serve a dashboard page showing the reports, on the provided port.")
+    argParser.add_argument("--web-host", metavar="HOST", default="127.0.0.1",
+                           help="address the dashboard listens on (default: 127.0.0.1, only this computer). Use 0.0.0.0 to access it from the local network.")
+    argParser.add_argument("--sales-forecast", action="store_true",
+                           help="simulate the sales of the next game day at the current and the new prices, after each save.")
+    argParser.add_argument("--restock-forecast", action="store_true",
+                           help="simulate the customers and the restockers during the next game day, to show the shelves that will be empty before they are refilled.")
+    argParser.add_argument("--customers-per-day", metavar="N", type=float, default=150,
+                           help="average number of customers per day, for the sales forecast and the license profit estimates (default: %(default)s).")
+    argParser.add_argument("--products-per-customer", metavar="N", type=float, default=3,
+                           help="average number of products each customer looks for, for the sales forecast and the license profit estimates (default: %(default)s).")
+    argParser.add_argument("--forecast-days", metavar="N", type=int, default=5000,
+                           help="number of days simulated for the sales forecast (default: %(default)s).")
+    argParser.add_argument("--price-steps", metavar="LIST", type=parse_list(float),
+                           help="comma separated price steps (for example 1,0.5,0.05): also show the best price of each product rounded to each step.")
+    argParser.add_argument("--no-precompute", action="store_true",
+                           help="do not compute in advance the report of the next day, with the announced buying prices.")
+    argParser.add_argument("--cash-horizon", metavar="N", type=int, default=7,
+                           help="number of upcoming game days of the money projection (default: %(default)s).")
+    argParser.add_argument("--export-price-sweep", metavar="PATH", type=Path,
+                           help="write the purchase chance and the profit per chance of each unlocked product, for a grid of prices "
+                                "from its buying price to its max price, then exit. CSV if PATH ends with .csv, binary arrays otherwise.")
+    argParser.add_argument("--sweep-prices", metavar="N", type=int, default=200,
+                           help="number of prices of the grid for each product, for --export-price-sweep (default: %(default)s).")
+    argParser.add_argument("--sweep-all-products", action="store_true",
+                           help="export the price sweep of all the products, not only the unlocked ones.")
+    argParser.add_argument("--backtest", action="store_true",
+                           help="compare the profit the recommendations would have made between the saves of the save folder, "
+                                "for each combination of the --grid-* values, then exit.")
+    argParser.add_argument("--backtest-dir", metavar="PATH", type=Path,
+                           help="folder of the saves replayed by --backtest (default: the save folder of the game).")
+    argParser.add_argument("--grid-rounding", metavar="LIST", type=parse_list(float), default=[0.9, 0.95, 1.0],
+                           help="comma separated rounded price tolerances tested by --backtest: an integer price is accepted down to this "
+                                "fraction of the optimum price (default: 0.9,0.95,1.0).")
+    argParser.add_argument("--grid-urgency", metavar="LIST", type=parse_list(float), default=[0.25, 0.5, 0.75],
+                           help="comma separated storage ratios tested by --backtest: the boxes to buy of a product are urgent when they fill "
+                                "at least this fraction of its storage slots (default: 0.25,0.5,0.75).")
+    argParser.add_argument("--grid-exact", metavar="LIST", type=parse_list(str), default=["cashiers", "always", "never"],
+                           help="comma separated exact price modes tested by --backtest, among cashiers (when all checkouts are automated), "
+                                "always and never (default: cashiers,always,never).")
+    argParser.add_argument("--metrics", metavar="PORT", type=int,
+                           help="serve metrics about the running assistant (refreshes, parse and analysis times, memory, ...) "
+                                "in the Prometheus text format on http://localhost:PORT/metrics.")
+    argParser.add_argument("--metrics-file", metavar="PATH", type=Path,
+                           help="write the same metrics to the provided file every 10 seconds.")
+    argParser.add_argument("--memory-log", metavar="PATH", type=Path,
+                           help="trace the memory allocations, and append to this file the retained memory after each refresh "
+                                "and the allocation sites that grew the most (slower).")
+    argParser.add_argument("--cache-dir", metavar="PATH", type=Path, default=StartupCache.get_default_directory(),
+                           help="folder of the files kept between two runs to start faster (default: %(default)s).")
+    argParser.add_argument("--no-cache", action="store_true",
+                           help="do not read nor write the cache files.")
+    argParser.add_argument("--exit-after-first-report", action="store_true",
+                           help=argparse.SUPPRESS) # used by the startup time benchmark
+    args = argParser.parse_args()
+    if args.price_steps is not None and any(step <= 0 for step in args.price_steps):
+        argParser.error("argument --price-steps: the steps must be positive")
+    if args.cash_horizon < 1:
+        argParser.error("argument --cash-horizon: must be at least 1")
+    if args.sweep_prices < 2:
+        argParser.error("argument --sweep-prices: must be at least 2")
+    if any(e not in ("cashiers", "always", "never") for e in args.grid_exact):
+        argParser.error("argument --grid-exact: the values must be among cashiers, always and never")
+
+    cache = StartupCache(args.cache_dir) if not args.no_cache else None
+    if cache is not None and args.output == "console" and args.export_price_sweep is None and not args.backtest:
+        show_cached_screen(cache)
+
+    # the other modules are imported after the first screen is shown, and only if needed
+    from config import Config
+    from filewatcher import FileWatcher
+    from report import Report
+
+    config = Config.load()
+    if args.backtest:
+        from backtest import make_strategy_grid
+        from savefile import SaveData
+        run_backtest(config.es3Password, args.backtest_dir or SaveData.saveDirIndex.directory,
+                     make_strategy_grid(args.grid_rounding, args.grid_urgency, args.grid_exact))
+        return
+    watcher = FileWatcher(config.es3Password, cache)
+
+    if args.export_price_sweep is not None:
+        export_price_sweep(watcher, args.export_price_sweep, args.sweep_prices, args.sweep_all_products)
+        return
+
+    memoryLog = None
+    if args.memory_log is not None:
+        from memorydiagnostics import MemoryLog
+        memoryLog = MemoryLog(args.memory_log) # started before the first load, to trace the memory it keeps
+
+    view = None
+    if args.output == "console":
+        from viewport import ConsoleReportView
+        view = ConsoleReportView(cache)
+    elif args.output == "interactive":
+        from viewport import ReportViewport
+        view = ReportViewport()
+
+    stream = None
+    if args.output == "ndjson" or args.socket is not None or args.web is not None:
+        from reportstream import ReportStream, StdoutReportOutput, UnixSocketReportOutput
+        stream = ReportStream(args.deltas)
+        if args.output == "ndjson":
+            stream.add_output(StdoutReportOutput())
+        if args.socket is not None:
+            stream.add_output(UnixSocketReportOutput(args.socket))
+        if args.web is not None:
+            from webdashboard import WebDashboardReportOutput
+            dashboard = WebDashboardReportOutput(args.web_host, args.web)
+            stream.add_output(dashboard)
+            print(f"Dashboard available at {dashboard.get_url()}", file=sys.stderr)
+
+    from salessimulator import CustomerModel, SalesSimulator
+    customerModel = CustomerModel(args.customers_per_day, args.products_per_customer)
+    salesSimulator = SalesSimulator(customerModel, args.forecast_days) if args.sales_forecast else None
+    restockerSimulator = None
+    if args.restock_forecast:
+        from restockersimulator import RestockerSimulator
+        restockerSimulator = RestockerSimulator(customerModel)
+
+    from products import RecommendedPriceCache
+    priceCache = RecommendedPriceCache() # shared by the reports, most of the products keep their buying price from a save to the next
+    precomputer = None
+    if view is not None and not args.no_precompute:
+        from nextday import NextDayPrecomputer
+        precomputer = NextDayPrecomputer(lambda gameData, saveData: Report(gameData, saveData, customerModel, cashFlowHorizon=args.cash_horizon,
+                                                                           priceSteps=args.price_steps, priceCache=priceCache, nextDay=True))
+
+    metrics = None
+    metricsOutputs = []
+    if args.metrics is not None or args.metrics_file is not None:
+        from metrics import SessionMetrics
+        from metricsserver import MetricsFileWriter, MetricsHttpServer
+        metrics = SessionMetrics(watcher.stats)
+        if args.metrics is not None:
+            metricsServer = MetricsHttpServer(metrics, "127.0.0.1", args.metrics)
+            metricsOutputs.append(metricsServer)
+            print(f"Metrics available at {metricsServer.get_url()}", file=sys.stderr)
+        if args.metrics_file is not None:
+            metricsOutputs.append(MetricsFileWriter(metrics, args.metrics_file))
+
+    try:
+        while True:
+            watcher.wait_update(view.idle if view is not None else sleep)
+            if watcher.gameData is None or watcher.saveData is None:
+                continue # one of the files could not be loaded, the error is already shown
+            if precomputer is not None:
+                nextDayReport = precomputer.get_report(watcher.saveData)
+                if nextDayReport is not None:
+                    view.set_report(nextDayReport) # shown while the report of the new day is computed
+            start = perf_counter()
+            report = Report(watcher.gameData, watcher.saveData, customerModel, salesSimulator, cashFlowHorizon=args.cash_horizon,
+                            restockerSimulator=restockerSimulator, priceSteps=args.price_steps,
+                            priceCache=priceCache) # kept by the view, to be redrawn when the terminal is resized
+            if metrics is not None:
+                metrics.observe_report(report, perf_counter() - start)
+
+            if view is not None:
+                view.set_report(report)
+
+            if stream is not None:
+                stream.publish(report)
+
+            if precomputer is not None:
+                precomputer.submit((watcher.gameDataFingerprint, watcher.saveDataFingerprint), watcher.gameData, watcher.saveData)
+
+            if memoryLog is not None:
+                memoryLog.observe_refresh()
+
+            if args.exit_after_first_report:
+                return
+    finally:
+        if memoryLog is not None:
+            memoryLog.close()
+        if precomputer is not None:
+            precomputer.close()
+        if stream is not None:
+            stream.close()
+        for output in metricsOutputs:
+            output.close()
+        if salesSimulator is not None:
+            salesSimulator.close()
+
+
+
+if __name__ == "__main__":
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support() # the cold start loads the files in worker processes, also from the packaged executable
+    main()
@@ -19,6 +19,9 @@
 # SOFTWARE.
 
 
+from bisect import bisect_left
+
+
 
 def lerp(y0: float, y1: float, x: float): 
     return y0 + (y1 - y0) * x
@@ -82,6 +85,23 @@ class AnimationCurve:
                     return AnimationCurve.evaluate_between_kf(lerpT, kf0, kf1)
         return self.keys[-1].value
 
+    def evaluate_many(self, ts: list[float]) -> list[float]:
+        """Evaluates the curve at each of the provided times, with the same result as evaluate.
+        The keyframes around each time are found with a binary search instead of a scan of the keyframes."""
+        keyTimes = [k.time for k in self.keys]
+        values: list[float] = []
+        for t in ts:
+            i = bisect_left(keyTimes, t)
+            if i == 0:
+                values.append(self.keys[0].value)
+            elif i == len(keyTimes):
+                values.append(self.keys[-1].value)
+            else:
+                kf0 = self.keys[i - 1]
+                kf1 = self.keys[i]
+                values.append(AnimationCurve.evaluate_between_kf(inverse_lerp(kf0.time, kf1.time, t), kf0, kf1))
+        return values
+
     # sourced from https://discussions.unity.com/t/what-is-the-math-behind-animationcurve-evaluate/72058/3       
     @staticmethod
     def evaluate_between_kf(t: float, kf0: Keyframe, kf1: Keyframe):
@@ -0,0 +1,180 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import itertools
+import os
+from pathlib import Path
+
+from ansi.colour import fg
+
+from gamedata import GameData
+from products import ProductsData, StrategyParams
+from cashflow import CashFlowProjection
+from consoletable import ColumnDefinition, ConsoleTable, TextAlignment
+from savefile import SaveData
+
+
+
+class ProductInterval:
+    """What happened to a product between two saves. The sold items are estimated from the stock decrease,
+    so they are underestimated if boxes of the product were bought between the two saves."""
+
+    def __init__(self, productId: int, stock: int, soldItems: int, ranOut: bool, actualPrice: float, actualChance: float):
+        self.productId = productId
+        self.stock = stock # items at the start of the interval
+        self.soldItems = soldItems
+        self.ranOut = ranOut
+        self.actualPrice = actualPrice
+        self.actualChance = actualChance
+
+
+
+class SaveInterval:
+    """Two consecutive saves, and what happened to each product between them."""
+
+    def __init__(self, before: ProductsData, after: ProductsData):
+        self.productsData = before
+        self.days = max(0, after.saveData.progression.currentDay - before.saveData.progression.currentDay)
+        self.moneyAfterBills = before.saveData.progression.money - CashFlowProjection.get_pending_expenses_cost(before.saveData)
+        self.products: list[ProductInterval] = []
+        for p in before.unlocked:
+            if p.currentPrice is None or p.selling_price() is None:
+                continue
+            stock = p.get_nb_items_total()
+            stockAfter = after.byId[p.productSO.id].get_nb_items_total()
+            self.products.append(ProductInterval(p.productSO.id, stock, max(0, stock - stockAfter), stock > 0 and stockAfter == 0,
+                                                 p.selling_price(), min(100.0, p.get_purchase_chance())))
+
+
+
+class BacktestResult:
+
+    def __init__(self, strategy: StrategyParams, pricingProfit: float, recoveredProfit: float, actualProfit: float):
+        self.strategy = strategy
+        self.pricingProfit = pricingProfit # profit of the observed sales, at the recommended prices
+        self.recoveredProfit = recoveredProfit # profit of the sales lost to stock-outs that the urgent purchases would have avoided
+        self.actualProfit = actualProfit # profit of the observed sales, at the prices of the player
+
+    def get_total(self) -> float:
+        return self.pricingProfit + self.recoveredProfit
+
+
+
+class Backtest:
+    """Replays a series of saves to compare sets of StrategyParams on what actually happened between them.
+
+    For each interval between two saves, the items sold at the price set by the player are scaled by the
+    ratio of the purchase chances at the recommended price and at the player price, up to the available
+    stock. When a product ran out of stock and the urgent purchases of the first save would have included
+    it, the sales lost until the next save are added, at the average daily sales of the product."""
+
+    def __init__(self, gameData: GameData, saves: list[SaveData]):
+        saves = sorted(saves, key=lambda s: s.modificationTime)
+        productsDatas = [ProductsData(gameData, s) for s in saves]
+        self.intervals = [SaveInterval(before, after) for before, after in zip(productsDatas, productsDatas[1:])]
+
+        soldItems: dict[int, int] = {}
+        days: dict[int, int] = {}
+        for interval in self.intervals:
+            for p in interval.products:
+                if not p.ranOut:
+                    soldItems[p.productId] = soldItems.get(p.productId, 0) + p.soldItems
+                    days[p.productId] = days.get(p.productId, 0) + interval.days
+        self.averageDailySales = {pId: soldItems[pId] / days[pId] for pId in soldItems if days[pId] > 0}
+
+    @staticmethod
+    def load(gamePath: Path, savePaths: list[Path], es3Password: str = None) -> "Backtest":
+        gameData = GameData.from_file(gamePath, es3Password)
+        return Backtest(gameData, [SaveData.from_file(path, gameData, es3Password) for path in savePaths])
+
+    def evaluate(self, strategy: StrategyParams) -> BacktestResult:
+        pricingProfit = 0.0
+        recoveredProfit = 0.0
+        actualProfit = 0.0
+        for interval in self.intervals:
+            productsData = interval.productsData
+            productsData.set_strategy(strategy)
+            urgentIds = {p.productSO.id for p in productsData.get_urgent_purchases(interval.moneyAfterBills)[0]}
+            for observed in interval.products:
+                p = productsData.byId[observed.productId]
+                price = p.get_recommended_price()
+                margin = price - p.currentPrice
+                chanceRatio = min(100.0, p.get_purchase_chance_of_sell_price(price)) / observed.actualChance if observed.actualChance > 0 else 1.0
+                pricingProfit += min(observed.stock, observed.soldItems * chanceRatio) * margin
+                actualProfit += observed.soldItems * (observed.actualPrice - p.currentPrice)
+                if observed.ranOut and observed.productId in urgentIds:
+                    recoveredProfit += self.averageDailySales.get(observed.productId, 0.0) * chanceRatio * interval.days * margin
+        return BacktestResult(strategy, pricingProfit, recoveredProfit, actualProfit)
+
+
+
+def make_strategy_grid(roundedPriceTolerances: list[float], urgentStorageRatios: list[float], exactPrices: list[str]) -> list[StrategyParams]:
+    return [StrategyParams(r, u, e) for r, u, e in itertools.product(roundedPriceTolerances, urgentStorageRatios, exactPrices)]
+
+
+
+_workerBacktest: Backtest = None
+
+def _init_worker(gamePath: Path, savePaths: list[Path], es3Password: str):
+    """Loads the saves once in each worker process."""
+    global _workerBacktest
+    _workerBacktest = Backtest.load(gamePath, savePaths, es3Password)
+
+def _evaluate_in_worker(strategies: list[StrategyParams]) -> list[BacktestResult]:
+    return [_workerBacktest.evaluate(s) for s in strategies]
+
+def run_backtest(gamePath: Path, savePaths: list[Path], strategies: list[StrategyParams], es3Password: str = None,
+                 workers: int = None) -> list[BacktestResult]:
+    """Evaluates each strategy on the saves, the best total profit first. The strategies are split between
+    worker processes that each load the saves once, unless there is only one worker or a few strategies."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(strategies) < 2 * workers:
+        backtest = Backtest.load(gamePath, savePaths, es3Password)
+        results = [backtest.evaluate(s) for s in strategies]
+    else:
+        from concurrent.futures import ProcessPoolExecutor # only imported when needed, it takes a noticeable part of the startup time
+        chunks = [strategies[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(gamePath, savePaths, es3Password)) as pool:
+            results = [r for chunkResults in pool.map(_evaluate_in_worker, chunks) for r in chunkResults]
+    return sorted(results, key=lambda r: -r.get_total())
+
+
+
+def print_backtest_results(results: list[BacktestResult], nbResults: int = 10):
+    """Prints the best strategies, and the default one if it is not among them."""
+    default = StrategyParams()
+    shown = results[:nbResults] + [r for r in results[nbResults:] if repr(r.strategy) == repr(default)]
+    ranks = {id(r): i + 1 for i, r in enumerate(results)}
+    actual = results[0].actualProfit if results else 0.0
+    right = TextAlignment.RIGHT
+    ConsoleTable.print_objects(shown, [
+        ColumnDefinition("Rank", lambda r: ranks[id(r)], alignment=right),
+        ColumnDefinition("Rounding", lambda r: r.strategy.roundedPriceTolerance, alignment=right),
+        ColumnDefinition("Urgent at storage", lambda r: f"{r.strategy.urgentStorageRatio:.0%}", alignment=right),
+        ColumnDefinition("Exact prices", lambda r: r.strategy.exactPrices),
+        ColumnDefinition("Pricing profit", lambda r: f"${r.pricingProfit:.2f}", alignment=right),
+        ColumnDefinition("Stock-outs avoided", lambda r: f"${r.recoveredProfit:.2f}", alignment=right),
+        ColumnDefinition("Total", lambda r: f"${r.get_total():.2f}", alignment=right),
+        ColumnDefinition("vs actual", lambda r: f"{r.get_total() - actual:+.2f}", lambda r: fg.green if r.get_total() >= actual else fg.red, alignment=right),
+        ColumnDefinition("", lambda r: "default" if repr(r.strategy) == repr(default) else ""),
+    ])
+    print(f"Actual profit of the observed sales, at the prices of the saves: ${actual:.2f}")
@@ -0,0 +1,266 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Performance checks of the assistant, with a time budget for each measure.
+Run with `python src/benchmark.py` (the game data and a save must be present, like for the assistant itself).
+The exit code is 1 if a measure is over its budget."""
+
+import argparse
+import contextlib
+import io
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from collections.abc import Callable
+
+from ansi.colour import fg, fx
+
+from consoletable import ColumnDefinition, ConsoleTable, TextAlignment
+
+
+
+class BenchmarkResult:
+
+    def __init__(self, name: str, value: float, budget: float, unit: str = "s"):
+        self.name = name
+        self.value = value
+        self.budget = budget
+        self.unit = unit
+
+    def passed(self) -> bool:
+        return self.value <= self.budget
+
+
+
+# ### Startup
+
+STARTUP_IMPORT_BUDGET = 0.100 # cumulated import time of the modules imported by the entry point
+STARTUP_FIRST_FRAME_BUDGET = 0.300 # with a cached screen, from the process launch to the first output
+STARTUP_FIRST_REPORT_BUDGET = 2.000 # with the cached game data, from the process launch to the end of the first report
+
+def get_command(executable: Path) -> list[str]:
+    """The command to start the assistant: the packaged executable if provided, or the sources with the current interpreter."""
+    if executable is not None:
+        return [str(executable)]
+    return [sys.executable, str(Path(__file__).parent)]
+
+def get_import_time(stderr: str) -> float:
+    """Total time of the top level imports, from the output of python -X importtime."""
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line.split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit() and not fields[2].startswith("  "):
+            total += int(fields[1]) # cumulative time, in microseconds
+    return total / 1e6
+
+def run_until_first_report(command: list[str]) -> tuple[float, float, str]:
+    """Starts the assistant until its first report. Return the time to the first output,
+    the time to the end of the process, and the error output."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command + ["--exit-after-first-report"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    process.stdout.read(1)
+    firstFrame = time.perf_counter() - start
+    _, stderr = process.communicate(timeout=60)
+    end = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"{command} exited with code {process.returncode}:\n{stderr.decode(errors='replace')}")
+    return firstFrame, end, stderr.decode(errors="replace")
+
+def benchmark_startup(executable: Path) -> list[BenchmarkResult]:
+    with tempfile.TemporaryDirectory() as cacheDir:
+        command = get_command(executable) + ["--cache-dir", cacheDir]
+        _, coldEnd, _ = run_until_first_report(command) # fills the cache
+        if executable is None:
+            command = command[:1] + ["-X", "importtime"] + command[1:]
+        firstFrame, end, stderr = run_until_first_report(command)
+    results = [
+        BenchmarkResult("Startup: first report, no cache", coldEnd, float("inf")),
+        BenchmarkResult("Startup: first frame (cached screen)", firstFrame, STARTUP_FIRST_FRAME_BUDGET),
+        BenchmarkResult("Startup: first report", end, STARTUP_FIRST_REPORT_BUDGET),
+    ]
+    if executable is None:
+        results.insert(0, BenchmarkResult("Startup: imports", get_import_time(stderr), STARTUP_IMPORT_BUDGET))
+    return results
+
+
+
+# ### Table layout
+
+TABLE_LAYOUT_RATIO_BUDGET = 1.1 # time of ConsoleTable.print_raw, relative to the previous layout (print_raw_reference), with a margin for the timing noise
+
+def fit_widths_reference(widths: list[int], available: int) -> list[int]:
+    """The previous column fitting of ConsoleTable: the widest column loses one character at a time."""
+    widths = list(widths)
+    while sum(widths) > available:
+        widths[widths.index(max(widths))] -= 1
+    return widths
+
+def print_raw_reference(cellsText: list[list[str]], cellsColor: list[list[str]], cellsAlignments: list[list[TextAlignment]], screenWidth: int):
+    """The previous ConsoleTable.print_raw, kept to measure the current one against it: it printed each cell separately."""
+    widths = []
+    for i in range(max([len(r) for r in cellsText])):
+        widths.append(max([len(r[i]) if i < len(r) else 0 for r in cellsText]))
+    widths = fit_widths_reference(widths, screenWidth - 2 - 2 * len(widths))
+    for r in range(len(cellsText)):
+        for c in range(len(cellsText[r])):
+            text = cellsText[r][c]
+            width = widths[c]
+            if len(text) > width:
+                text = text[0:width-3] + f"{fg.gray}..."
+            else:
+                text = cellsAlignments[r][c].apply_alignment(text, width)
+            print(f"  {cellsColor[r][c]}{text}{fx.reset}", end="")
+        print()
+
+def make_table(rows: int, columns: int, maxLength: int, rng: random.Random) -> tuple[list[list[str]], list[list[str]], list[list[TextAlignment]]]:
+    texts = [["x" * rng.randint(1, maxLength) for _ in range(columns)] for _ in range(rows)]
+    colors = [[fg.green] * columns for _ in range(rows)]
+    alignments = [[TextAlignment.RIGHT if c % 2 else TextAlignment.LEFT for c in range(columns)] for _ in range(rows)]
+    return texts, colors, alignments
+
+def time_printing(fn: Callable[[], None], repeats: int = 5) -> float:
+    """Best time of fn, with the standard output captured."""
+    best = float("inf")
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+def benchmark_table_layout() -> list[BenchmarkResult]:
+    """The current table layout against the previous one, on 500 rows and 14 columns, for wide and very narrow terminals.
+    Also checks that both give the same column widths."""
+    rng = random.Random(1)
+    results: list[BenchmarkResult] = []
+    for maxLength, screenWidth in [(40, 200), (40, 40), (400, 80), (400, 40)]:
+        table = make_table(500, 14, maxLength, rng)
+        old = time_printing(lambda: print_raw_reference(*table, screenWidth))
+        new = time_printing(lambda: ConsoleTable.print_raw(*table, screenWidth=screenWidth))
+        results.append(BenchmarkResult(f"Table layout: cells up to {maxLength} chars, {screenWidth} cols", new / old, TABLE_LAYOUT_RATIO_BUDGET, "x"))
+    mismatches = 0
+    for _ in range(2000):
+        widths = [rng.randint(1, 60) for _ in range(rng.randint(1, 20))]
+        available = rng.randint(len(widths), sum(widths) + 10) # the previous loop never stopped below 1 character per column
+        mismatches += ConsoleTable.fit_column_widths(widths, available) != fit_widths_reference(widths, available)
+    results.append(BenchmarkResult("Table layout: widths different from the previous layout", mismatches, 0, "cases"))
+    return results
+
+
+
+# ### Save to report
+
+SAVE_TO_REPORT_P50_BUDGET = 1.300 # from the write of a save to its report, the watcher waits 1s for the game to finish writing
+SAVE_TO_REPORT_P90_BUDGET = 1.600
+
+def benchmark_replay(executable: Path, recordingPath: Path, speed: float) -> list[BenchmarkResult]:
+    """Replays a recording made with replay.py, if one is provided."""
+    if recordingPath is None:
+        return []
+    from replay import Recording, SaveReplayer, get_percentile
+    samples = SaveReplayer(Recording.load(recordingPath), get_command(executable), speed).replay()
+    latencies = [s.latency if s.latency is not None else float("inf") for s in samples]
+    if len(latencies) == 0:
+        return []
+    return [
+        BenchmarkResult("Save to report: p50", get_percentile(latencies, 50), SAVE_TO_REPORT_P50_BUDGET),
+        BenchmarkResult("Save to report: p90", get_percentile(latencies, 90), SAVE_TO_REPORT_P90_BUDGET),
+        BenchmarkResult("Save to report: max", max(latencies), float("inf")),
+    ]
+
+
+
+# ### Memory
+
+MEMORY_GROWTH_BUDGET = 1.0 # MiB retained in addition over the measured refreshes, after a first pass that fills the caches
+
+def benchmark_memory(recordingPath: Path, refreshes: int) -> list[BenchmarkResult]:
+    """Replays the refreshes in this process with tracemalloc, if enabled. Prints the allocation sites that grow the most."""
+    if refreshes is None:
+        return []
+    from config import Config
+    from memorydiagnostics import run_memory_diagnostics
+    diagnostics = run_memory_diagnostics(refreshes, recordingPath, Config.load().es3Password)
+    topGrowing = diagnostics.get_top_growing()
+    if len(topGrowing) > 0:
+        print(f"Top growing allocation sites over {refreshes} refreshes:")
+        ConsoleTable.print_objects(topGrowing, [
+            ColumnDefinition("Site" , lambda d: str(d.traceback[0])),
+            ColumnDefinition("Size" , lambda d: f"{d.size_diff / 1024:+.1f} KiB", alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Count", lambda d: f"{d.count_diff:+d}", alignment=TextAlignment.RIGHT),
+        ])
+        print()
+    mib = 1 << 20
+    results: list[BenchmarkResult] = []
+    for stage in diagnostics.stages.values():
+        results.append(BenchmarkResult(f"Memory: {stage.name}, steady state", stage.get_steady_state() / mib, float("inf"), "MiB"))
+        results.append(BenchmarkResult(f"Memory: {stage.name}, peak", stage.peak / mib, float("inf"), "MiB"))
+    results.append(BenchmarkResult(f"Memory: growth over {refreshes} refreshes", diagnostics.get_growth() / mib, MEMORY_GROWTH_BUDGET, "MiB"))
+    return results
+
+
+
+BENCHMARKS: list[Callable[[argparse.Namespace], list[BenchmarkResult]]] = [
+    lambda args: benchmark_table_layout(),
+    lambda args: benchmark_startup(args.executable),
+    lambda args: benchmark_replay(args.executable, args.recording, args.replay_speed),
+    lambda args: benchmark_memory(args.recording, args.memory),
+]
+
+def main() -> int:
+    argParser = argparse.ArgumentParser(prog="benchmark", description="Measures the performance of SupermarketAssistant against time budgets.")
+    argParser.add_argument("--executable", metavar="PATH", type=Path,
+                           help="packaged executable to measure, instead of the sources (the import time is then not measured).")
+    argParser.add_argument("--recording", metavar="PATH", type=Path,
+                           help="also replay this recording of saves (see replay.py) and measure the time from each save to its report.")
+    argParser.add_argument("--replay-speed", metavar="N", type=float, default=10.0,
+                           help="replay the recording N times faster than recorded (default: %(default)s).")
+    argParser.add_argument("--table-layout", action="store_true",
+                           help="only compare the console table layout with the previous one (no game data needed).")
+    argParser.add_argument("--memory", metavar="N", type=int, nargs="?", const=20,
+                           help="also replay N refreshes (default: %(const)s) in this process with tracemalloc, the saves of --recording"
+                                " or else the last save, and check that the retained memory does not grow.")
+    args = argParser.parse_args()
+    if args.memory is not None and args.memory < 1:
+        argParser.error("argument --memory: must be at least 1")
+
+    results: list[BenchmarkResult] = []
+    for benchmark in (BENCHMARKS if not args.table_layout else [lambda _: benchmark_table_layout()]):
+        results += benchmark(args)
+
+    ConsoleTable.print_objects(results, [
+        ColumnDefinition("Measure", lambda r: r.name),
+        ColumnDefinition("Value"  , lambda r: f"{r.value:.3f} {r.unit}", alignment=TextAlignment.RIGHT),
+        ColumnDefinition("Budget" , lambda r: f"{r.budget:.3f} {r.unit}" if r.budget != float("inf") else "-", alignment=TextAlignment.RIGHT),
+        ColumnDefinition("Result" , lambda r: "OK" if r.passed() else "OVER BUDGET", lambda r: fg.green if r.passed() else fg.red),
+    ])
+
+    return 0 if all(r.passed() for r in results) else 1
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from itertools import accumulate
+
+from savefile import Expense, SaveData
+
+
+
+class CashFlowScenario:
+    """The money at the end of each projected day, if something is bought now."""
+
+    def __init__(self, name: str, upfrontCost: float, dailyProfitChange: float, balances: list[float]):
+        self.name = name
+        self.upfrontCost = upfrontCost
+        self.dailyProfitChange = dailyProfitChange
+        self.balances = balances # index 0 is now, after paying the pending expenses and the upfront cost
+        self.lowestDay = min(range(len(balances)), key=lambda d: balances[d])
+        self.lowest = balances[self.lowestDay]
+        self.shortDay = next((d for d, b in enumerate(balances) if b < 0), None) # first day without enough money
+
+
+
+class CashFlowProjection:
+    """Projects the money of the player day by day, over a number of upcoming game days.
+
+    Now, the pending expenses are paid, with their late payment fee if they are from a previous day.
+    Then each day, the store earns its estimated daily profit, and pays the daily wage of the hired
+    cashiers. The bills and the rents come back on the days of their period (see get_expense_schedule).
+
+    The base flows are summed once. A scenario only adds an upfront cost and a change of the daily
+    profit, so its balances are derived from the base balances without summing the days again."""
+
+    # the period of a bill or a rent that appears on a single day of the save can't be known, it is assumed to be daily
+    DEFAULT_EXPENSE_PERIOD = 1
+
+    def __init__(self, saveData: SaveData, storeDailyProfit: float, horizon: int = 7):
+        self.saveData = saveData
+        self.horizon = horizon
+        self.storeDailyProfit = storeDailyProfit
+        self.pendingExpenses = CashFlowProjection.get_pending_expenses_cost(saveData)
+        self.dailyWages = CashFlowProjection.get_daily_wages(saveData)
+        schedules = CashFlowProjection.get_expense_schedules(saveData)
+        self.dailyExpenses = sum(amount / period for period, amount, _ in schedules) # average, for the summary
+        currentDay = saveData.progression.currentDay
+        flows = [storeDailyProfit - self.dailyWages - CashFlowProjection.get_expenses_of_day(schedules, currentDay + d) for d in range(1, horizon + 1)]
+        self.baseBalances = list(accumulate([saveData.progression.money - self.pendingExpenses] + flows))
+
+    @staticmethod
+    def get_expenses(saveData: SaveData) -> list[Expense]:
+        expenses = saveData.expenses
+        return expenses.bills + expenses.rents + expenses.loanRepayments
+
+    @staticmethod
+    def get_pending_expenses_cost(saveData: SaveData) -> float:
+        currentDay = saveData.progression.currentDay
+        return sum(e.get_amount_to_pay(currentDay) for e in CashFlowProjection.get_expenses(saveData))
+
+    @staticmethod
+    def get_daily_wages(saveData: SaveData) -> float:
+        cashiers = saveData.gameData.cashiers.byId
+        return sum(cashiers[c].dailyWage for c in saveData.employees.cashiers if c in cashiers)
+
+    @staticmethod
+    def get_expense_schedule(expenses: list[Expense]) -> tuple[int, float, int]:
+        """(period in days, amount, last day) of a recurring expense, from its expenses in the save: it comes back with
+        the amount of its last day, every average number of days between its days in the save, or every DEFAULT_EXPENSE_PERIOD
+        days if it is on a single day."""
+        days = sorted({e.date for e in expenses})
+        lastDay = days[-1]
+        period = round((lastDay - days[0]) / (len(days) - 1)) if len(days) > 1 else CashFlowProjection.DEFAULT_EXPENSE_PERIOD
+        return max(1, period), sum(e.amount for e in expenses if e.date == lastDay), lastDay
+
+    @staticmethod
+    def get_expense_schedules(saveData: SaveData) -> list[tuple[int, float, int]]:
+        """The schedules of the bills and the rents. The loans end, they are not repeated."""
+        return [CashFlowProjection.get_expense_schedule(expenses) for expenses in (saveData.expenses.bills, saveData.expenses.rents) if len(expenses) > 0]
+
+    @staticmethod
+    def get_expenses_of_day(schedules: list[tuple[int, float, int]], day: int) -> float:
+        return sum(amount for period, amount, lastDay in schedules if day > lastDay and (day - lastDay) % period == 0)
+
+    def project(self, name: str, upfrontCost: float = 0.0, dailyProfitChange: float = 0.0) -> CashFlowScenario:
+        return CashFlowScenario(name, upfrontCost, dailyProfitChange,
+                                [b - upfrontCost + d * dailyProfitChange for d, b in enumerate(self.baseBalances)])
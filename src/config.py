@@ -0,0 +1,51 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import configparser
+from pathlib import Path
+
+
+
+class Config:
+    """User configuration, read from the optional 'SupermarketAssistant.ini' file
+    in the working directory (the folder of the executable when launched from the explorer).
+
+    Example of configuration file:
+
+        [es3]
+        # Password of the ES3 encryption, if the game saves are encrypted
+        password = mypassword
+    """
+
+    def __init__(self, parser: configparser.ConfigParser = None):
+        if parser is None:
+            parser = configparser.ConfigParser()
+        self.es3Password: str = parser.get("es3", "password", fallback=None)
+
+    @staticmethod
+    def get_path() -> Path:
+        return Path.cwd().joinpath("SupermarketAssistant.ini")
+
+    @staticmethod
+    def load() -> "Config":
+        parser = configparser.ConfigParser()
+        parser.read(Config.get_path(), encoding="utf-8") # silently ignored if the file does not exist
+        return Config(parser)
@@ -0,0 +1,111 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import sys
+import time
+from typing import Union
+
+
+
+class KeyReader:
+    """Reads single key presses from the console, without waiting for the enter key.
+
+    Must be used as a context manager: on POSIX systems, the terminal is switched
+    to non-canonical mode inside the with block. Special keys are returned by name
+    ("up", "down", "left", "right", "pageup", "pagedown", "home", "end", "tab",
+    "enter", "escape", "backspace"), other keys as the typed character."""
+
+    def __enter__(self):
+        if os.name == 'nt':
+            return self
+        import termios
+        self.fd = sys.stdin.fileno()
+        self.oldAttributes = termios.tcgetattr(self.fd)
+        attributes = termios.tcgetattr(self.fd)
+        attributes[3] &= ~(termios.ICANON | termios.ECHO) # lflags
+        attributes[6][termios.VMIN] = 1
+        attributes[6][termios.VTIME] = 0
+        termios.tcsetattr(self.fd, termios.TCSANOW, attributes)
+        return self
+
+    def __exit__(self, *exc):
+        if os.name != 'nt':
+            import termios
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.oldAttributes)
+
+    def read_key(self, timeout: float) -> Union[str, None]:
+        """Wait at most timeout seconds for a key press. Return None if no key was pressed."""
+        if os.name == 'nt':
+            return self.read_key_windows(timeout)
+        return self.read_key_posix(timeout)
+
+    def read_key_windows(self, timeout: float) -> Union[str, None]:
+        import msvcrt
+        end = time.monotonic() + timeout
+        while not msvcrt.kbhit():
+            if time.monotonic() >= end:
+                return None
+            time.sleep(0.02)
+        c = msvcrt.getwch()
+        if c in ("\x00", "\xe0"): # prefix of special keys
+            return _WINDOWS_SPECIAL_KEYS.get(msvcrt.getwch())
+        return _CONTROL_KEYS.get(c, c)
+
+    def read_key_posix(self, timeout: float) -> Union[str, None]:
+        import select
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return None
+        c = os.read(self.fd, 1).decode("utf-8", "replace")
+        if c != "\x1b":
+            return _CONTROL_KEYS.get(c, c)
+        # escape sequence of a special key, or the escape key alone
+        sequence = ""
+        while select.select([self.fd], [], [], 0.02)[0]:
+            sequence += os.read(self.fd, 1).decode("utf-8", "replace")
+            if sequence[-1].isalpha() or sequence[-1] == "~":
+                break
+        if sequence == "":
+            return "escape"
+        return _POSIX_ESCAPE_SEQUENCES.get(sequence)
+
+
+
+_CONTROL_KEYS = {
+    "\t": "tab",
+    "\r": "enter",
+    "\n": "enter",
+    "\x1b": "escape",
+    "\x08": "backspace",
+    "\x7f": "backspace",
+}
+
+_WINDOWS_SPECIAL_KEYS = {
+    "H": "up", "P": "down", "K": "left", "M": "right",
+    "I": "pageup", "Q": "pagedown", "G": "home", "O": "end",
+}
+
+_POSIX_ESCAPE_SEQUENCES = {
+    "[A": "up", "[B": "down", "[D": "left", "[C": "right",
+    "[5~": "pageup", "[6~": "pagedown",
+    "[H": "home", "[F": "end", "[1~": "home", "[4~": "end", "OH": "home", "OF": "end",
+    "[Z": "backtab",
+}
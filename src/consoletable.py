@@ -19,7 +19,7 @@
 # SOFTWARE.
 
 import enum
-import os
+import shutil
 from typing import TypeVar, Generic, Any
 from collections.abc import Callable
 
@@ -59,41 +59,86 @@ class ColumnDefinition(Generic[R]):
 class ConsoleTable:
 
     @staticmethod
-    def print_raw(cellsText: list[list[str]], cellsColor: list[list[str]] = [], cellsAlignments: list[list[TextAlignment]] = []):
-        screen_w = os.get_terminal_size().columns
+    def get_screen_width() -> int:
+        """Width of the terminal, or a default width when the output is not a terminal."""
+        return shutil.get_terminal_size((120, 24)).columns
 
+    @staticmethod
+    def fit_column_widths(widths: list[int], available: int) -> list[int]:
+        """Shrinks the widest columns until the sum of the widths fits in the available width.
+
+        Gives the same result as decrementing the (leftmost) widest column one character at
+        a time, but computes the final level of the widest columns with one pass over the
+        sorted widths. Columns are never shrunk below 1 character."""
+        total = sum(widths)
+        if total <= available or len(widths) == 0:
+            return list(widths)
+        # find the smallest level such that capping all columns to it still uses at least the available width
+        sortedWidths = sorted(widths, reverse=True)
+        rest = total
+        level = 1
+        for k in range(1, len(sortedWidths) + 1):
+            rest -= sortedWidths[k - 1] # sum of the widths of the columns that are not capped
+            nextWidth = sortedWidths[k] if k < len(sortedWidths) else 0
+            level = max(-((rest - available) // k), 1) # ceil((available - rest) / k)
+            if level >= nextWidth:
+                break
+        fitted = [min(w, level) for w in widths]
+        # the leftmost columns at the level lose one more character, to exactly fit
+        extra = sum(fitted) - available
+        for i in range(len(fitted)):
+            if extra <= 0 or level <= 1:
+                break
+            if fitted[i] == level:
+                fitted[i] -= 1
+                extra -= 1
+        return fitted
+
+    @staticmethod
+    def render_raw(cellsText: list[list[str]], cellsColor: list[list[str]] = [], cellsAlignments: list[list[TextAlignment]] = [], screenWidth: int = None) -> str:
+        """Renders the table as a single string, with one line per row (without trailing new line)."""
         if cellsText is None or len(cellsText) == 0:
-            return
+            return ""
+        if screenWidth is None:
+            screenWidth = ConsoleTable.get_screen_width()
         
         # compute column widths
-        widths = []
-        for i in range(max([len(r) for r in cellsText])):
-            widths.append(max([len(r[i]) if i < len(r) else 0 for r in cellsText]))
+        widths = [0] * max([len(r) for r in cellsText])
+        for r in cellsText:
+            for i, text in enumerate(r):
+                if len(text) > widths[i]:
+                    widths[i] = len(text)
         
         # shrink widest columns
-        while sum(widths) > screen_w - 2 - 2 * len(widths):
-            widths[widths.index(max(widths))] -= 1
-        right_pad = screen_w - sum(widths) - 2 * len(widths)
+        widths = ConsoleTable.fit_column_widths(widths, screenWidth - 2 - 2 * len(widths))
         
-        # actually print
+        lines: list[str] = []
         for r in range(len(cellsText)):
             lineCellsText = cellsText[r]
             lineCellsColor = cellsColor[r] if r < len(cellsColor) else []
             lineCellsAlignment = cellsAlignments[r] if r < len(cellsAlignments) else []
+            cells: list[str] = []
             for c in range(len(lineCellsText)):
                 text = lineCellsText[c]
                 color = lineCellsColor[c] if c < len(lineCellsColor) else ""
                 alignment = lineCellsAlignment[c] if c < len(lineCellsAlignment) else TextAlignment.get_default()
                 width = widths[c]
                 if (len(text) > width):
-                    text = text[0:width-3] + f"{fg.gray}..."
+                    text = text[0:width-3] + f"{fg.gray}..." if width > 3 else text[0:width]
                 else:
                     text = alignment.apply_alignment(text, width)
-                print(f"  {color}{text}{fx.reset}", end="")
-            print()
+                cells.append(f"  {color}{text}{fx.reset}")
+            lines.append("".join(cells))
+        return "\n".join(lines)
+
+    @staticmethod
+    def print_raw(cellsText: list[list[str]], cellsColor: list[list[str]] = [], cellsAlignments: list[list[TextAlignment]] = [], screenWidth: int = None):
+        if cellsText is None or len(cellsText) == 0:
+            return
+        print(ConsoleTable.render_raw(cellsText, cellsColor, cellsAlignments, screenWidth))
 
     @staticmethod
-    def print_objects(rows: list[R], columns: list[ColumnDefinition[R]]):
+    def get_cells(rows: list[R], columns: list[ColumnDefinition[R]]) -> tuple[list[list[str]], list[list[str]], list[list[TextAlignment]]]:
 
         texts: list[list[str]] = []
         colors: list[list[str]] = []
@@ -114,4 +159,42 @@ class ConsoleTable:
             colors.append(rowColors)
             alignments.append(rowAlignments)
 
-        ConsoleTable.print_raw(texts, colors, alignments)
+        return texts, colors, alignments
+
+    @staticmethod
+    def render_objects(rows: list[R], columns: list[ColumnDefinition[R]], screenWidth: int = None) -> str:
+        return ConsoleTable.render_raw(*ConsoleTable.get_cells(rows, columns), screenWidth)
+
+    @staticmethod
+    def print_objects(rows: list[R], columns: list[ColumnDefinition[R]], screenWidth: int = None):
+        print(ConsoleTable.render_objects(rows, columns, screenWidth))
+
+
+
+class CachedObjectsTable(Generic[R]):
+    """A table of objects whose cell texts are computed only once per object,
+    so the table can be rendered again (other terminal width, other subset of rows)
+    without evaluating the columns again."""
+
+    def __init__(self, columns: list[ColumnDefinition[R]]):
+        self.columns = columns
+        texts, colors, alignments = ConsoleTable.get_cells([], columns)
+        self.headerCells = (texts[0], colors[0], alignments[0])
+        self.rowCells: dict[int, tuple[list[str], list[str], list[TextAlignment]]] = {} # by id() of the objects
+
+    def get_row_cells(self, row: R) -> tuple[list[str], list[str], list[TextAlignment]]:
+        key = id(row)
+        if key not in self.rowCells:
+            texts, colors, alignments = ConsoleTable.get_cells([row], self.columns)
+            self.rowCells[key] = (texts[1], colors[1], alignments[1])
+        return self.rowCells[key]
+
+    def render(self, rows: list[R], screenWidth: int = None) -> str:
+        texts, colors, alignments = self.headerCells
+        cellsText, cellsColor, cellsAlignments = [texts], [colors], [alignments]
+        for r in rows:
+            texts, colors, alignments = self.get_row_cells(r)
+            cellsText.append(texts)
+            cellsColor.append(colors)
+            cellsAlignments.append(alignments)
+        return ConsoleTable.render_raw(cellsText, cellsColor, cellsAlignments, screenWidth)
@@ -0,0 +1,119 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import heapq
+from enum import Enum
+
+from products import Product, ProductsData
+from salessimulator import ProductProfitModel
+
+
+
+class DisplayAllocation:
+    """How many display slots a product has, and how many it should have."""
+
+    def __init__(self, product: Product, salesPerDay: float, currentSlots: int, proposedSlots: int):
+        self.product = product
+        self.salesPerDay = salesPerDay
+        self.currentSlots = currentSlots
+        self.proposedSlots = proposedSlots
+
+
+
+class DisplayPlanner:
+    """Proposes how many display slots each product should get, among the slots of the furniture of the store.
+
+    The game data don't tell which type of display a furniture is, so it is deduced from the products
+    already placed on the furnitures with the same id. The slots of a furniture that never held a product
+    are not assigned.
+
+    For each display type, each product gets one slot if there are enough slots for all of them (a product without
+    slot is not sold anymore), then the remaining slots are given one by one to the product whose cost decreases the most with
+    one more slot, with a heap. The cost of a product for a day is the profit of the sales lost when its slots
+    are empty before they are refilled, plus the refill trips (one trip each time all its slots are emptied).
+    Both decrease less and less with each slot, so the greedy assignment is close to the best one, and it
+    only takes a heap operation per slot."""
+
+    def __init__(self, productsData: ProductsData, profitModel: ProductProfitModel, refillsPerDay: float = 1.0, refillTripCost: float = 1.0):
+        self.productsData = productsData
+        self.profitModel = profitModel
+        self.refillsPerDay = refillsPerDay # how many times the player (or the restockers) fill the shelves each day
+        self.refillTripCost = refillTripCost # cost of a refill trip, in money
+
+    def get_furniture_display_types(self) -> dict[int, Enum]:
+        displayTypes: dict[int, Enum] = {}
+        for display in self.productsData.saveData.progression.displayDatas:
+            if display.furnitureId not in displayTypes:
+                for slot in display.displaySlots:
+                    if slot.productId is not None:
+                        displayTypes[display.furnitureId] = self.productsData.byId[slot.productId].productSO.productDisplayType
+                        break
+        return displayTypes
+
+    def get_slot_counts(self) -> dict[Enum, int]:
+        displayTypes = self.get_furniture_display_types()
+        slotCounts: dict[Enum, int] = {}
+        for display in self.productsData.saveData.progression.displayDatas:
+            displayType = displayTypes.get(display.furnitureId)
+            if displayType is not None:
+                slotCounts[displayType] = slotCounts.get(displayType, 0) + len(display.displaySlots)
+        return slotCounts
+
+    def get_cost(self, salesPerDay: float, perSlot: int, margin: float, nbSlots: int) -> float:
+        sold = min(salesPerDay, nbSlots * perSlot * self.refillsPerDay)
+        trips = sold / (nbSlots * perSlot) if nbSlots > 0 else 0.0
+        return (salesPerDay - sold) * max(0.0, margin) + trips * self.refillTripCost
+
+    def allocate(self, products: list[tuple[Product, float]], nbSlots: int) -> list[int]:
+        """Number of slots of each (product, sales per day), for a number of slots of their display type."""
+        minimum = 1 if nbSlots >= len(products) else 0
+        allocated = [minimum] * len(products)
+
+        def get_gain(i: int) -> float:
+            product, salesPerDay = products[i]
+            perSlot = product.productSO.productAmountOnDisplay
+            margin = self.profitModel.get_profit_terms(product)[2]
+            return self.get_cost(salesPerDay, perSlot, margin, allocated[i]) - self.get_cost(salesPerDay, perSlot, margin, allocated[i] + 1)
+
+        heap = [(-get_gain(i), i) for i in range(len(products))]
+        heapq.heapify(heap)
+        for _ in range(nbSlots - minimum * len(products)):
+            if len(heap) == 0:
+                break
+            _, i = heapq.heappop(heap)
+            allocated[i] += 1
+            heapq.heappush(heap, (-get_gain(i), i))
+        return allocated
+
+    def plan(self) -> list[DisplayAllocation]:
+        """The proposed slots of each unlocked product with a known buying price, whose display type is in the store."""
+        candidates = [p for p in self.productsData.unlocked if p.currentPrice is not None]
+        visits = self.profitModel.get_visits_per_product(len(candidates))
+        byDisplayType: dict[Enum, list[tuple[Product, float]]] = {}
+        for p in candidates:
+            byDisplayType.setdefault(p.productSO.productDisplayType, []).append((p, visits * self.profitModel.get_profit_terms(p)[0]))
+
+        allocations: list[DisplayAllocation] = []
+        for displayType, nbSlots in self.get_slot_counts().items():
+            products = byDisplayType.get(displayType, [])
+            for (p, salesPerDay), proposed in zip(products, self.allocate(products, nbSlots)):
+                allocations.append(DisplayAllocation(p, salesPerDay, len(p.displaySlots), proposed))
+        return allocations
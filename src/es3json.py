@@ -18,20 +18,317 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import re, yaml
-
-def load_es3_json_file(path):
-    """Loads a JSON encoded ES3 ('Easy save 3') file.
-    May badly interpret strings containing tabs or the '([0-9]+):' pattern."""
-    with open(path, encoding="utf-8") as fp:
-        raw = fp.read()
-    # The file is in JSON format, but not exactly: ES3 ('Easy save 3'
-    # from Unity Asset Store) does not wrap int keys of objects into
-    # double quotes, so this is not technically valid JSON. It turns
-    # out that JSON is almost a subset of the YAML specs, that accepts
-    # unquoted keys. But we still have to convert the imput data to make it
-    # fully YAML complient: replace tabs with spaces and put a space after
-    # a column for integer keys
-    raw = raw.replace("\t", " ") # removing tabs
-    raw = re.sub(r"([0-9]+):", "\\1: ", raw) # add space after ":"
-    return yaml.load(raw, yaml.SafeLoader) # treating bad JSON as YAML
\ No newline at end of file
+
+import hashlib, json, mmap, os, re, zlib
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+
+class FileFingerprint:
+    """Size and content hash of a file, to detect a file rewritten with the exact same content."""
+
+    def __init__(self, size: int, digest: bytes):
+        self.size = size
+        self.digest = digest
+
+    def __eq__(self, other):
+        return isinstance(other, FileFingerprint) and self.size == other.size and self.digest == other.digest
+
+    def __repr__(self):
+        return f"FileFingerprint({self.size}, {self.digest.hex()})"
+
+
+def fingerprint_buffer(buffer) -> FileFingerprint:
+    """Computes the fingerprint of a buffer (bytes or memory mapped file)."""
+    return FileFingerprint(len(buffer), hashlib.blake2b(buffer, digest_size=16).digest())
+
+
+@contextmanager
+def mapped_file(path):
+    """Memory maps the provided file in read only mode.
+    The returned buffer is only valid inside the with block."""
+    with open(path, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            yield b"" # empty files can't be mapped
+            return
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield buffer
+
+
+def load_es3_json_file(path, password: str = None):
+    """Loads an ES3 ('Easy save 3') file, optionally compressed and/or encrypted."""
+    with mapped_file(path) as buffer:
+        return parse_es3_file_content(buffer, password)
+
+
+def parse_es3_file_content(buffer, password: str = None):
+    """Parses the content of an ES3 file, that may be gzip compressed and/or AES encrypted
+    (with the 'Compression' and 'Encryption' settings of ES3Settings).
+
+    Compressed and encrypted files are decoded chunk by chunk while being parsed, so the
+    whole decoded content is never held in memory."""
+    fileFormat = detect_es3_format(buffer)
+    if fileFormat == ES3Format.PLAIN:
+        if not password:
+            return parse_es3_json(buffer)
+        try:
+            return parse_es3_json(buffer)
+        except ValueError:
+            # the random IV of an encrypted file may start like a JSON document
+            try:
+                return _parse_encrypted(buffer, password)
+            except ValueError:
+                pass
+            raise
+    if fileFormat == ES3Format.ENCRYPTED:
+        if not password:
+            raise ValueError("The ES3 file is encrypted, but no password is configured.")
+        return _parse_encrypted(buffer, password)
+    return parse_es3_json_chunks(_decompress_chunks(_iter_buffer_chunks(buffer)))
+
+
+def _parse_encrypted(buffer, password: str):
+    chunks = _decrypt_chunks(_iter_buffer_chunks(buffer), password)
+    # when both settings are enabled, ES3 compresses the data before encrypting it
+    first = next(chunks, b"")
+    chunks = _chain_first(first, chunks)
+    decryptedFormat = detect_es3_format(first)
+    if decryptedFormat == ES3Format.COMPRESSED:
+        chunks = _decompress_chunks(chunks)
+    elif decryptedFormat != ES3Format.PLAIN:
+        raise ValueError("Invalid ES3 file password.")
+    return parse_es3_json_chunks(chunks)
+
+
+def parse_es3_json(buffer):
+    """Parses the content of a JSON encoded ES3 ('Easy save 3') file.
+
+    The file is in JSON format, but not exactly: ES3 ('Easy save 3' from Unity
+    Asset Store) does not wrap int keys of objects into double quotes, so this is
+    not technically valid JSON. Unquoted keys are parsed as numbers.
+
+    The buffer can be any bytes-like object, including a memory mapped file: only
+    the string and number values are copied out of it, while being converted."""
+    return _ES3JsonParser(buffer).parse_document()
+
+
+def parse_es3_json_chunks(chunks: Iterator[bytes]):
+    """Same as parse_es3_json, but the data is provided progressively by an iterator of bytes chunks."""
+    return _ES3JsonParser(b"", chunks).parse_document()
+
+
+
+class ES3Format:
+    PLAIN = "plain"
+    COMPRESSED = "compressed"
+    ENCRYPTED = "encrypted"
+
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_UTF8_BOM = b"\xef\xbb\xbf"
+
+def detect_es3_format(buffer) -> str:
+    """The format of the file from its first bytes. An encrypted file may be detected as plain,
+    when its random IV starts like a JSON document: parse_es3_file_content then retries it as encrypted."""
+    head = bytes(buffer[:64])
+    if head[:2] == _GZIP_MAGIC:
+        return ES3Format.COMPRESSED
+    if head.startswith(_UTF8_BOM):
+        head = head[len(_UTF8_BOM):]
+    head = head.lstrip(b" \t\r\n")
+    if head == b"" or head[:1] in (b"{", b"["):
+        return ES3Format.PLAIN
+    return ES3Format.ENCRYPTED # random bytes, starting with the IV
+
+
+
+_CHUNK_SIZE = 1 << 16
+
+def _iter_buffer_chunks(buffer) -> Iterator[bytes]:
+    for i in range(0, len(buffer), _CHUNK_SIZE):
+        yield buffer[i:i + _CHUNK_SIZE]
+
+def _chain_first(first: bytes, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    yield first
+    yield from chunks
+
+def _decompress_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) # gzip header
+    for chunk in chunks:
+        yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+    if not decompressor.eof:
+        raise ValueError("Truncated compressed ES3 file.")
+
+def _decrypt_chunks(chunks: Iterator[bytes], password: str) -> Iterator[bytes]:
+    """Decrypts the ES3 AES encryption: a 16 bytes IV followed by the AES-128-CBC encrypted data,
+    with a key derived from the password and the IV using PBKDF2 (HMAC-SHA1, 100 iterations)."""
+    try:
+        from Crypto.Cipher import AES # optional dependency (pycryptodome), only needed for encrypted files
+    except ImportError:
+        raise ValueError("The ES3 file is encrypted, the 'pycryptodome' package is needed to read it.")
+    pending = b""
+    cipher = None
+    for chunk in chunks:
+        pending += chunk
+        if cipher is None:
+            if len(pending) < 16:
+                continue
+            iv, pending = pending[:16], pending[16:]
+            key = hashlib.pbkdf2_hmac("sha1", password.encode("utf-8"), iv, 100, 16)
+            cipher = AES.new(key, AES.MODE_CBC, iv)
+        # keep the last block, it contains the padding that is removed at the end
+        size = (len(pending) - 1) // 16 * 16
+        if size > 0:
+            yield cipher.decrypt(pending[:size])
+            pending = pending[size:]
+    if cipher is None or len(pending) != 16:
+        raise ValueError("Truncated encrypted ES3 file.")
+    last = cipher.decrypt(pending)
+    padding = last[-1]
+    if not 1 <= padding <= 16:
+        raise ValueError("Invalid ES3 file password.")
+    yield last[:-padding]
+
+
+
+_WHITESPACES = re.compile(rb"[ \t\r\n]*")
+_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_NUMBER = re.compile(rb"-?[0-9]+(\.[0-9]+)?([eE][+-]?[0-9]+)?")
+_LITERALS = {b"true": True, b"false": False, b"null": None}
+
+_QUOTE, _COLON, _COMMA = ord('"'), ord(':'), ord(',')
+_OPEN_OBJECT, _CLOSE_OBJECT = ord('{'), ord('}')
+_OPEN_ARRAY, _CLOSE_ARRAY = ord('['), ord(']')
+
+
+class _ES3JsonParser:
+
+    def __init__(self, buffer, chunks: Iterator[bytes] = None):
+        self.buffer = buffer
+        self.pos = 0
+        self.chunks = chunks
+        self.consumed = 0 # size of the data already dropped from the buffer, in streaming mode
+
+    def fill(self) -> bool:
+        """Appends the next chunk of data to the buffer, in streaming mode.
+        Return False if there is no more data."""
+        if self.chunks is None:
+            return False
+        for chunk in self.chunks:
+            if len(chunk) == 0:
+                continue
+            self.consumed += self.pos
+            self.buffer = self.buffer[self.pos:] + chunk
+            self.pos = 0
+            return True
+        self.chunks = None
+        return False
+
+    def match(self, pattern: re.Pattern, lookahead: int = 0, unterminatedIfNone: bool = False):
+        """Match the pattern at the current position, reading more data if the match may continue further
+        (the match, or the failed match, is less than lookahead bytes away from the end of the buffer)."""
+        while True:
+            m = pattern.match(self.buffer, self.pos)
+            if m is not None:
+                mayContinue = m.end() + lookahead >= len(self.buffer)
+            else:
+                mayContinue = unterminatedIfNone or self.pos + lookahead >= len(self.buffer)
+            if not mayContinue or not self.fill():
+                return m
+
+    def error(self, message: str):
+        raise ValueError(f"Invalid ES3 JSON at offset {self.consumed + self.pos}: {message}")
+
+    def parse_document(self):
+        while len(self.buffer) < len(_UTF8_BOM) and self.fill():
+            pass
+        if self.buffer[:len(_UTF8_BOM)] == _UTF8_BOM:
+            self.pos = len(_UTF8_BOM)
+        value = self.parse_value()
+        self.skip_whitespaces()
+        if self.pos != len(self.buffer):
+            self.error("unexpected data after the end of the document")
+        return value
+
+    def skip_whitespaces(self):
+        self.pos = self.match(_WHITESPACES).end()
+
+    def peek(self) -> int:
+        self.skip_whitespaces()
+        if self.pos >= len(self.buffer):
+            self.error("unexpected end of data")
+        return self.buffer[self.pos]
+
+    def expect(self, char: int):
+        if self.peek() != char:
+            self.error(f"expected '{chr(char)}'")
+        self.pos += 1
+
+    def parse_value(self):
+        c = self.peek()
+        if c == _OPEN_OBJECT:
+            return self.parse_object()
+        if c == _OPEN_ARRAY:
+            return self.parse_array()
+        if c == _QUOTE:
+            return self.parse_string()
+        return self.parse_number_or_literal()
+
+    def parse_object(self) -> dict:
+        self.pos += 1 # '{'
+        obj = {}
+        if self.peek() == _CLOSE_OBJECT:
+            self.pos += 1
+            return obj
+        while True:
+            key = self.parse_string() if self.peek() == _QUOTE else self.parse_number_or_literal()
+            self.expect(_COLON)
+            obj[key] = self.parse_value()
+            c = self.peek()
+            self.pos += 1
+            if c == _CLOSE_OBJECT:
+                return obj
+            if c != _COMMA:
+                self.pos -= 1
+                self.error("expected ',' or '}'")
+
+    def parse_array(self) -> list:
+        self.pos += 1 # '['
+        array = []
+        if self.peek() == _CLOSE_ARRAY:
+            self.pos += 1
+            return array
+        while True:
+            array.append(self.parse_value())
+            c = self.peek()
+            self.pos += 1
+            if c == _CLOSE_ARRAY:
+                return array
+            if c != _COMMA:
+                self.pos -= 1
+                self.error("expected ',' or ']'")
+
+    def parse_string(self) -> str:
+        m = self.match(_STRING, unterminatedIfNone=True)
+        if m is None:
+            self.error("unterminated string")
+        self.pos = m.end()
+        raw = self.buffer[m.start() + 1:m.end() - 1]
+        if b"\\" in raw:
+            return json.loads(b'"' + raw + b'"', strict=False) # raw control characters are accepted like in the unescaped strings
+        return raw.decode("utf-8")
+
+    def parse_number_or_literal(self):
+        m = self.match(_NUMBER, 2) # '1.' or '1e-' are not complete numbers
+        if m is not None:
+            self.pos = m.end()
+            raw = self.buffer[m.start():m.end()]
+            return float(raw) if m.group(1) is not None or m.group(2) is not None else int(raw)
+        while len(self.buffer) - self.pos < 5 and self.fill():
+            pass
+        for literal, value in _LITERALS.items():
+            if self.buffer[self.pos:self.pos + len(literal)] == literal:
+                self.pos += len(literal)
+                return value
+        self.error("unexpected character")
@@ -18,77 +18,173 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import sys
 from pathlib import Path
-from time import sleep
-from typing import Union
+from time import perf_counter, sleep
+from typing import Any, Union
+from collections.abc import Callable
 
-from es3json import load_es3_json_file
+from es3json import FileFingerprint, fingerprint_buffer, mapped_file, parse_es3_file_content
 from gamedata import GameData
+from metrics import Histogram
 from savefile import SaveData
+from startupcache import StartupCache
 
 
 
 
-class FileWatcher:
+def read_es3_file(path: Path, es3Password: str) -> tuple[FileFingerprint, Any, float]:
+    """Reads and parses a file, and measures the parsing time. Module level function, to be called in a worker process."""
+    with mapped_file(path) as buffer:
+        fingerprint = fingerprint_buffer(buffer)
+        start = perf_counter()
+        return fingerprint, parse_es3_file_content(buffer, es3Password), perf_counter() - start
+
+
+
+class FileWatcherStats:
+    """Counters and measures about the file reloads done by a FileWatcher."""
 
     def __init__(self):
+        self.refreshCount = 0
+        self.skippedRefreshCount = 0 # file updated, but with the same content as before
+        self.failedRefreshCount = 0
+        self.lastError: str = None
+        self.gameDataParseTime = Histogram()
+        self.saveDataParseTime = Histogram()
+        self.gameDataFileSize = 0
+        self.saveDataFileSize = 0
+
+    def record_success(self):
+        self.refreshCount += 1
+        self.lastError = None
+
+    def record_failure(self, path: Path, error: Exception):
+        self.failedRefreshCount += 1
+        message = f"unable to load {path}: {error!r}"
+        if message != self.lastError: # the file is retried until it is updated, don't repeat the same error each time
+            print(f"Error: {message}", file=sys.stderr)
+        self.lastError = message
+
+
+
+class FileWatcher:
+
+    # the parallel load only saves the parsing time of the smaller file, and starting the worker processes
+    # and sending back the parsed data takes longer than that if the smaller file is below this size
+    PARALLEL_LOAD_MIN_SIZE = 2 << 20
+
+    def __init__(self, es3Password: str = None, cache: StartupCache = None):
+        self.es3Password = es3Password
+        self.cache = cache
+
         self.gameDataLastUpdate = 0.0
+        self.gameDataFingerprint: FileFingerprint = None
         self.gameDataRaw = None
         self.gameData: GameData = None
 
         self.saveDataLastUpdate = 0.0
+        self.saveDataFingerprint: FileFingerprint = None
         self.saveDataRaw = None
         self.saveData: SaveData = None
 
+        self.stats = FileWatcherStats()
+        self.parallelLoadTried = False # the parallel load is only for the first load, it is not retried after a failure
+
     def has_game_data_updated(self) -> bool:
         return FileWatcher.has_file_updated(GameData.get_path(), self.gameDataLastUpdate)
     
-    def load_game_data(self):
+    def load_game_data(self) -> bool:
+        """Reload the game data file. Return True if the loaded data is different from the previous one."""
         oldUpdateTime = self.gameDataLastUpdate
+        oldFingerprint = self.gameDataFingerprint
         oldDataRaw = self.gameDataRaw
         oldData = self.gameData
+        path = GameData.get_path()
         try:
-            path = GameData.get_path()
             time = FileWatcher.get_time_of_file(path)
             if time is None:
-                print(f"Error: {path} is not a regular file.")
-                return
+                print(f"Error: {path} is not a regular file.", file=sys.stderr)
+                return False
             self.gameDataLastUpdate = time
-            self.gameDataRaw = load_es3_json_file(path)
-            self.parse_game_data()
-        except:
+            with mapped_file(path) as buffer:
+                fingerprint = fingerprint_buffer(buffer)
+                if fingerprint == oldFingerprint:
+                    self.stats.skippedRefreshCount += 1 # the game rewrites the same content on each launch
+                    return False
+                self.gameDataFingerprint = fingerprint
+                start = perf_counter()
+                cached = self.cache.load_game_data(fingerprint) if self.cache is not None else None
+                if cached is not None:
+                    self.gameDataRaw, indexesRaw = cached
+                else:
+                    self.gameDataRaw, indexesRaw = parse_es3_file_content(buffer, self.es3Password), None
+            self.parse_game_data(indexesRaw)
+            if cached is None and self.cache is not None:
+                self.cache.store_game_data(fingerprint, self.gameDataRaw, self.gameData.indexes.to_raw())
+            self.stats.gameDataParseTime.observe(perf_counter() - start)
+            self.stats.gameDataFileSize = fingerprint.size
+            self.stats.record_success()
+            return True
+        except Exception as e:
             self.gameDataLastUpdate = oldUpdateTime
+            self.gameDataFingerprint = oldFingerprint
             self.gameDataRaw = oldDataRaw
             self.gameData = oldData
+            self.stats.record_failure(path, e)
+            return False
     
-    def parse_game_data(self):
+    def parse_game_data(self, indexesRaw: dict[str, Any] = None):
         if self.gameDataRaw is None:
             self.gameData = None
         else:
-            self.gameData = GameData(self.gameDataRaw)
-            self.parse_save_data() # when game data is updated, the save data instance must be updated too (but we don't need to reload the file itself)
+            self.gameData = GameData(self.gameDataRaw, indexesRaw)
+            if self.saveData is not None:
+                self.saveData = self.saveData.with_game_data(self.gameData) # the save data only references the game data, no need to parse it again
+            else:
+                self.parse_save_data()
     
 
     def has_save_data_updated(self) -> bool:
-        return FileWatcher.has_file_updated(SaveData.get_last_save_path(), self.saveDataLastUpdate)
+        SaveData.saveDirIndex.refresh()
+        newest = SaveData.saveDirIndex.get_newest()
+        return newest is not None and (self.saveDataLastUpdate == 0 or newest.mtime > self.saveDataLastUpdate)
     
-    def load_save_data(self):
+    def load_save_data(self) -> bool:
+        """Reload the last save file. Return True if the loaded data is different from the previous one."""
         oldUpdateTime = self.saveDataLastUpdate
+        oldFingerprint = self.saveDataFingerprint
         oldDataRaw = self.saveDataRaw
         oldData = self.saveData
+        path = SaveData.saveDir
         try:
-            path = SaveData.get_last_save_path()
-            time = FileWatcher.get_time_of_file(path)
-            if time is None:
-                print(f"Error: {path} is not a regular file.")
-                return
-            self.saveDataLastUpdate = time
-            self.saveDataRaw = load_es3_json_file(path)
+            SaveData.saveDirIndex.refresh() # the game may have written another file while we were waiting
+            newest = SaveData.saveDirIndex.get_newest()
+            if newest is None:
+                print(f"Error: no save file in {SaveData.saveDir}.", file=sys.stderr)
+                return False
+            path = newest.path
+            self.saveDataLastUpdate = newest.mtime
+            with mapped_file(path) as buffer:
+                fingerprint = fingerprint_buffer(buffer)
+                if fingerprint == oldFingerprint:
+                    self.stats.skippedRefreshCount += 1 # saved without any change since the last save
+                    return False
+                self.saveDataFingerprint = fingerprint
+                start = perf_counter()
+                self.saveDataRaw = parse_es3_file_content(buffer, self.es3Password)
             self.parse_save_data()
-        except:
+            self.stats.saveDataParseTime.observe(perf_counter() - start)
+            self.stats.saveDataFileSize = fingerprint.size
+            self.stats.record_success()
+            return True
+        except Exception as e:
             self.saveDataLastUpdate = oldUpdateTime
+            self.saveDataFingerprint = oldFingerprint
             self.saveDataRaw = oldDataRaw
             self.saveData = oldData
+            self.stats.record_failure(path, e)
+            return False
 
     def parse_save_data(self):
         if self.saveDataRaw is None or self.gameData is None:
@@ -97,25 +193,67 @@ class FileWatcher:
             self.saveData = SaveData(self.saveDataRaw, self.saveDataLastUpdate, self.gameData)
 
     
-    def wait_update(self):
+    def load_all_in_parallel(self) -> bool:
+        """First load of the game data and the save, with each file read and parsed in its own process.
+        Return False if the files were not loaded, and must be loaded one after the other."""
+        if self.parallelLoadTried:
+            return False
+        self.parallelLoadTried = True
+        gamePath = GameData.get_path()
+        newestSave = SaveData.saveDirIndex.get_newest()
+        gameTime = FileWatcher.get_time_of_file(gamePath)
+        if gameTime is None or newestSave is None or min(gamePath.stat().st_size, newestSave.size) < FileWatcher.PARALLEL_LOAD_MIN_SIZE:
+            return False
+        if self.cache is not None:
+            with mapped_file(gamePath) as buffer:
+                if self.cache.has_game_data(fingerprint_buffer(buffer)):
+                    return False # loading the cache is faster than starting a worker process
+        from concurrent.futures import ProcessPoolExecutor # only imported when needed, it takes a noticeable part of the startup time
+        try:
+            with ProcessPoolExecutor(max_workers=2) as pool:
+                gameFuture = pool.submit(read_es3_file, gamePath, self.es3Password)
+                saveFuture = pool.submit(read_es3_file, newestSave.path, self.es3Password)
+                gameFingerprint, gameDataRaw, gameParseTime = gameFuture.result()
+                saveFingerprint, saveDataRaw, saveParseTime = saveFuture.result()
+            self.gameDataLastUpdate, self.gameDataFingerprint, self.gameDataRaw = gameTime, gameFingerprint, gameDataRaw
+            self.saveDataLastUpdate, self.saveDataFingerprint, self.saveDataRaw = newestSave.mtime, saveFingerprint, saveDataRaw
+            self.parse_game_data() # also parses the save data
+            self.stats.gameDataParseTime.observe(gameParseTime) # without the time to build the objects, that is small
+            self.stats.saveDataParseTime.observe(saveParseTime)
+            self.stats.gameDataFileSize, self.stats.saveDataFileSize = gameFingerprint.size, saveFingerprint.size
+            self.stats.refreshCount += 2
+            self.stats.lastError = None
+            if self.cache is not None:
+                self.cache.store_game_data(gameFingerprint, gameDataRaw, self.gameData.indexes.to_raw())
+            return True
+        except Exception:
+            # the files are loaded again one after the other, that will report the errors
+            self.gameDataLastUpdate, self.gameDataFingerprint, self.gameDataRaw, self.gameData = 0.0, None, None, None
+            self.saveDataLastUpdate, self.saveDataFingerprint, self.saveDataRaw, self.saveData = 0.0, None, None, None
+            return False
+
+    def wait_update(self, idle: Callable[[float], None] = sleep):
+        """Wait for the game data or the save to be updated, and load them.
+        Between two checks of the files, idle is called with the time to wait."""
         while True:
             try:
+                if self.gameDataLastUpdate == 0.0 and self.saveDataLastUpdate == 0.0 and self.has_game_data_updated() \
+                        and self.has_save_data_updated() and self.load_all_in_parallel():
+                    return
                 willReturn = False
                 gameDataFirstLoad = self.gameDataLastUpdate == 0.0
                 if self.has_game_data_updated():
                     if not gameDataFirstLoad:
                         sleep(1) # wait to be sure the game have written all the file
-                    self.load_game_data()
-                    willReturn = True
+                    willReturn |= self.load_game_data()
                 saveDataFirstLoad = self.saveDataLastUpdate == 0.0
                 if self.has_save_data_updated():
                     if not saveDataFirstLoad:
                         sleep(1) # wait to be sure the game have written all the file
-                    self.load_save_data()
-                    willReturn = True
+                    willReturn |= self.load_save_data()
                 if willReturn:
                     return
-                sleep(0.3)
+                idle(0.3)
             except KeyboardInterrupt:
                 exit(0)
 
@@ -19,7 +19,9 @@
 # SOFTWARE.
 
 from pathlib import Path
+import bisect
 from enum import Enum
+from typing import Any, Union
 
 from animationcurves import AnimationCurve
 from es3json import load_es3_json_file
@@ -159,6 +161,46 @@ class CashiersCollection:
 
 
 
+class GameDataIndexes:
+    """Secondary indexes of the game data, built once when it is loaded, to answer the questions of each
+    report without going through all the collections. They only contain ids and numbers, so they are
+    kept in the startup cache with the parsed game data."""
+
+    def __init__(self, licenseLevels: list[int], licenseIds: list[int], productIdsByCategory: dict[int, list[int]],
+                 productIdsByDisplayType: dict[int, list[int]], productIdsByBoxSize: dict[int, list[int]], cashierGoals: list[int]):
+        self.licenseLevels = licenseLevels # sorted required player levels
+        self.licenseIds = licenseIds # ids of the licenses, in the same order as the levels
+        self.productIdsByCategory = productIdsByCategory # by enum value
+        self.productIdsByDisplayType = productIdsByDisplayType
+        self.productIdsByBoxSize = productIdsByBoxSize
+        self.cashierGoals = cashierGoals # sorted checkout goals to unlock the cashiers
+
+    @staticmethod
+    def build(products: ProductsCollection, licenses: ProductLicensesCollection, cashiers: CashiersCollection) -> "GameDataIndexes":
+        sortedLicenses = sorted(licenses.byId.values(), key=lambda l: (l.requiredPlayerLevel, l.id))
+        byCategory: dict[int, list[int]] = {}
+        byDisplayType: dict[int, list[int]] = {}
+        byBoxSize: dict[int, list[int]] = {}
+        for pSO in products.byId.values():
+            byCategory.setdefault(pSO.category.value, []).append(pSO.id)
+            byDisplayType.setdefault(pSO.productDisplayType.value, []).append(pSO.id)
+            byBoxSize.setdefault(pSO.boxSize.value, []).append(pSO.id)
+        return GameDataIndexes([l.requiredPlayerLevel for l in sortedLicenses], [l.id for l in sortedLicenses], byCategory, byDisplayType, byBoxSize,
+                               sorted(c.checkoutGoalToUnlock for c in cashiers.byId.values()))
+
+    def to_raw(self) -> dict[str, Any]:
+        return {"licenseLevels": self.licenseLevels, "licenseIds": self.licenseIds, "productIdsByCategory": self.productIdsByCategory,
+                "productIdsByDisplayType": self.productIdsByDisplayType, "productIdsByBoxSize": self.productIdsByBoxSize, "cashierGoals": self.cashierGoals}
+
+    @staticmethod
+    def from_raw(raw: dict[str, Any]) -> "GameDataIndexes":
+        return GameDataIndexes(raw["licenseLevels"], raw["licenseIds"], raw["productIdsByCategory"], raw["productIdsByDisplayType"],
+                               raw["productIdsByBoxSize"], raw["cashierGoals"])
+
+
+
+
+
 class PriceCurves:
 
     def __init__(self, data):
@@ -170,7 +212,8 @@ class PriceCurves:
 
 class GameData:
 
-    def __init__(self, data):
+    def __init__(self, data, indexesRaw: dict[str, Any] = None):
+        """indexesRaw: the indexes of the same game data, from GameDataIndexes.to_raw(), if they are already known."""
         self.rawData = data
 
         self.boxSizeEnum = Enum('BoxSize', data["boxsize-enum"]["value"])
@@ -184,22 +227,47 @@ class GameData:
         self.priceCurves = PriceCurves(data["price-curves"])
         self.productLocalization: dict[int, str] = data["products-localization"]["value"]
         self.licensesLocalization: dict[int, str] = data["licenses-localization"]["value"]
-        self.playerPaymentTypeLocalization: dict[int, str] = data["playerpaymenttype-localization"]["value"]
-        for k in self.playerPaymentTypeLocalization.keys():
-            self.playerPaymentTypeLocalization[k] = self.playerPaymentTypeLocalization[k].strip(" :")
+        # copied so the raw data stays identical to the file content, to be compared with the next load
+        self.playerPaymentTypeLocalization: dict[int, str] = {k: v.strip(" :") for k, v in data["playerpaymenttype-localization"]["value"].items()}
         self.displayTypeLocalization: dict[int, str] = data["displaytype-localization"]["value"]
+        self.indexes = GameDataIndexes.from_raw(indexesRaw) if indexesRaw is not None else GameDataIndexes.build(self.products, self.licenses, self.cashiers)
+
+    # ### Queries on the indexes
+
+    def get_licenses_up_to_level(self, level: int) -> list[ProductLicenseSO]:
+        """The licenses that require at most the provided player level, the lowest level first."""
+        end = bisect.bisect_right(self.indexes.licenseLevels, level)
+        return [self.licenses.byId[lId] for lId in self.indexes.licenseIds[:end]]
+
+    def get_products_of_category(self, category: Enum) -> list[ProductSO]:
+        return [self.products.byId[pId] for pId in self.indexes.productIdsByCategory.get(category.value, [])]
+
+    def get_products_of_display_type(self, displayType: Enum) -> list[ProductSO]:
+        return [self.products.byId[pId] for pId in self.indexes.productIdsByDisplayType.get(displayType.value, [])]
+
+    def get_products_of_box_size(self, boxSize: Enum) -> list[ProductSO]:
+        return [self.products.byId[pId] for pId in self.indexes.productIdsByBoxSize.get(boxSize.value, [])]
+
+    def get_max_checkout_goal(self) -> int:
+        """The number of checkouts to do to be able to hire all the cashiers."""
+        return self.indexes.cashierGoals[-1] if len(self.indexes.cashierGoals) > 0 else 0
+
+    def get_next_checkout_goal(self, completedCheckouts: int) -> Union[int, None]:
+        """The number of checkouts that unlocks the next cashier, or None if they are all unlocked."""
+        i = bisect.bisect_right(self.indexes.cashierGoals, completedCheckouts)
+        return self.indexes.cashierGoals[i] if i < len(self.indexes.cashierGoals) else None
 
 
     @staticmethod
-    def from_file(path):
-        return GameData(load_es3_json_file(path))
+    def from_file(path, es3Password: str = None):
+        return GameData(load_es3_json_file(path, es3Password))
     
     @staticmethod
     def get_path():
         return Path.home().joinpath("AppData", "LocalLow", "Nokta Games", "Supermarket Simulator", "game-data.dat")
     
     @staticmethod
-    def from_live_game_savedir():
-        return GameData.from_file(GameData.get_path())
+    def from_live_game_savedir(es3Password: str = None):
+        return GameData.from_file(GameData.get_path(), es3Password)
 
 
@@ -0,0 +1,190 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import heapq
+import math
+
+from gamedata import ProductLicenseSO
+from products import Product, ProductsData
+from salessimulator import ProductProfitModel
+
+
+
+class LicenseEstimate:
+    """What a license costs to start selling its products, and what they should earn each day."""
+
+    def __init__(self, license: ProductLicenseSO, nbDisplayedProducts: int, investment: float, dailyProfit: float, unknownPrices: int):
+        self.license = license
+        self.nbDisplayedProducts = nbDisplayedProducts # products on display before buying the license, when estimated
+        self.investment = investment # license cost and a first box of each product
+        self.dailyProfit = dailyProfit
+        self.unknownPrices = unknownPrices # products without buying price in the save, estimated from their price range
+        self.paybackDays = investment / dailyProfit if dailyProfit > 0 else math.inf
+
+
+
+class LicensePlanStep:
+    """A license of the purchase plan, and in how many days there will be enough money to buy it."""
+
+    def __init__(self, order: int, estimate: LicenseEstimate, day: float):
+        self.order = order
+        self.estimate = estimate
+        self.day = day
+
+
+
+class DailyProfitSum:
+    """Daily profit of many products that share the same number of visits, for a number of visits that
+    only decreases, without going through all the products each time.
+
+    The sales of a product are capped by its capacity above a number of visits (its threshold). The
+    capped products are kept in a heap by threshold, and become uncapped as the visits decrease."""
+
+    def __init__(self):
+        self.uncappedProfitPerVisit = 0.0
+        self.cappedProfit = 0.0
+        self.capped: list[tuple[float, float, float]] = [] # (-threshold, profit per visit, capped profit)
+
+    def add(self, terms: tuple[float, int, float], visits: float):
+        salesPerVisit, capacity, margin = terms
+        if salesPerVisit > 0 and visits * salesPerVisit >= capacity:
+            heapq.heappush(self.capped, (-capacity / salesPerVisit, salesPerVisit * margin, capacity * margin))
+            self.cappedProfit += capacity * margin
+        else:
+            self.uncappedProfitPerVisit += salesPerVisit * margin
+
+    def get(self, visits: float) -> float:
+        while len(self.capped) > 0 and -self.capped[0][0] > visits:
+            _, profitPerVisit, cappedProfit = heapq.heappop(self.capped)
+            self.cappedProfit -= cappedProfit
+            self.uncappedProfitPerVisit += profitPerVisit
+        return self.uncappedProfitPerVisit * visits + self.cappedProfit
+
+
+
+class LicensePlanner:
+    """Ranks the unlockable licenses by payback time, and plans the order to buy them.
+
+    The daily profit of the products is estimated with a ProductProfitModel."""
+
+    def __init__(self, productsData: ProductsData, profitModel: ProductProfitModel, money: float):
+        self.productsData = productsData
+        self.profitModel = profitModel
+        self.money = money
+        self.displayedProducts = [p for p in productsData.unlocked if len(p.displaySlots) > 0]
+        self.licenseCosts: dict[int, tuple[float, int, list[tuple[float, int, float]]]] = {} # by license id
+
+    def get_visits_per_product(self, nbDisplayedProducts: int) -> float:
+        return self.profitModel.get_visits_per_product(nbDisplayedProducts)
+
+    def get_profit_terms(self, product: Product) -> tuple[float, int, float]:
+        return self.profitModel.get_profit_terms(product)
+
+    @staticmethod
+    def get_daily_profit(terms: list[tuple[float, int, float]], visits: float) -> float:
+        return sum(min(visits * salesPerVisit, capacity) * margin for salesPerVisit, capacity, margin in terms)
+
+    def get_store_daily_profit(self) -> float:
+        """The estimated daily profit of the products currently on display."""
+        visits = self.get_visits_per_product(len(self.displayedProducts))
+        return LicensePlanner.get_daily_profit([self.get_profit_terms(p) for p in self.displayedProducts if p.currentPrice is not None], visits)
+
+    def get_store_daily_profit_change(self, license: ProductLicenseSO) -> float:
+        """How the estimated daily profit of the store changes if only this license is bought: the profit of its products,
+        minus what the products on display lose when they share the customer visits with them."""
+        displayed = [self.get_profit_terms(p) for p in self.displayedProducts if p.currentPrice is not None]
+        visits = self.get_visits_per_product(len(self.displayedProducts) + len(license.products))
+        return LicensePlanner.get_daily_profit(displayed + self.get_license_costs(license)[2], visits) - self.get_store_daily_profit()
+
+    def get_product_for_estimate(self, product: Product) -> tuple[Product, bool]:
+        """The product, or a copy with an estimated buying price if it is not in the save. Also tells if the price is estimated."""
+        if product.currentPrice is not None:
+            return product, False
+        pSO = product.productSO
+        estimated = Product(pSO, self.productsData)
+        estimated.currentPrice = (pSO.minDynamicPrice + pSO.maxDynamicPrice) / 2 # the buying price varies in this range
+        return estimated, True
+
+    def get_license_costs(self, license: ProductLicenseSO) -> tuple[float, int, list[tuple[float, int, float]]]:
+        """The parts of the estimate of a license that don't depend on the other products on display:
+        the investment, the number of unknown buying prices, and the profit terms of its products."""
+        costs = self.licenseCosts.get(license.id)
+        if costs is None:
+            investment = license.purchasingCost
+            unknownPrices = 0
+            terms = []
+            for pSO in license.products:
+                product, estimatedPrice = self.get_product_for_estimate(self.productsData.byId[pSO.id])
+                investment += product.currentPrice * pSO.productAmountOnPurchase
+                unknownPrices += estimatedPrice
+                terms.append(self.get_profit_terms(product))
+            costs = (investment, unknownPrices, terms)
+            self.licenseCosts[license.id] = costs
+        return costs
+
+    def estimate(self, license: ProductLicenseSO, nbDisplayedProducts: int) -> LicenseEstimate:
+        """Estimates a license, with the number of products on display before buying it."""
+        investment, unknownPrices, terms = self.get_license_costs(license)
+        visits = self.get_visits_per_product(nbDisplayedProducts + len(license.products))
+        return LicenseEstimate(license, nbDisplayedProducts, investment, LicensePlanner.get_daily_profit(terms, visits), unknownPrices)
+
+    def plan(self, licenses: list[ProductLicenseSO]) -> list[LicensePlanStep]:
+        """Orders the licenses to buy, the one with the shortest payback first, and tells when each can be bought
+        with the current money and the estimated daily profit of the store.
+
+        Each bought license adds products on display, that take a share of the visits of the others,
+        so the estimates change after each purchase. They can only get worse, so a lazy greedy search
+        is enough: the best license of the heap is estimated again, and kept if it is still better
+        than the previous estimate of the next one. Most licenses are only estimated a few times."""
+        nbDisplayed = len(self.displayedProducts)
+        storeProfit = DailyProfitSum()
+        visits = self.get_visits_per_product(nbDisplayed)
+        for p in self.displayedProducts:
+            if p.currentPrice is not None:
+                storeProfit.add(self.get_profit_terms(p), visits)
+        heap = [(e.paybackDays, e.license.id, e) for e in (self.estimate(l, nbDisplayed) for l in licenses)]
+        heapq.heapify(heap)
+        money = self.money
+        day = 0.0
+        steps: list[LicensePlanStep] = []
+        while len(heap) > 0:
+            _, licenseId, estimate = heapq.heappop(heap)
+            if estimate.nbDisplayedProducts != nbDisplayed:
+                estimate = self.estimate(estimate.license, nbDisplayed)
+                if len(heap) > 0 and (estimate.paybackDays, licenseId) > heap[0][:2]:
+                    heapq.heappush(heap, (estimate.paybackDays, licenseId, estimate))
+                    continue
+            if estimate.investment > money:
+                dailyProfit = storeProfit.get(self.get_visits_per_product(nbDisplayed))
+                if dailyProfit > 0:
+                    waitDays = (estimate.investment - money) / dailyProfit
+                    day += waitDays
+                    money += waitDays * dailyProfit
+                else:
+                    day = math.inf # never, with what the store earns
+                    money = estimate.investment
+            money -= estimate.investment
+            steps.append(LicensePlanStep(len(steps) + 1, estimate, day))
+            nbDisplayed += len(estimate.license.products)
+            visits = self.get_visits_per_product(nbDisplayed)
+            for terms in self.get_license_costs(estimate.license)[2]:
+                storeProfit.add(terms, visits)
+        return steps
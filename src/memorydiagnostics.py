@@ -0,0 +1,194 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Memory diagnostics of the refreshes of the assistant, to check that the memory is reclaimed over a long session.
+
+The refreshes are replayed in the process with tracemalloc: each save is parsed, its report is computed and rendered,
+and the previous report is released, like in the assistant. A snapshot is taken after each refresh, once the garbage
+is collected: after a first pass to fill the caches, the retained memory should not grow anymore.
+The assistant can also write the same measures after each of its refreshes, with MemoryLog."""
+
+import gc
+import tracemalloc
+from pathlib import Path
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from es3json import parse_es3_file_content
+from gamedata import GameData
+from report import Report
+from savefile import SaveData
+
+
+
+class MemoryStage:
+    """Memory used by a stage of the refreshes: the memory still allocated at the end of the stage, and the peak during it.
+    Both are the total traced memory of the process, not only the allocations of the stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.current: list[int] = [] # by refresh, in bytes
+        self.peak = 0
+
+    def get_steady_state(self) -> int:
+        """Median of the memory allocated at the end of the stage."""
+        values = sorted(self.current)
+        return values[len(values) // 2] if len(values) > 0 else 0
+
+
+
+class MemoryDiagnostics:
+    """Stages and snapshots of tracemalloc over the refreshes. Tracing starts with the instance, and stops with close()."""
+
+    # allocations of the diagnostics, of tracemalloc itself and of the imports are not part of the refreshes
+    SNAPSHOT_FILTERS = [
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ]
+
+    def __init__(self, frames: int = 1):
+        self.stages: dict[str, MemoryStage] = {}
+        self.retained: list[int] = [] # after each refresh, in bytes
+        self.baseline: tracemalloc.Snapshot = None
+        self.last: tracemalloc.Snapshot = None
+        self.wasTracing = tracemalloc.is_tracing()
+        if not self.wasTracing:
+            tracemalloc.start(frames)
+
+    def run_stage(self, name: str, fn: Callable[[], Any]) -> Any:
+        """Calls fn and records the memory it uses under the name of the stage."""
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = MemoryStage(name)
+        tracemalloc.reset_peak()
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        stage.current.append(current)
+        stage.peak = max(stage.peak, peak)
+        return result
+
+    def take_snapshot(self, baseline: bool = False):
+        """Records the memory retained at the end of a refresh. The growth is measured from the last baseline snapshot.
+        The retained memory is the total of the filtered traces, so it does not count the snapshots kept for the comparison."""
+        self.last = None
+        gc.collect()
+        self.last = tracemalloc.take_snapshot().filter_traces(MemoryDiagnostics.SNAPSHOT_FILTERS)
+        self.retained.append(sum(trace.size for trace in self.last.traces))
+        if baseline:
+            self.baseline = self.last
+            self.retained = self.retained[-1:]
+
+    def get_growth(self) -> int:
+        """Memory retained after the last refresh, minus after the baseline one, in bytes."""
+        return self.retained[-1] - self.retained[0] if len(self.retained) > 0 else 0
+
+    def get_top_growing(self, count: int = 10) -> list[tracemalloc.StatisticDiff]:
+        """Allocation sites that retain the most additional memory since the baseline snapshot."""
+        if self.baseline is None or self.last is None:
+            return []
+        diffs = self.last.compare_to(self.baseline, "lineno")
+        return [d for d in diffs if d.size_diff > 0][:count]
+
+    def close(self):
+        if not self.wasTracing:
+            tracemalloc.stop()
+
+
+
+class MemoryLog:
+    """Memory diagnostics of the running assistant: after each refresh, appends to a text file the retained memory,
+    its growth since the first refresh, the peak since the previous refresh, and the allocation sites that grew the most.
+    Tracing the allocations makes the assistant slower, so it is only done when enabled."""
+
+    def __init__(self, path: Path, topCount: int = 5):
+        self.path = path
+        self.topCount = topCount
+        self.diagnostics = MemoryDiagnostics()
+        self.refreshCount = 0
+
+    def observe_refresh(self):
+        self.refreshCount += 1
+        peak = tracemalloc.get_traced_memory()[1]
+        self.diagnostics.take_snapshot(baseline=(self.refreshCount == 1))
+        lines = [f"refresh {self.refreshCount}: retained {self.diagnostics.retained[-1] / 1024:.1f} KiB"
+                 f" ({self.diagnostics.get_growth() / 1024:+.1f} KiB since the first refresh), peak {peak / 1024:.1f} KiB"]
+        lines += [f"  {d.traceback[0]}: {d.size_diff / 1024:+.1f} KiB, {d.count_diff:+d} blocks"
+                  for d in self.diagnostics.get_top_growing(self.topCount)]
+        try:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write("\n".join(lines) + "\n")
+        except OSError:
+            pass # the diagnostics must not stop the assistant
+        tracemalloc.reset_peak()
+
+    def close(self):
+        self.diagnostics.close()
+
+
+
+def iterate_refreshes(recording: Path) -> Iterator[tuple[str, bytes]]:
+    """The files to load in turn, (name, content): the writes of a recording made with replay.py,
+    or the current game data file and the last save."""
+    if recording is not None:
+        from replay import Recording
+        rec = Recording.load(recording)
+        for write in rec.writes:
+            yield write.name, rec.read(write)
+    else:
+        yield "game-data.dat", GameData.get_path().read_bytes()
+        yield SaveData.get_last_save_path().name, SaveData.get_last_save_path().read_bytes()
+
+def run_memory_diagnostics(refreshes: int, recording: Path = None, es3Password: str = None, screenWidth: int = 160) -> MemoryDiagnostics:
+    """Replays the files as many times as needed to do the number of refreshes, after a first pass that is not measured
+    in the growth. A refresh parses a save, or the game data, and computes and renders the report."""
+    from products import RecommendedPriceCache
+    from salessimulator import CustomerModel
+    files = list(iterate_refreshes(recording))
+    if not any(name != "game-data.dat" for name, _ in files):
+        raise ValueError("no save to replay")
+    customerModel = CustomerModel(150, 3)
+    priceCache = RecommendedPriceCache() # shared by the reports, like in the assistant
+    diagnostics = MemoryDiagnostics()
+    gameData: GameData = None
+    saveData: SaveData = None
+    report: Report = None # kept until the next one, like the view of the assistant
+    try:
+        for i in range(len(files) + refreshes):
+            name, content = files[i % len(files)]
+            raw = diagnostics.run_stage("Parse", lambda: parse_es3_file_content(content, es3Password))
+            if name == "game-data.dat":
+                gameData = diagnostics.run_stage("Game data", lambda: GameData(raw))
+                if saveData is not None:
+                    saveData = saveData.with_game_data(gameData)
+            elif gameData is not None:
+                saveData = diagnostics.run_stage("Save data", lambda: SaveData(raw, float(i), gameData))
+            del raw
+            if gameData is not None and saveData is not None:
+                report = diagnostics.run_stage("Report", lambda: Report(gameData, saveData, customerModel, priceCache=priceCache))
+                diagnostics.run_stage("Render", lambda: report.render(screenWidth))
+            diagnostics.take_snapshot(baseline=(i == len(files) - 1)) # the first pass fills the caches
+    finally:
+        diagnostics.close()
+    return diagnostics
@@ -0,0 +1,151 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import sys
+import threading
+from typing import Union
+
+
+
+class Histogram:
+    """Distribution of measured durations, in the cumulative buckets of the Prometheus histograms."""
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucketCounts = [0] * len(buckets) # not cumulative, the sums are done when rendering
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucketCounts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+
+
+def get_process_memory() -> Union[int, None]:
+    """Resident memory of the current process in bytes, or None if it can't be known on this platform."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        getProcessMemoryInfo = ctypes.windll.psapi.GetProcessMemoryInfo
+        getProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+        if not getProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize
+    try:
+        with open("/proc/self/statm") as fp: # Linux
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource # peak memory only, on the other Unix systems
+        maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxRss if sys.platform == "darwin" else maxRss * 1024
+    except ImportError:
+        return None
+
+
+
+class SessionMetrics:
+    """Measures of a running assistant, rendered in the Prometheus text format.
+    The file reload counters and the parse times are read from the FileWatcherStats, the
+    analysis time and the store content are updated with observe_report after each report."""
+
+    PREFIX = "supermarket_assistant_"
+
+    def __init__(self, watcherStats):
+        self.watcherStats = watcherStats
+        self.lock = threading.Lock() # the metrics are rendered from another thread
+        self.reportCount = 0
+        self.analysisTime = Histogram()
+        self.productCount = 0
+        self.unlockedProductCount = 0
+        self.storeBoxCount = 0
+        self.rackedBoxCount = 0
+
+    def observe_report(self, report, analysisTime: float):
+        """Updates the metrics from a new report, that took analysisTime seconds to compute."""
+        saveData = report.saveData
+        with self.lock:
+            self.reportCount += 1
+            self.analysisTime.observe(analysisTime)
+            self.productCount = len(report.productsData.byId)
+            self.unlockedProductCount = len(report.productsData.unlocked)
+            self.storeBoxCount = len(saveData.progression.boxDatas)
+            self.rackedBoxCount = sum(len(s.rackedBoxDatas) for r in saveData.progression.rackDatas for s in r.rackSlots)
+
+    def render(self) -> str:
+        lines: list[str] = []
+
+        def add(name: str, type: str, help: str, samples: list[tuple[str, float]]):
+            lines.append(f"# HELP {SessionMetrics.PREFIX}{name} {help}")
+            lines.append(f"# TYPE {SessionMetrics.PREFIX}{name} {type}")
+            for suffix, value in samples:
+                lines.append(f"{SessionMetrics.PREFIX}{name}{suffix} {value}")
+
+        def add_histogram(name: str, help: str, histogram: Histogram):
+            samples = []
+            cumulated = 0
+            for bound, count in zip(histogram.buckets, histogram.bucketCounts):
+                cumulated += count
+                samples.append((f'_bucket{{le="{bound}"}}', cumulated))
+            samples += [('_bucket{le="+Inf"}', histogram.count), ("_sum", histogram.sum), ("_count", histogram.count)]
+            add(name, "histogram", help, samples)
+
+        stats = self.watcherStats
+        with self.lock:
+            add("refreshes_total", "counter", "Game data and save files loaded.", [("", stats.refreshCount)])
+            add("skipped_refreshes_total", "counter", "Files rewritten with the same content, not loaded again.", [("", stats.skippedRefreshCount)])
+            add("failed_refreshes_total", "counter", "Files that could not be loaded.", [("", stats.failedRefreshCount)])
+            add_histogram("game_data_parse_seconds", "Time to read and parse the game data file.", stats.gameDataParseTime)
+            add_histogram("save_parse_seconds", "Time to read and parse a save file.", stats.saveDataParseTime)
+            add("file_size_bytes", "gauge", "Size of the last loaded files.",
+                [('{file="game_data"}', stats.gameDataFileSize), ('{file="save"}', stats.saveDataFileSize)])
+            add("reports_total", "counter", "Reports computed.", [("", self.reportCount)])
+            add_histogram("analysis_seconds", "Time to compute a report from the loaded files.", self.analysisTime)
+            add("products", "gauge", "Products of the game, and products unlocked in the last save.",
+                [('{state="all"}', self.productCount), ('{state="unlocked"}', self.unlockedProductCount)])
+            add("boxes", "gauge", "Boxes in the last save, in the store and on the storage racks.",
+                [('{location="store"}', self.storeBoxCount), ('{location="rack"}', self.rackedBoxCount)])
+
+        memory = get_process_memory()
+        if memory is not None:
+            lines.append("# HELP process_resident_memory_bytes Resident memory size in bytes.")
+            lines.append("# TYPE process_resident_memory_bytes gauge")
+            lines.append(f"process_resident_memory_bytes {memory}")
+        return "\n".join(lines) + "\n"
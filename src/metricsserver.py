@@ -0,0 +1,102 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from metrics import SessionMetrics
+
+
+
+class MetricsHttpServer:
+    """Serves the metrics in the Prometheus text format on http://host:port/metrics."""
+
+    def __init__(self, metrics: SessionMetrics, host: str, port: int):
+        self.metrics = metrics
+        self.server = ThreadingHTTPServer((host, port), self.create_handler_class())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def get_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{'localhost' if host in ('127.0.0.1', '0.0.0.0') else host}:{port}/metrics"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def create_handler_class(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                content = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass # don't mess with the console output
+
+        return Handler
+
+
+
+class MetricsFileWriter:
+    """Writes the metrics in the Prometheus text format to a file, periodically and when closed.
+    The file is replaced in one go, so it can be read at any time (for example by the textfile collector of the node exporter)."""
+
+    def __init__(self, metrics: SessionMetrics, path: Path, interval: float = 10):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.write_loop, name="metrics-file", daemon=True)
+        self.thread.start()
+
+    def write(self):
+        tmpPath = self.path.with_name(self.path.name + ".tmp")
+        tmpPath.write_text(self.metrics.render(), encoding="utf-8")
+        os.replace(tmpPath, self.path)
+
+    def try_write(self):
+        try:
+            self.write()
+        except OSError as e:
+            print(f"Error: unable to write the metrics to {self.path}: {e}", file=sys.stderr)
+
+    def write_loop(self):
+        while not self.stopped.wait(self.interval):
+            self.try_write()
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.try_write() # called when exiting, an error must not replace the reason of the exit
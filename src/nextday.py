@@ -0,0 +1,91 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import threading
+from collections.abc import Callable
+from typing import Any
+
+from gamedata import GameData
+from report import Report
+from savefile import SaveData
+
+
+
+class NextDayPrecomputer:
+    """Computes in the background the report of the next day, with the buying prices announced in the last save,
+    so it can be shown as soon as the save of the next day arrives, while its real report is computed.
+
+    The computation runs in a thread, so it only uses the time the assistant spends waiting for the next save.
+    The reports share a RecommendedPriceCache, so computing the next day also finds in advance the recommended
+    prices that the real report of the next day will need. The reports are keyed by the fingerprints of the files
+    they are computed from: only the report of the last submitted files is shown, a report of older files is discarded."""
+
+    def __init__(self, reportFactory: Callable[[GameData, SaveData], Report]):
+        self.reportFactory = reportFactory # builds the report of the next day of a save
+        self.condition = threading.Condition()
+        self.pending: tuple[Any, GameData, SaveData] = None
+        self.latestKey: Any = None # of the last submitted save
+        self.key: Any = None # of the precomputed report
+        self.day: int = None # the day of the precomputed report
+        self.report: Report = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="NextDayPrecomputer", daemon=True)
+        self.thread.start()
+
+    def submit(self, key: Any, gameData: GameData, saveData: SaveData):
+        """Starts the precomputation of the next day of the save, replacing the one of a previous save if it is not started.
+        The key identifies the files of the save and the game data, like their fingerprints."""
+        with self.condition:
+            self.latestKey = key
+            self.pending = (key, gameData, saveData)
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                key, gameData, saveData = self.pending
+                self.pending = None
+            try:
+                report = self.reportFactory(gameData, saveData)
+            except Exception:
+                continue # the next report will be computed normally
+            with self.condition:
+                if key != self.latestKey:
+                    continue # another save was submitted meanwhile
+                self.key = key
+                self.day = saveData.progression.currentDay + 1
+                self.report = report
+
+    def get_report(self, saveData: SaveData) -> Report:
+        """The precomputed report if it is computed from the last submitted save and the save is of the next day, or None."""
+        with self.condition:
+            if self.report is None or self.key != self.latestKey or saveData.progression.currentDay != self.day:
+                return None
+            return self.report
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
@@ -0,0 +1,105 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import math
+
+from products import Product
+
+
+
+class ProductPriceFrontier:
+    """The prices of a product at a price step that are worth considering: the prices for which no other price
+    of the step gives both more profit per sale and at least the same purchase chance. From the cheapest to the
+    most expensive, the profit per sale increases and the purchase chance decreases."""
+
+    def __init__(self, product: Product, step: float, prices: list[float], chances: list[float]):
+        self.product = product
+        self.step = step
+        self.prices = prices
+        self.chances = chances # capped to 100%
+
+    def get_profit_per_chance(self, i: int) -> float:
+        return (self.prices[i] - self.product.currentPrice) * self.chances[i] / 100
+
+    def get_best(self) -> tuple[float, float]:
+        """The (price, chance) with the best profit per chance, or (None, 0) if no price of the step is on the frontier."""
+        if len(self.prices) == 0:
+            return None, 0.0
+        i = max(range(len(self.prices)), key=self.get_profit_per_chance)
+        return self.prices[i], self.chances[i]
+
+    def get_best_with_chance(self, minChance: float) -> tuple[float, float]:
+        """The most expensive (price, chance) with at least the provided purchase chance, or (None, 0) if there is none."""
+        for price, chance in zip(reversed(self.prices), reversed(self.chances)):
+            if chance >= minChance:
+                return price, chance
+        return None, 0.0
+
+
+
+class PriceFrontiers:
+    """The price frontiers of many products at one price step (1 for whole dollars, 0.5, 0.05, 0.01 for cents, ...).
+
+    All the prices of the step between the buying price and the maximum price of each product are evaluated,
+    with one batched evaluation of each price curve for all the products. A single pass from the most
+    expensive price of each product then keeps the prices with a better chance than all the more expensive ones."""
+
+    def __init__(self, products: list[Product], step: float):
+        self.step = step
+        grids = [PriceFrontiers.get_price_grid(p, step) for p in products]
+        chances: list[list[float]] = []
+        cheap: list[tuple[list[float], int, float]] = [] # (chances of the product, index, position on the curve)
+        expensive: list[tuple[list[float], int, float]] = []
+        for p, prices in zip(products, grids):
+            productChances, productCheap, productExpensive = p.split_sell_prices_by_curve(prices)
+            chances.append(productChances)
+            cheap += [(productChances, i, t) for i, t in productCheap]
+            expensive += [(productChances, i, t) for i, t in productExpensive]
+
+        if len(products) > 0:
+            priceCurves = products[0].productsData.gameData.priceCurves
+            for points, curve in ((cheap, priceCurves.purchaseChanceCurveForCheapPrice), (expensive, priceCurves.purchaseChanceCurveForExpensivePrice)):
+                for (productChances, i, _), v in zip(points, curve.evaluate_many([t for _, _, t in points])):
+                    productChances[i] = v
+
+        self.frontiers = [PriceFrontiers.get_frontier(p, step, prices, productChances) for p, prices, productChances in zip(products, grids, chances)]
+        self.byId = {f.product.productSO.id: f for f in self.frontiers}
+
+    @staticmethod
+    def get_price_grid(product: Product, step: float) -> list[float]:
+        first = math.ceil(product.currentPrice / step - 1e-9)
+        last = math.floor(product.max_price() / step + 1e-9)
+        return [round(k * step, 10) for k in range(first, last + 1)]
+
+    @staticmethod
+    def get_frontier(product: Product, step: float, prices: list[float], chances: list[float]) -> ProductPriceFrontier:
+        frontierPrices: list[float] = []
+        frontierChances: list[float] = []
+        bestChance = 0.0 # no price with a 0% chance is kept
+        for price, chance in zip(reversed(prices), reversed(chances)):
+            chance = min(100.0, chance)
+            if chance > bestChance:
+                frontierPrices.append(price)
+                frontierChances.append(chance)
+                bestChance = chance
+        frontierPrices.reverse()
+        frontierChances.reverse()
+        return ProductPriceFrontier(product, step, frontierPrices, frontierChances)
@@ -0,0 +1,98 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import csv
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from animationcurves import lerp
+from products import Product, ProductsData
+
+
+
+class PriceSweep:
+    """Purchase chance and profit per chance of products, for a grid of selling prices from the
+    buying price to the maximum price of each product (both included)."""
+
+    BINARY_MAGIC = b"SMPS"
+    BINARY_VERSION = 1
+    # magic, version, number of products, number of prices per product
+    BINARY_HEADER = struct.Struct("<4sIII")
+
+    def __init__(self, products: list[Product], nbPrices: int = 200):
+        self.products = products
+        self.nbPrices = nbPrices
+        self.prices: list[list[float]] = []
+        self.chances: list[list[float]] = []
+        self.profits: list[list[float]] = []
+        steps = [i / (nbPrices - 1) for i in range(nbPrices)] if nbPrices > 1 else [0.0]
+        for p in products:
+            prices = [lerp(p.currentPrice, p.max_price(), s) for s in steps]
+            chances = p.get_purchase_chances_of_sell_prices(prices)
+            self.prices.append(prices)
+            self.chances.append(chances)
+            self.profits.append([(price - p.currentPrice) * chance / 100 for price, chance in zip(prices, chances)])
+
+    @staticmethod
+    def get_products(productsData: ProductsData, allProducts: bool = False) -> list[Product]:
+        """The unlocked products, or all the products with a known buying price."""
+        products = list(productsData.byId.values()) if allProducts else productsData.unlocked
+        return [p for p in products if p.currentPrice is not None]
+
+    def write_csv(self, path: Path):
+        with open(path, "w", newline="", encoding="utf-8") as fp:
+            writer = csv.writer(fp)
+            writer.writerow(["productId", "name", "brand", "price", "profitRate", "purchaseChance", "profitPerChance"])
+            for p, prices, chances, profits in zip(self.products, self.prices, self.chances, self.profits):
+                for price, chance, profit in zip(prices, chances, profits):
+                    writer.writerow([p.productSO.id, p.localizedName, p.productSO.brand,
+                                     f"{price:.4f}", f"{p.profit_rate_of_sell_price(price):.4f}", f"{chance:.4f}", f"{profit:.6f}"])
+
+    def write_binary(self, path: Path):
+        """Writes the sweep as arrays of little endian numbers, after the header:
+        the product ids (int32, one per product), then the prices, the purchase chances and the profits per chance
+        (float64, nbProducts * nbPrices each, product by product). For example, with numpy:
+
+            header = np.fromfile(path, dtype="<u4", count=4)
+            ids = np.fromfile(path, dtype="<i4", count=header[2], offset=16)
+            prices, chances, profits = np.fromfile(path, dtype="<f8", offset=16 + 4 * header[2]).reshape(3, header[2], header[3])
+        """
+        ids = array("i", [p.productSO.id for p in self.products])
+        values = array("d")
+        for rows in (self.prices, self.chances, self.profits):
+            for row in rows:
+                values.extend(row)
+        if sys.byteorder == "big":
+            ids.byteswap()
+            values.byteswap()
+        with open(path, "wb") as fp:
+            fp.write(PriceSweep.BINARY_HEADER.pack(PriceSweep.BINARY_MAGIC, PriceSweep.BINARY_VERSION, len(self.products), self.nbPrices))
+            ids.tofile(fp)
+            values.tofile(fp)
+
+    def write(self, path: Path):
+        """Writes the sweep as CSV if the file name ends with .csv, or in the binary format otherwise."""
+        if path.suffix.lower() == ".csv":
+            self.write_csv(path)
+        else:
+            self.write_binary(path)
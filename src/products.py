@@ -19,12 +19,59 @@
 # SOFTWARE.
 
 import math
+import threading
+import weakref
 
 from animationcurves import inverse_lerp, lerp, local_max
 from gamedata import GameData, ProductSO
 from savefile import SaveData, DisplaySlot, RackSlot, Box
 
 
+class StrategyParams:
+    """The tunable heuristics of the recommendations. The default values are the ones of the assistant."""
+
+    EXACT_PRICES_CHOICES = ("cashiers", "always", "never")
+
+    def __init__(self, roundedPriceTolerance: float = 0.95, urgentStorageRatio: float = 0.5, exactPrices: str = "cashiers"):
+        # an integer price is accepted down to this ratio of the optimum price
+        self.roundedPriceTolerance = roundedPriceTolerance
+        # boxes to buy are urgent if they fill at least this ratio of the storage slots of the product
+        self.urgentStorageRatio = urgentStorageRatio
+        # when to use exact prices instead of integer prices: once the checkout goal of all cashiers is reached, always or never
+        self.exactPrices = exactPrices
+
+    def __repr__(self):
+        return f"StrategyParams(roundedPriceTolerance={self.roundedPriceTolerance}, urgentStorageRatio={self.urgentStorageRatio}, exactPrices={self.exactPrices!r})"
+
+
+
+class RecommendedPriceCache:
+    """The best exact selling price of the products, by product and buying price. It only depends on the game data,
+    so it is shared between the reports of successive saves (and of the next day precomputed in the background),
+    and the price of a product is only searched again when its buying price changes.
+
+    The prices are kept by game data instance, as the reports of two threads may use different ones while the game
+    data is reloaded. The prices of a game data are dropped when it is not used anymore."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pricesByGameData: weakref.WeakKeyDictionary[GameData, dict[tuple[int, float], float]] = weakref.WeakKeyDictionary()
+
+    def get(self, product: "Product") -> float:
+        gameData = product.productsData.gameData
+        with self.lock:
+            prices = self.pricesByGameData.get(gameData)
+            if prices is None:
+                prices = self.pricesByGameData[gameData] = {}
+        key = (product.productSO.id, product.currentPrice)
+        price = prices.get(key)
+        if price is None:
+            price = local_max(lambda p: product.get_profit_per_chance_of_sell_price(p), product.optimum_price(), product.max_price(), 0.001)
+            prices[key] = price
+        return price
+
+
+
 class Product:
 
     def __init__(self, pSO: ProductSO, productsData: "ProductsData"):
@@ -39,6 +86,7 @@ class Product:
         self.averageCosts: float = None
         self.dailyPriceChange: float = None
         self.previousPrice: float = None
+        self.buyingPriceBeforeChange: float = None # when the announced price change of the next day is applied
 
         self.displaySlots: list[DisplaySlot] = []
         self.rackSlots: list[RackSlot] = []
@@ -85,6 +133,35 @@ class Product:
             return self.productsData.gameData.priceCurves.purchaseChanceCurveForExpensivePrice.evaluate(t)
         return 0.0
 
+
+    def split_sell_prices_by_curve(self, sell_prices: list[float]) -> tuple[list[float], list[tuple[int, float]], list[tuple[int, float]]]:
+        """The purchase chances of the prices that are not on a price curve (the others are left at 0),
+        and the (index, position on the curve) of the prices on the cheap and on the expensive price curves.
+        Allows to evaluate the curves once for the prices of many products."""
+        optiProfitRate = self.productSO.optimumProfitRate
+        maxProfitRate = self.productSO.maxProfitRate
+        chances = [0.0] * len(sell_prices)
+        cheap: list[tuple[int, float]] = []
+        expensive: list[tuple[int, float]] = []
+        for i, price in enumerate(sell_prices):
+            profitRate = self.profit_rate_of_sell_price(price)
+            if profitRate < 0:
+                chances[i] = 200.0
+            elif profitRate < optiProfitRate:
+                cheap.append((i, inverse_lerp(0, optiProfitRate, profitRate)))
+            elif profitRate < maxProfitRate:
+                expensive.append((i, inverse_lerp(optiProfitRate, maxProfitRate, profitRate)))
+        return chances, cheap, expensive
+
+    def get_purchase_chances_of_sell_prices(self, sell_prices: list[float]) -> list[float]:
+        """Same as get_purchase_chance_of_sell_price for many prices, with one batched evaluation of each price curve."""
+        priceCurves = self.productsData.gameData.priceCurves
+        chances, cheap, expensive = self.split_sell_prices_by_curve(sell_prices)
+        cheapValues = priceCurves.purchaseChanceCurveForCheapPrice.evaluate_many([t for _, t in cheap])
+        expensiveValues = priceCurves.purchaseChanceCurveForExpensivePrice.evaluate_many([t for _, t in expensive])
+        for (i, _), v in zip(cheap + expensive, cheapValues + expensiveValues):
+            chances[i] = v
+        return chances
     
     def get_purchase_chance(self) -> float:
         return self.get_purchase_chance_of_sell_price(self.selling_price())
@@ -97,11 +174,14 @@ class Product:
 
     def get_sell_price_for_best_profit_per_chance(self) -> float:
         if not hasattr(self, "sellPriceForBestProfitPerChance"):
-            self.sellPriceForBestProfitPerChance = local_max(lambda p: self.get_profit_per_chance_of_sell_price(p), self.optimum_price(), self.max_price(), 0.001)
+            if self.productsData.priceCache is not None:
+                self.sellPriceForBestProfitPerChance = self.productsData.priceCache.get(self)
+            else:
+                self.sellPriceForBestProfitPerChance = local_max(lambda p: self.get_profit_per_chance_of_sell_price(p), self.optimum_price(), self.max_price(), 0.001)
         return self.sellPriceForBestProfitPerChance
 
     def get_best_rounded_price(self) -> float:
-        pOpt = math.ceil(self.optimum_price() * 0.95) # 0.95 to authorize an integer price that is 5% below optimized price
+        pOpt = math.ceil(self.optimum_price() * self.productsData.strategy.roundedPriceTolerance) # authorize an integer price that is a bit below optimized price
         pBest = math.floor(self.get_sell_price_for_best_profit_per_chance())
         if pOpt <= pBest:
             return pBest
@@ -110,6 +190,10 @@ class Product:
         if self.get_profit_per_chance_of_sell_price(pMin) > self.get_profit_per_chance_of_sell_price(pMax):
             return pMin
         return pMax
+
+    def get_recommended_price(self) -> float:
+        """The price shown to the player: exact once all cashiers can be hired, rounded before that."""
+        return self.get_sell_price_for_best_profit_per_chance() if self.productsData.exactPrices else self.get_best_rounded_price()
     
 
 
@@ -169,6 +253,9 @@ class Product:
     def get_max_storable_boxes(self):
         return len(self.rackSlots) * self.productsData.gameData.boxes.byBoxSize[self.productSO.boxSize].boxCountInStorage
 
+    def is_buy_urgent(self) -> bool:
+        return self.get_nb_box_to_buy() > 0 and self.get_nb_box_to_buy() >= self.get_max_storable_boxes() * self.productsData.strategy.urgentStorageRatio
+
     def get_estimated_duration_stock_emptying(self) -> float:
         """Will try to compute an estimation of how long it will take to empty the current stock of this product.
         The returned value has no specific unit, it is only used to sort the product to prioritize orders."""
@@ -176,9 +263,10 @@ class Product:
 
 
 class ProductsData:
-    def __init__(self, gameData: GameData, saveData: SaveData):
+    def __init__(self, gameData: GameData, saveData: SaveData, strategy: StrategyParams = None, priceCache: RecommendedPriceCache = None):
         self.gameData = gameData
         self.saveData = saveData
+        self.priceCache = priceCache
         self.byId: dict[int, Product] = {pId: Product(pSO, self) for pId, pSO in gameData.products.byId.items()}
         
         # getting live product data (license unlock, price, stock) from save file
@@ -209,8 +297,46 @@ class ProductsData:
             if box.productId in self.byId:
                 self.byId[box.productId].unstoredBoxes.append(box)
         
+        self.maxCheckoutsToDo = gameData.get_max_checkout_goal()
+        self.set_strategy(strategy if strategy is not None else StrategyParams())
+
         self.unlocked: list[Product] = sorted(
             list(filter(lambda p: p.is_unlocked(), self.byId.values())),
             key=lambda p: p.get_by_license_sort_key()
             )
-    
\ No newline at end of file
+
+    def set_strategy(self, strategy: StrategyParams):
+        """Changes the heuristics used by the recommendations. The prices that don't depend on them stay cached in the products."""
+        self.strategy = strategy
+        if strategy.exactPrices == "always":
+            self.exactPrices = True
+        elif strategy.exactPrices == "never":
+            self.exactPrices = False
+        else:
+            # exact prices are only convenient once the checkout goal of all cashiers is reached, and the players don't have to give the change anymore
+            self.exactPrices = self.saveData.progression.completedCheckoutCount >= self.maxCheckoutsToDo
+
+    def apply_daily_price_changes(self):
+        """Replaces the buying prices by the ones announced for the next day, to compute its recommendations in advance."""
+        for e in self.saveData.price.dailyPriceChanges:
+            p = self.byId[e.productId]
+            if p.currentPrice is None or abs(e.price - p.currentPrice) < 0.001:
+                continue
+            p.buyingPriceBeforeChange = p.currentPrice
+            p.currentPrice = e.price
+            if hasattr(p, "sellPriceForBestProfitPerChance"):
+                del p.sellPriceForBestProfitPerChance
+
+    def get_urgent_purchases(self, money: float) -> tuple[list[Product], float]:
+        """The products to buy urgently that can be paid with the provided money, the ones that will run out first
+        first, and the total price with an estimation of the shipping cost."""
+        candidates = sorted([p for p in self.unlocked if p.is_buy_urgent()], key=lambda p: p.get_estimated_duration_stock_emptying())
+        urgent: list[Product] = []
+        total = 0
+        for p in candidates:
+            productTotal = p.get_nb_box_to_buy() * p.currentPrice * p.productSO.productAmountOnPurchase + 1 # +1 for shipping cost, even if it's more complicated than that
+            if total + productTotal > money:
+                break
+            urgent.append(p)
+            total += productTotal
+        return urgent, total
@@ -0,0 +1,277 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Records the files written by the game in its save folder, and replays them to measure the time
+from each save to the updated report of the assistant.
+
+Record while playing with `python src/replay.py record PATH` (Ctrl+C to stop), then replay the recording
+with `python src/replay.py replay PATH [--speed N]`. The replay writes the files in a temporary folder used
+as the home folder of the assistant, started with the NDJSON output: the latency of a save is the time
+from the end of its write to the end of the report line printed after it."""
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from ansi.colour import fg
+
+from consoletable import ColumnDefinition, ConsoleTable, TextAlignment
+
+
+
+class RecordedWrite:
+    """A file of the save folder written by the game, and when, in seconds from the start of the recording."""
+
+    def __init__(self, time: float, name: str, blob: str):
+        self.time = time
+        self.name = name
+        self.blob = blob # name of the file of the recording with the content of the write
+
+
+
+class Recording:
+    """A recording on disk: a manifest with the writes, and one file per different content written."""
+
+    MANIFEST = "recording.json"
+
+    def __init__(self, directory: Path, writes: list[RecordedWrite] = None):
+        self.directory = directory
+        self.writes = writes if writes is not None else []
+
+    @staticmethod
+    def load(directory: Path) -> "Recording":
+        manifest = json.loads(directory.joinpath(Recording.MANIFEST).read_text(encoding="utf-8"))
+        return Recording(directory, [RecordedWrite(w["time"], w["name"], w["blob"]) for w in manifest["writes"]])
+
+    def save(self):
+        manifest = {"writes": [{"time": w.time, "name": w.name, "blob": w.blob} for w in self.writes]}
+        self.directory.joinpath(Recording.MANIFEST).write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+
+    def add(self, time: float, name: str, content: bytes):
+        blob = hashlib.blake2b(content, digest_size=16).hexdigest() + ".bin"
+        path = self.directory.joinpath(blob)
+        if not path.exists():
+            path.write_bytes(content)
+        self.writes.append(RecordedWrite(time, name, blob))
+
+    def read(self, write: RecordedWrite) -> bytes:
+        return self.directory.joinpath(write.blob).read_bytes()
+
+
+
+class SaveRecorder:
+    """Polls the save folder of the game and records each file that changes: the game data file and the saves.
+    The files present when the recording starts are recorded at time 0."""
+
+    def __init__(self, saveDir: Path, recording: Recording, pollInterval: float = 0.05):
+        self.saveDir = saveDir
+        self.recording = recording
+        self.pollInterval = pollInterval
+        self.states: dict[str, tuple[float, int]] = {} # (mtime, size) of each file, by name
+
+    def poll(self, now: float) -> int:
+        """Records the files modified since the previous poll. Return the number of recorded writes."""
+        recorded = 0
+        try:
+            with os.scandir(self.saveDir) as it:
+                entries = [e for e in it if e.is_file() and (e.name == "game-data.dat" or e.name.endswith(".es3"))]
+        except OSError:
+            return 0
+        for entry in entries:
+            try:
+                stat = entry.stat()
+                state = (stat.st_mtime, stat.st_size)
+                if self.states.get(entry.name) == state:
+                    continue
+                content = Path(entry.path).read_bytes()
+            except OSError:
+                continue # removed or still opened by the game, retried on the next poll
+            self.states[entry.name] = state
+            self.recording.add(now, entry.name, content)
+            recorded += 1
+        return recorded
+
+    def record(self, duration: float = None):
+        """Records until the duration is elapsed, or until interrupted with Ctrl+C."""
+        self.recording.directory.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        try:
+            self.poll(0.0)
+            while duration is None or time.perf_counter() - start < duration:
+                time.sleep(self.pollInterval)
+                if self.poll(time.perf_counter() - start) > 0:
+                    print(f"{len(self.recording.writes)} writes recorded", file=sys.stderr)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.recording.save()
+
+
+
+class LatencySample:
+
+    def __init__(self, write: RecordedWrite, latency: float):
+        self.write = write
+        self.latency = latency # None if no report came after the write
+
+
+
+class SaveReplayer:
+    """Replays a recording against the assistant, started in a temporary home folder.
+
+    The writes at time 0 are the initial state: they are written before starting the assistant, and its
+    first report is not measured. Each next write waits for its time (divided by the speed), and for the
+    report of the previous write, so each report is attributed to the write that caused it. A write with
+    the same content as the previous write of the file is replayed, but no report is expected after it."""
+
+    def __init__(self, recording: Recording, command: list[str], speed: float = 1.0, timeout: float = 30.0):
+        self.recording = recording
+        self.command = command
+        self.speed = speed
+        self.timeout = timeout
+
+    @staticmethod
+    def write_file(path: Path, content: bytes):
+        tmpPath = path.with_name(path.name + ".tmp")
+        tmpPath.write_bytes(content)
+        os.replace(tmpPath, path)
+
+    @staticmethod
+    def read_lines(stream, lines: queue.Queue):
+        for _ in iter(stream.readline, b""):
+            lines.put(time.perf_counter())
+        lines.put(None)
+
+    def wait_report(self, lines: queue.Queue) -> float:
+        """The time of the next report line, or None if it did not come before the timeout."""
+        try:
+            lineTime = lines.get(timeout=self.timeout)
+        except queue.Empty:
+            return None
+        if lineTime is None:
+            raise RuntimeError(f"{self.command} stopped during the replay")
+        return lineTime
+
+    def replay(self) -> list[LatencySample]:
+        initial = [w for w in self.recording.writes if w.time == 0.0]
+        following = [w for w in self.recording.writes if w.time != 0.0]
+        with tempfile.TemporaryDirectory() as home:
+            saveDir = Path(home).joinpath("AppData", "LocalLow", "Nokta Games", "Supermarket Simulator")
+            saveDir.mkdir(parents=True)
+            lastBlobs: dict[str, str] = {}
+            for w in initial:
+                SaveReplayer.write_file(saveDir.joinpath(w.name), self.recording.read(w))
+                lastBlobs[w.name] = w.blob
+
+            env = dict(os.environ, HOME=home, USERPROFILE=home) # Path.home() on Linux/macOS, and on Windows
+            process = subprocess.Popen(self.command + ["--output", "ndjson", "--no-cache"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env)
+            try:
+                lines: queue.Queue = queue.Queue()
+                threading.Thread(target=SaveReplayer.read_lines, args=(process.stdout, lines), daemon=True).start()
+                if self.wait_report(lines) is None:
+                    raise RuntimeError(f"{self.command} did not show a first report in {self.timeout}s")
+
+                samples: list[LatencySample] = []
+                start = time.perf_counter()
+                for w in following:
+                    delay = start + w.time / self.speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    SaveReplayer.write_file(saveDir.joinpath(w.name), self.recording.read(w))
+                    writeTime = time.perf_counter()
+                    if lastBlobs.get(w.name) == w.blob:
+                        continue # the assistant skips the files rewritten with the same content
+                    lastBlobs[w.name] = w.blob
+                    reportTime = self.wait_report(lines)
+                    samples.append(LatencySample(w, reportTime - writeTime if reportTime is not None else None))
+                return samples
+            finally:
+                process.kill()
+                process.wait()
+
+
+
+def get_percentile(values: list[float], percent: float) -> float:
+    """Nearest-rank percentile of the values."""
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(percent / 100 * len(values) + 0.5) - 1))]
+
+def get_latency_summary(samples: list[LatencySample]) -> list[tuple[str, float]]:
+    latencies = [s.latency for s in samples if s.latency is not None]
+    if len(latencies) == 0:
+        return []
+    return [("p50", get_percentile(latencies, 50)), ("p90", get_percentile(latencies, 90)), ("p99", get_percentile(latencies, 99)),
+            ("max", max(latencies))]
+
+def get_command(executable: Path) -> list[str]:
+    """The command to start the assistant: the packaged executable if provided, or the sources with the current interpreter."""
+    if executable is not None:
+        return [str(executable)]
+    return [sys.executable, str(Path(__file__).parent)]
+
+
+
+def main() -> int:
+    argParser = argparse.ArgumentParser(prog="replay", description="Records the saves of the game, and replays them to measure the latency of the assistant.")
+    subParsers = argParser.add_subparsers(dest="command", required=True)
+    recordParser = subParsers.add_parser("record", help="record the writes of the game in its save folder, until Ctrl+C.")
+    recordParser.add_argument("path", type=Path, help="folder of the recording.")
+    recordParser.add_argument("--duration", metavar="SECONDS", type=float, help="stop the recording after this time.")
+    recordParser.add_argument("--save-dir", metavar="PATH", type=Path,
+                              default=Path.home().joinpath("AppData", "LocalLow", "Nokta Games", "Supermarket Simulator"),
+                              help="save folder of the game (default: %(default)s).")
+    replayParser = subParsers.add_parser("replay", help="replay a recording and print the save-to-report latencies.")
+    replayParser.add_argument("path", type=Path, help="folder of the recording.")
+    replayParser.add_argument("--speed", metavar="N", type=float, default=1.0,
+                              help="replay N times faster than recorded (default: %(default)s).")
+    replayParser.add_argument("--executable", metavar="PATH", type=Path,
+                              help="packaged executable to measure, instead of the sources.")
+    args = argParser.parse_args()
+
+    if args.command == "record":
+        recording = Recording(args.path)
+        SaveRecorder(args.save_dir, recording).record(args.duration)
+        print(f"{len(recording.writes)} writes recorded in {args.path}", file=sys.stderr)
+        return 0
+
+    samples = SaveReplayer(Recording.load(args.path), get_command(args.executable), args.speed).replay()
+    ConsoleTable.print_objects(samples, [
+        ColumnDefinition("Time"   , lambda s: f"{s.write.time:.1f} s", alignment=TextAlignment.RIGHT),
+        ColumnDefinition("File"   , lambda s: s.write.name),
+        ColumnDefinition("Latency", lambda s: f"{s.latency:.3f} s" if s.latency is not None else "no report",
+                                    lambda s: "" if s.latency is not None else fg.red, alignment=TextAlignment.RIGHT),
+    ])
+    for name, value in get_latency_summary(samples):
+        print(f"{name}: {value:.3f} s")
+    return 0
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,629 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import math
+from datetime import datetime
+from typing import Any, Generic, TypeVar
+from collections.abc import Callable
+
+from ansi.colour import fg, fx
+
+from consoletable import CachedObjectsTable, ConsoleTable, ColumnDefinition, TextAlignment
+from gamedata import GameData, ProductLicenseSO
+from products import ProductsData, Product, RecommendedPriceCache, StrategyParams
+from licenseplanner import LicensePlanner, LicensePlanStep
+from displayplanner import DisplayPlanner
+from pricefrontier import PriceFrontiers
+from cashflow import CashFlowProjection
+from salessimulator import CustomerModel, ProductProfitModel, SalesEstimate, SalesSimulator
+from restockersimulator import RestockerSimulator
+from savefile import SaveData, Expense
+
+
+
+def as_price(value: float) -> str:
+    return "-.--$" if value is None else f"{'%.2f' % (value)}$"
+
+
+
+R = TypeVar('R')
+
+class ReportSection(Generic[R]):
+    """A section of the report: a title, some notes, a table of rows and a footer.
+
+    Each row also has a stable id and a machine-readable record, used by the structured
+    outputs of the report."""
+
+    def __init__(self, key: str, title: str, titleColor: str, rows: list[R], columns: list[ColumnDefinition[R]],
+                 rowId: Callable[[R], Any], rowRecord: Callable[[R], dict]):
+        self.key = key
+        self.title = title
+        self.titleColor = titleColor
+        self.rows = rows
+        self.columns = columns
+        self.table = CachedObjectsTable(columns)
+        self.rowId = rowId
+        self.rowRecord = rowRecord
+        self.notes: list[tuple[str, str]] = [] # (color, text) printed before the table
+        self.footers: list[tuple[str, str]] = [] # (color, text) printed after the table
+        self.summary: dict[str, Any] = {}
+        self.alwaysShown = False
+
+    def is_shown(self) -> bool:
+        return self.alwaysShown or len(self.rows) > 0
+
+    def render(self, screenWidth: int) -> list[str]:
+        """Renders the section for the console, as a list of lines."""
+        return self.render_head() + self.render_rows(self.rows, screenWidth) + self.render_foot() + [""]
+
+    def render_head(self) -> list[str]:
+        return [f"{self.titleColor}{self.title}:{fx.reset}"] + [f"{color}{text}{fx.reset}" for color, text in self.notes]
+
+    def render_rows(self, rows: list[R], screenWidth: int) -> list[str]:
+        """Renders the table of the provided rows, that may only be a part of the rows of the section."""
+        return self.table.render(rows, screenWidth).split("\n")
+
+    def render_foot(self) -> list[str]:
+        return [f"{color}{text}{fx.reset}" for color, text in self.footers]
+
+    def get_row_texts(self, row: R) -> list[str]:
+        """The text of each column of a row, used to sort and filter the rows."""
+        return self.table.get_row_cells(row)[0]
+
+    def get_records(self) -> dict[str, dict]:
+        """The records of each row, by row id (as a string, to be usable as JSON keys)."""
+        return {str(self.rowId(r)): self.rowRecord(r) for r in self.rows}
+
+    def to_json(self) -> dict:
+        return {
+            "title": self.title,
+            "notes": [text for _, text in self.notes],
+            "summary": self.summary,
+            "rows": self.get_records(),
+        }
+
+
+
+class LicensesReportSection(ReportSection[ProductLicenseSO]):
+    """The licenses section prints one license table and one product table per license."""
+
+    def __init__(self, key: str, title: str, titleColor: str, rows: list[ProductLicenseSO], columns: list[ColumnDefinition[ProductLicenseSO]],
+                 productsData: ProductsData, productColumns: list[ColumnDefinition[Product]], productRecord: Callable[[Product], dict],
+                 licenseRecord: Callable[[ProductLicenseSO], dict] = (lambda _: {})):
+        super().__init__(key, title, titleColor, rows, columns, lambda l: l.id,
+                         lambda l: {"id": l.id, "cost": l.purchasingCost, "requiredLevel": l.requiredPlayerLevel} | licenseRecord(l)
+                                   | {"products": [productRecord(p) for p in self.get_products(l)]})
+        self.productsData = productsData
+        self.productTable = CachedObjectsTable(productColumns)
+
+    def get_products(self, l: ProductLicenseSO) -> list[Product]:
+        return [self.productsData.byId[pSO.id] for pSO in l.products]
+
+    def render(self, screenWidth: int) -> list[str]:
+        return self.render_head() + self.render_rows(self.rows, screenWidth)
+
+    def render_rows(self, rows: list[ProductLicenseSO], screenWidth: int) -> list[str]:
+        lines = []
+        for l in rows:
+            lines += self.table.render([l], screenWidth).split("\n")
+            lines += self.productTable.render(self.get_products(l), screenWidth).split("\n")
+            lines.append("")
+        return lines
+
+    def get_row_texts(self, row: ProductLicenseSO) -> list[str]:
+        return super().get_row_texts(row) + [p.localizedName for p in self.get_products(row)]
+
+
+
+def product_base_record(p: Product) -> dict:
+    return {"id": p.productSO.id, "name": p.localizedName, "brand": p.productSO.brand}
+
+def product_stock_record(p: Product) -> dict:
+    return product_base_record(p) | {
+        "displayed": p.get_nb_displayed_items(),
+        "displayedPerSlot": p.get_nb_displayed_items_per_slot(),
+        "stored": p.get_nb_stored_items(),
+        "storedBoxes": p.get_nb_stored_boxes(),
+        "storedPerBox": p.get_nb_items_in_stored_boxes(),
+        "unstored": p.get_nb_unstored_box_items(),
+        "unstoredBoxes": p.get_nb_unstored_boxes(),
+        "unstoredPerBox": p.get_nb_items_in_unstored_boxes(),
+    }
+
+def product_box_buy_record(p: Product) -> dict:
+    return product_base_record(p) | {
+        "toBuy": p.get_nb_box_to_buy(),
+        "total": p.get_nb_box_to_buy() * p.currentPrice * p.productSO.productAmountOnPurchase,
+        "unitPrice": p.currentPrice,
+        "perBox": p.productSO.productAmountOnPurchase,
+        "boxPrice": p.currentPrice * p.productSO.productAmountOnPurchase,
+    }
+
+COLUMN_STORAGE: ColumnDefinition[Product] = ColumnDefinition("Storage #it #boxes #/boxes", lambda b: f"{str(b.get_nb_stored_items()).rjust(3)} {str(b.get_nb_stored_boxes()).rjust(2)} {','.join(['[' + ','.join([str(vv) for vv in v]) + ']' for v in b.get_nb_items_in_stored_boxes()])}")
+COLUMN_UNSTORED: ColumnDefinition[Product] = ColumnDefinition("Unstored", lambda b: f"{str(b.get_nb_unstored_box_items()).rjust(3)} {str(b.get_nb_unstored_boxes()).rjust(2)} [{','.join([str(v) for v in b.get_nb_items_in_unstored_boxes()])}]")
+
+def get_expense_ids(expenses: list[Expense]) -> dict[int, str]:
+    """Stable ids of the expenses (by python object id), built from their type and date."""
+    ids: dict[int, str] = {}
+    counts: dict[tuple, int] = {}
+    for e in expenses:
+        k = (e.paymentTypeId, e.date)
+        counts[k] = counts.get(k, 0) + 1
+        ids[id(e)] = f"{e.paymentTypeId}-{e.date}-{counts[k]}"
+    return ids
+
+
+
+class Report:
+    """Everything the assistant has to tell the player, computed from the game data and the last save."""
+
+    def __init__(self, gameData: GameData, saveData: SaveData, customerModel: CustomerModel = None, salesSimulator: SalesSimulator = None,
+                 strategy: StrategyParams = None, cashFlowHorizon: int = 7, restockerSimulator: RestockerSimulator = None,
+                 priceSteps: list[float] = None, priceCache: RecommendedPriceCache = None, nextDay: bool = False):
+        """nextDay: computed with the buying prices announced for the next day, instead of the current ones."""
+        if customerModel is None:
+            customerModel = CustomerModel()
+        self.gameData = gameData
+        self.saveData = saveData
+        self.productsData = ProductsData(gameData, saveData, strategy, priceCache)
+        self.nextDay = nextDay
+        if nextDay:
+            self.productsData.apply_daily_price_changes()
+        self.sections: list[ReportSection] = []
+
+        productsData = self.productsData
+
+        # #############################################################################
+        # ############################### General data ################################
+        # #############################################################################
+
+        section = ReportSection("general", "General game data", fg.brightgreen, [saveData], [
+            ColumnDefinition("Save time", lambda s: datetime.fromtimestamp(int(s.modificationTime)), alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Game day", lambda s: s.progression.currentDay, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Money"   , lambda s: as_price(s.progression.money), alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Level"   , lambda s: s.progression.currentStoreLevel, alignment=TextAlignment.RIGHT),
+        ], lambda _: 0, lambda s: {
+            "saveTime": datetime.fromtimestamp(int(s.modificationTime)).isoformat(),
+            "day": s.progression.currentDay,
+            "money": s.progression.money,
+            "level": s.progression.currentStoreLevel,
+        })
+        section.alwaysShown = True
+        self.sections.append(section)
+
+        # #############################################################################
+        # ############################ Show awaiting bills ############################
+        # #############################################################################
+
+        bills = CashFlowProjection.get_expenses(saveData)
+        currentDay = saveData.progression.currentDay
+        billIds = get_expense_ids(bills)
+
+        self.sections.append(ReportSection("bills", "Bills to pay", fg.brightred, bills, [
+            ColumnDefinition("Expense Day", lambda b: b.date, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Type"       , lambda b: gameData.playerPaymentTypeLocalization[b.paymentType.value]),
+            ColumnDefinition("Amount"     , lambda b: as_price(b.amount), alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Late fee"   , lambda b: as_price(b.get_amount_to_pay(currentDay) - b.amount), alignment=TextAlignment.RIGHT),
+        ], lambda b: billIds[id(b)], lambda b: {
+            "date": b.date,
+            "type": gameData.playerPaymentTypeLocalization[b.paymentType.value],
+            "amount": b.amount,
+            "lateFee": b.get_amount_to_pay(currentDay) - b.amount,
+        }))
+        billsSum = CashFlowProjection.get_pending_expenses_cost(saveData)
+        self.playerMoneyAfterBills = saveData.progression.money - billsSum
+
+        # #############################################################################
+        # ############################# Show pricing data #############################
+        # #############################################################################
+
+        exactPrices = productsData.exactPrices
+
+        productList: list[Product] = list(productsData.unlocked)
+        productList = list(filter(lambda p: abs(p.get_recommended_price() - p.selling_price()) > 0.01, productList))
+
+        priceColumns: list[ColumnDefinition[Product]] = [
+            #ColumnDefinition("Id"           , lambda b: b.productSO.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
+            #ColumnDefinition("Lic."         , lambda b: b.productSO.license.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Name"         , lambda b: b.localizedName),
+            ColumnDefinition("Brand"        , lambda b: b.productSO.brand),
+            ColumnDefinition("Curr. $"      , lambda b: as_price(b.selling_price()),
+                                              lambda _: fg.red, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("New $"        , lambda b: as_price(b.get_recommended_price()),
+                                              lambda _: fg.brightgreen, alignment=TextAlignment.RIGHT),
+            #ColumnDefinition("Base price"   , lambda b: as_price(b.productSO.basePrice), alignment=TextAlignment.RIGHT),
+            #ColumnDefinition("Price range"  , lambda b: f"{as_price(b.productSO.minDynamicPrice)} - {as_price(b.productSO.maxDynamicPrice)}", alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Opt/Max rate" , lambda b: f"{round(b.productSO.optimumProfitRate)}%-{str(round(b.productSO.maxProfitRate)).rjust(3)}%", alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Buy $"        , lambda b: as_price(b.currentPrice) if b.buyingPriceBeforeChange is None else f"{as_price(b.buyingPriceBeforeChange)} -> {as_price(b.currentPrice)}",
+                                              lambda b: fg.yellow if b.buyingPriceBeforeChange is not None else "", alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Opt $"        , lambda b: as_price(b.optimum_price()), alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Opt+ $"       , lambda b: as_price(b.optimum_price_100prcent_sell()), alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Opt00$/chance", lambda b: as_price(b.get_best_rounded_price()) + f"-{str(round(b.get_purchase_chance_of_sell_price(b.get_best_rounded_price()))).rjust(3)}%",
+                                              alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Opt++$/chance", lambda b: as_price(b.get_sell_price_for_best_profit_per_chance()) + f"-{str(round(b.get_purchase_chance_of_sell_price(b.get_sell_price_for_best_profit_per_chance()))).rjust(3)}%",
+                                              alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Max $"        , lambda b: as_price(b.max_price()), alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Curr $/chance", lambda b: as_price(b.selling_price()) + f"-{str(round(b.get_purchase_chance(), 1)).rjust(5)}%", alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Profit/sell"  , lambda b: as_price(b.selling_price() - b.currentPrice), alignment=TextAlignment.RIGHT),
+            #ColumnDefinition("Profit*chance", lambda b: as_price(b.get_profit_per_chance()), alignment=TextAlignment.RIGHT),
+            #ColumnDefinition("Avg cost"     , lambda b: as_price(b.averageCosts), alignment=TextAlignment.RIGHT),
+            #ColumnDefinition("Sell price change", lambda b: "" if b.dailyPriceChange is None else f"{as_price(b.previousPrice)} -> {as_price(b.dailyPriceChange)}"),
+        ]
+
+        # best price at each price step of the player, from the price frontiers of all the products at once
+        frontiers = [PriceFrontiers(productList, step) for step in priceSteps] if priceSteps is not None else []
+        for frontier in frontiers:
+            priceColumns.insert(-3, ColumnDefinition(f"Step {frontier.step:g}$", lambda b, f=frontier: as_price(f.byId[b.productSO.id].get_best()[0])
+                                                     + f"-{str(round(f.byId[b.productSO.id].get_best()[1])).rjust(3)}%", alignment=TextAlignment.RIGHT))
+
+        def frontier_record(b: Product) -> dict:
+            return {f"{f.step:g}": {"bestPrice": f.byId[b.productSO.id].get_best()[0], "bestPriceChance": f.byId[b.productSO.id].get_best()[1],
+                                    "prices": f.byId[b.productSO.id].prices, "chances": f.byId[b.productSO.id].chances} for f in frontiers}
+
+        section = ReportSection("prices", "Products to update prices", fg.brightred, productList, priceColumns, lambda b: b.productSO.id, lambda b: product_base_record(b) | {
+            "currentPrice": b.selling_price(),
+            "newPrice": b.get_recommended_price(),
+            "optimumProfitRate": b.productSO.optimumProfitRate,
+            "maxProfitRate": b.productSO.maxProfitRate,
+            "buyPrice": b.currentPrice,
+            "optimumPrice": b.optimum_price(),
+            "optimumPrice100PercentSell": b.optimum_price_100prcent_sell(),
+            "bestRoundedPrice": b.get_best_rounded_price(),
+            "bestRoundedPriceChance": b.get_purchase_chance_of_sell_price(b.get_best_rounded_price()),
+            "bestPrice": b.get_sell_price_for_best_profit_per_chance(),
+            "bestPriceChance": b.get_purchase_chance_of_sell_price(b.get_sell_price_for_best_profit_per_chance()),
+            "maxPrice": b.max_price(),
+            "currentChance": b.get_purchase_chance(),
+            "profitPerSell": b.selling_price() - b.currentPrice,
+        } | ({"priceSteps": frontier_record(b)} if len(frontiers) > 0 else {})
+          | ({"buyPriceBeforeChange": b.buyingPriceBeforeChange} if nextDay else {}))
+        section.summary["exactPrices"] = exactPrices
+        section.summary["nextDay"] = nextDay
+        if nextDay:
+            section.notes.append((fg.yellow, f"Prices of day {saveData.progression.currentDay + 1}, computed in advance with the announced buying prices. "
+                                             "They will be updated with the next save."))
+        if exactPrices:
+            section.notes.append((fg.green, "Using exact prices because you have reached the maximum checkout goal to hire all cashiers."))
+        else:
+            remainingCheckouts = productsData.maxCheckoutsToDo - saveData.progression.completedCheckoutCount
+            section.summary["remainingCheckouts"] = remainingCheckouts
+            section.notes.append((fg.green, f"Using rounded prices because you still need to do {remainingCheckouts} checkout{'s' if remainingCheckouts > 1 else ''} before you can hire all cashiers."))
+        self.sections.append(section)
+
+        # #############################################################################
+        # ############################# Displays to fill ##############################
+        # #############################################################################
+
+        hasRestockers = len(saveData.employees.restockers) > 0
+
+        productList: list[Product] = list(productsData.unlocked)
+        productList = list(filter(lambda p: (len(p.displaySlots) == 0 or p.get_nb_displayed_items() < p.get_max_displayed_items_total()), productList)) # keep products with no display slot or when existing slots are not full
+        productList = list(filter(lambda p: (p.get_nb_stored_items() + p.get_nb_unstored_box_items()) > 0, productList)) # keep product that have stock in existing boxes
+        if hasRestockers:
+            productList = list(filter(lambda p: p.get_nb_stored_items() < p.get_max_displayed_items_total() - p.get_nb_displayed_items() and p.get_nb_unstored_box_items() > 0, productList)) # keep product that restockers can't fully restock themselves
+        productList = sorted(productList, key=lambda p: p.get_by_license_sort_key())
+
+        section = ReportSection("shelves", "Store shelves that restockers can't fully restock themselves" if hasRestockers else "Store shelves to fill", fg.brightred, productList, [
+            #ColumnDefinition("Id"      , lambda b: b.productSO.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
+            #ColumnDefinition("Lic."    , lambda b: b.productSO.license.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Name"    , lambda b: b.localizedName),
+            ColumnDefinition("Brand"   , lambda b: b.productSO.brand),
+            ColumnDefinition("Max/slot", lambda b: b.productSO.productAmountOnDisplay),
+            ColumnDefinition("Display #it #/slot", lambda b: f"{str(b.get_nb_displayed_items()).rjust(2)} [{','.join([str(v) for v in b.get_nb_displayed_items_per_slot()])}]"),
+            COLUMN_STORAGE,
+            COLUMN_UNSTORED,
+        ], lambda b: b.productSO.id, lambda b: product_stock_record(b) | {"maxPerSlot": b.productSO.productAmountOnDisplay})
+        section.summary["restockers"] = hasRestockers
+        self.sections.append(section)
+
+        # #############################################################################
+        # ########################## Shelves that will be empty #######################
+        # #############################################################################
+
+        if restockerSimulator is not None:
+            predictions = [p for p in restockerSimulator.predict(productsData) if p.emptyProbability > 0]
+            predictions.sort(key=lambda p: (-p.emptyProbability, p.averageEmptyTime))
+
+            section = ReportSection("shelvesForecast", "Shelves that will be empty before they are refilled", fg.brightred, predictions, [
+                ColumnDefinition("Name"        , lambda p: p.product.localizedName),
+                ColumnDefinition("Brand"       , lambda p: p.product.productSO.brand),
+                ColumnDefinition("Display #it" , lambda p: p.product.get_nb_displayed_items(), alignment=TextAlignment.RIGHT),
+                ColumnDefinition("Storage #it" , lambda p: p.product.get_nb_stored_items(), alignment=TextAlignment.RIGHT),
+                ColumnDefinition("Empty"       , lambda p: f"{round(p.emptyProbability * 100)}%",
+                                                 lambda p: fg.red if p.emptyProbability >= 0.5 else "", alignment=TextAlignment.RIGHT),
+                ColumnDefinition("Empty after" , lambda p: f"{round(p.averageEmptyTime * 100)}% of the day", alignment=TextAlignment.RIGHT),
+                ColumnDefinition("Missed sales", lambda p: f"{p.expectedMissedSales:.1f}", alignment=TextAlignment.RIGHT),
+            ], lambda p: p.product.productSO.id, lambda p: product_stock_record(p.product) | {
+                "emptyProbability": p.emptyProbability,
+                "emptyAfter": p.averageEmptyTime,
+                "sales": p.expectedSales,
+                "missedSales": p.expectedMissedSales,
+            })
+            nbRestockers = len(saveData.employees.restockers)
+            section.summary |= {"days": restockerSimulator.days, "restockers": nbRestockers}
+            section.notes.append((fg.green, f"Simulation of {restockerSimulator.days} days with {nbRestockers} restocker{'s' if nbRestockers > 1 else ''}"
+                                            f" and {restockerSimulator.customerModel.customersPerDay:g} customers per day, from the current display and storage."))
+            self.sections.append(section)
+
+        # #############################################################################
+        # ############################## Boxes to store ###############################
+        # #############################################################################
+
+        productList: list[Product] = list(productsData.unlocked)
+        productList = list(filter(lambda p: p.get_nb_unstored_boxes() > 0 and p.get_nb_box_spots_in_storage() > 0
+                                , productList))
+        productList = sorted(productList, key=lambda p: p.get_by_license_sort_key())
+
+        self.sections.append(ReportSection("storeBoxes", "Boxes to put in storage shelves", fg.brightred, productList, [
+            #ColumnDefinition("Id"      , lambda b: b.productSO.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
+            #ColumnDefinition("Lic."    , lambda b: b.productSO.license.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Name"    , lambda b: b.localizedName),
+            ColumnDefinition("Brand"   , lambda b: b.productSO.brand),
+            COLUMN_STORAGE,
+            COLUMN_UNSTORED,
+        ], lambda b: b.productSO.id, product_stock_record))
+
+        # #############################################################################
+        # ############################## Boxes to merge ###############################
+        # #############################################################################
+
+        productList: list[Product] = list(productsData.unlocked)
+        productList = list(filter(lambda p: math.ceil(sum(p.get_nb_items_in_all_nonfull_boxes()) / p.productSO.productAmountOnPurchase) < len(p.get_nb_items_in_all_nonfull_boxes()), productList))
+        productList = sorted(productList, key=lambda p: p.get_by_license_sort_key())
+
+        self.sections.append(ReportSection("mergeBoxes", "Boxes to merge contents", fg.brightred, productList, [
+            #ColumnDefinition("Id"      , lambda b: b.productSO.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
+            #ColumnDefinition("Lic."    , lambda b: b.productSO.license.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Name"    , lambda b: b.localizedName),
+            ColumnDefinition("Brand"   , lambda b: b.productSO.brand),
+            COLUMN_STORAGE,
+            COLUMN_UNSTORED,
+        ], lambda b: b.productSO.id, product_stock_record))
+
+        # #############################################################################
+        # ############################# Show boxes to buy #############################
+        # #############################################################################
+
+        productList: list[Product] = list(productsData.unlocked)
+        productList = list(filter(lambda p: p.get_nb_box_to_buy() > 0, productList))
+
+        productBuyColumns: list[ColumnDefinition[Product]] = [
+            #ColumnDefinition("Id"      , lambda b: b.productSO.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
+            #ColumnDefinition("Lic."    , lambda b: b.productSO.license.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Name"    , lambda b: b.localizedName),
+            ColumnDefinition("Brand"   , lambda b: b.productSO.brand),
+            ColumnDefinition("To buy"  , lambda b: b.get_nb_box_to_buy(),
+                                        lambda _: fg.boldgreen, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Total"   , lambda b: as_price(b.get_nb_box_to_buy() * b.currentPrice * b.productSO.productAmountOnPurchase),
+                                        lambda _: fg.boldcyan, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Unit $"  , lambda b: as_price(b.currentPrice), alignment=TextAlignment.RIGHT),
+            ColumnDefinition("#/box"   , lambda b: b.productSO.productAmountOnPurchase, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Box $"   , lambda b: as_price(b.currentPrice * b.productSO.productAmountOnPurchase), alignment=TextAlignment.RIGHT),
+            #ColumnDefinition("Prio"    , lambda b: round(b.get_estimated_duration_stock_emptying(), 1), alignment=TextAlignment.RIGHT),
+            #COLUMN_STORAGE,
+            #COLUMN_UNSTORED,
+        ]
+
+        productListUrgent, productListBuySum = productsData.get_urgent_purchases(self.playerMoneyAfterBills)
+        productListUrgentIds: set[int] = {p.productSO.id for p in productListUrgent}
+
+        productListUrgent.sort(key=lambda p: p.get_by_license_sort_key())
+        section = ReportSection("buyUrgent", "Boxes to buy urgently", fg.brightred, productListUrgent, productBuyColumns,
+                                lambda b: b.productSO.id, product_box_buy_record)
+        section.summary["total"] = productListBuySum
+        section.footers.append((fg.brightblue, f"Total amount with estimated shipping: {fg.boldcyan}{as_price(productListBuySum)}"))
+        self.sections.append(section)
+
+        productListNonUrgent = list(filter(lambda p: not p.productSO.id in productListUrgentIds, productList))
+        productListNonUrgent.sort(key=lambda p: p.get_by_license_sort_key())
+        productListNonUrgentSum = sum([b.get_nb_box_to_buy() * b.currentPrice * b.productSO.productAmountOnPurchase for b in productListNonUrgent])
+        section = ReportSection("buyEventually", "Boxes to buy eventually", fg.red, productListNonUrgent, productBuyColumns,
+                                lambda b: b.productSO.id, product_box_buy_record)
+        section.summary["total"] = productListNonUrgentSum
+        section.footers.append((fg.brightblue, f"Total amount without shipping: {fg.boldcyan}{as_price(productListNonUrgentSum)}"))
+        self.sections.append(section)
+
+        # #############################################################################
+        # ############################### Sales forecast ##############################
+        # #############################################################################
+
+        if salesSimulator is not None:
+            forecast = salesSimulator.forecast(productsData)
+            rows = sorted(forecast.get_rows(), key=lambda r: -r[0].stockOutProbability)
+
+            def sales_record(e: SalesEstimate) -> dict:
+                return {"price": e.price, "sales": e.expectedSales, "salesStdDev": e.salesStdDev, "stockOutProbability": e.stockOutProbability,
+                        "revenue": e.expectedRevenue, "profit": e.expectedProfit}
+
+            section = ReportSection("salesForecast", "Sales forecast for the next day", fg.brightblue, rows, [
+                ColumnDefinition("Name"        , lambda r: r[0].product.localizedName),
+                ColumnDefinition("Brand"       , lambda r: r[0].product.productSO.brand),
+                ColumnDefinition("Stock"       , lambda r: SalesSimulator.get_available_stock(r[0].product, hasRestockers), alignment=TextAlignment.RIGHT),
+                ColumnDefinition("Curr. $"     , lambda r: as_price(r[0].price), alignment=TextAlignment.RIGHT),
+                ColumnDefinition("Sales"       , lambda r: f"{r[0].expectedSales:.1f} ±{r[0].salesStdDev:.1f}", alignment=TextAlignment.RIGHT),
+                ColumnDefinition("Out"         , lambda r: f"{round(r[0].stockOutProbability * 100)}%",
+                                                 lambda r: fg.red if r[0].stockOutProbability >= 0.5 else "", alignment=TextAlignment.RIGHT),
+                ColumnDefinition("Profit"      , lambda r: as_price(r[0].expectedProfit), alignment=TextAlignment.RIGHT),
+                ColumnDefinition("New $"       , lambda r: as_price(r[1].price), lambda _: fg.brightgreen, alignment=TextAlignment.RIGHT),
+                ColumnDefinition("Sales"       , lambda r: f"{r[1].expectedSales:.1f} ±{r[1].salesStdDev:.1f}", alignment=TextAlignment.RIGHT),
+                ColumnDefinition("Out"         , lambda r: f"{round(r[1].stockOutProbability * 100)}%",
+                                                 lambda r: fg.red if r[1].stockOutProbability >= 0.5 else "", alignment=TextAlignment.RIGHT),
+                ColumnDefinition("Profit"      , lambda r: as_price(r[1].expectedProfit), alignment=TextAlignment.RIGHT),
+            ], lambda r: r[0].product.productSO.id, lambda r: product_base_record(r[0].product) | {
+                "stock": SalesSimulator.get_available_stock(r[0].product, hasRestockers),
+                "current": sales_record(r[0]),
+                "recommended": sales_record(r[1]),
+            })
+            currentProfit = sum(e.expectedProfit for e in forecast.current)
+            recommendedProfit = sum(e.expectedProfit for e in forecast.recommended)
+            section.summary |= {"days": forecast.days, "customersPerDay": forecast.customerModel.customersPerDay,
+                                "productsPerCustomer": forecast.customerModel.productsPerCustomer,
+                                "currentProfit": currentProfit, "recommendedProfit": recommendedProfit}
+            section.notes.append((fg.green, f"Simulation of {forecast.days} days with {forecast.customerModel.customersPerDay:g} customers per day, "
+                                            f"looking for {forecast.customerModel.productsPerCustomer:g} products each."))
+            section.footers.append((fg.brightblue, f"Expected profit of the day: {fg.boldcyan}{as_price(currentProfit)}{fg.brightblue} at the current prices, "
+                                                   f"{fg.boldcyan}{as_price(recommendedProfit)}{fg.brightblue} at the new prices"))
+            self.sections.append(section)
+
+        # #############################################################################
+        # ############################ Show next licenses #############################
+        # #############################################################################
+
+        unlockedLicenses = set(saveData.progression.unlockedLicenses)
+        unlockableLicenses: list[ProductLicenseSO] = [l for l in gameData.get_licenses_up_to_level(saveData.progression.currentStoreLevel) if l.id not in unlockedLicenses]
+
+        profitModel = ProductProfitModel(productsData, customerModel)
+        licensePlanner = LicensePlanner(productsData, profitModel, self.playerMoneyAfterBills)
+        licensePlan: dict[int, LicensePlanStep] = {s.estimate.license.id: s for s in licensePlanner.plan(unlockableLicenses)}
+        unlockableLicenses.sort(key=lambda l: licensePlan[l.id].order)
+
+        def as_days(days: float) -> str:
+            return "never" if days == math.inf else f"{days:.1f} days"
+
+        def as_json_days(days: float) -> float:
+            return None if days == math.inf else days
+
+        licenseColumns: list[ColumnDefinition[ProductLicenseSO]] = [
+            ColumnDefinition("License: Id"        , lambda l: l.id, lambda _: fg.darkgray, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Cost"              , lambda l: as_price(l.purchasingCost), alignment=TextAlignment.RIGHT),
+            ColumnDefinition("With 1st boxes"    , lambda l: as_price(licensePlan[l.id].estimate.investment), alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Profit/day"        , lambda l: as_price(licensePlan[l.id].estimate.dailyProfit) + ("*" if licensePlan[l.id].estimate.unknownPrices > 0 else ""),
+                                                   alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Payback"           , lambda l: as_days(licensePlan[l.id].estimate.paybackDays), alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Buy order"         , lambda l: f"#{licensePlan[l.id].order} " + ("now" if licensePlan[l.id].day == 0 else f"in {as_days(licensePlan[l.id].day)}"),
+                                                   lambda l: fg.brightgreen if licensePlan[l.id].day == 0 else "", alignment=TextAlignment.RIGHT),
+        ]
+
+        productColumns: list[ColumnDefinition[Product]] = [
+            ColumnDefinition("Products: Name"     , lambda b: b.localizedName),
+            ColumnDefinition("Brand"              , lambda b: b.productSO.brand),
+            ColumnDefinition("Price (min-max)"    , lambda b: f"{as_price(b.productSO.minDynamicPrice).rjust(7)}-{as_price(b.productSO.maxDynamicPrice).rjust(7)}", alignment=TextAlignment.RIGHT),
+            ColumnDefinition("#/box"              , lambda b: b.productSO.productAmountOnPurchase, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Box price (min-max)", lambda b: f"{as_price(b.productSO.minDynamicPrice * b.productSO.productAmountOnPurchase).rjust(7)}-{as_price(b.productSO.maxDynamicPrice * b.productSO.productAmountOnPurchase).rjust(7)}", alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Box size (#/stor.)" , lambda b: f"{b.productSO.boxSize.name.lower()} ({gameData.boxes.byBoxSize[b.productSO.boxSize].boxCountInStorage})"),
+            ColumnDefinition("Display"            , lambda b: gameData.displayTypeLocalization[b.productSO.productDisplayType.value]),
+            ColumnDefinition("#/display"          , lambda b: b.productSO.productAmountOnDisplay),
+        ]
+
+        self.sections.append(LicensesReportSection("licenses", "Next unlockable licenses", fg.brightgreen, unlockableLicenses, licenseColumns,
+                                                   productsData, productColumns, lambda b: product_base_record(b) | {
+            "minPrice": b.productSO.minDynamicPrice,
+            "maxPrice": b.productSO.maxDynamicPrice,
+            "perBox": b.productSO.productAmountOnPurchase,
+            "boxSize": b.productSO.boxSize.name.lower(),
+            "boxesPerStorageSlot": gameData.boxes.byBoxSize[b.productSO.boxSize].boxCountInStorage,
+            "display": gameData.displayTypeLocalization[b.productSO.productDisplayType.value],
+            "perDisplay": b.productSO.productAmountOnDisplay,
+        }, lambda l: {
+            "investment": licensePlan[l.id].estimate.investment,
+            "dailyProfit": licensePlan[l.id].estimate.dailyProfit,
+            "paybackDays": as_json_days(licensePlan[l.id].estimate.paybackDays),
+            "buyOrder": licensePlan[l.id].order,
+            "buyInDays": as_json_days(licensePlan[l.id].day),
+        }))
+        section = self.sections[-1]
+        section.notes.append((fg.green, f"Sorted by payback time of the license and a first box of each product, with {customerModel.customersPerDay:g} customers per day. "
+                                        "Buy order with the money after bills and the estimated profit of the store."))
+        if any(s.estimate.unknownPrices > 0 for s in licensePlan.values()):
+            section.notes.append((fg.green, "*: some buying prices are not in the save, the middle of the price range is used."))
+
+        # #############################################################################
+        # ########################### Display slots to move ###########################
+        # #############################################################################
+
+        allocations = [a for a in DisplayPlanner(productsData, profitModel).plan() if a.proposedSlots != a.currentSlots]
+        allocations.sort(key=lambda a: (a.product.productSO.productDisplayType.value, a.currentSlots - a.proposedSlots, a.product.get_by_license_sort_key()))
+
+        section = ReportSection("displaySlots", "Display slots to reassign", fg.blue, allocations, [
+            ColumnDefinition("Name"     , lambda a: a.product.localizedName),
+            ColumnDefinition("Brand"    , lambda a: a.product.productSO.brand),
+            ColumnDefinition("Display"  , lambda a: gameData.displayTypeLocalization[a.product.productSO.productDisplayType.value]),
+            ColumnDefinition("Max/slot" , lambda a: a.product.productSO.productAmountOnDisplay, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Sales/day", lambda a: f"{a.salesPerDay:.1f}", alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Slots"    , lambda a: f"{a.currentSlots} -> {a.proposedSlots}", alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Change"   , lambda a: f"{a.proposedSlots - a.currentSlots:+d}" if a.proposedSlots > 0 else "remove",
+                                          lambda a: fg.brightgreen if a.proposedSlots > a.currentSlots else fg.red, alignment=TextAlignment.RIGHT),
+        ], lambda a: a.product.productSO.id, lambda a: product_base_record(a.product) | {
+            "display": gameData.displayTypeLocalization[a.product.productSO.productDisplayType.value],
+            "salesPerDay": a.salesPerDay,
+            "currentSlots": a.currentSlots,
+            "proposedSlots": a.proposedSlots,
+        })
+        section.notes.append((fg.green, "Slots shared between the products of each display type, to lose the fewest sales to empty shelves with the fewest refills. "
+                                        "The furnitures that never held a product are not counted. "
+                                        "Each product keeps a slot, unless there are fewer slots than products of its display type."))
+        self.sections.append(section)
+
+        # #############################################################################
+        # ########################### Cash-flow projection ############################
+        # #############################################################################
+
+        projection = CashFlowProjection(saveData, licensePlanner.get_store_daily_profit(), cashFlowHorizon)
+        scenarios = [
+            projection.project("Pay the bills only"),
+            projection.project("Buy the urgent boxes", productListBuySum),
+            projection.project("Buy all the boxes", productListBuySum + productListNonUrgentSum),
+        ]
+        for license in unlockableLicenses[:3]:
+            estimate = licensePlan[license.id].estimate
+            scenarios.append(projection.project(f"Buy license {license.id} (#{licensePlan[license.id].order})", estimate.investment,
+                                                licensePlanner.get_store_daily_profit_change(license)))
+        middleDay = (cashFlowHorizon + 1) // 2
+
+        section = ReportSection("cashFlow", f"Money over the next {cashFlowHorizon} days", fg.brightblue, scenarios, [
+            ColumnDefinition("Scenario"            , lambda c: c.name),
+            ColumnDefinition("Cost now"            , lambda c: as_price(c.upfrontCost), alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Profit/day"          , lambda c: f"{'+' if c.dailyProfitChange >= 0 else ''}{as_price(c.dailyProfitChange)}", alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Now"                 , lambda c: as_price(c.balances[0]), alignment=TextAlignment.RIGHT),
+            ColumnDefinition(f"Day +{middleDay}"   , lambda c: as_price(c.balances[middleDay]), alignment=TextAlignment.RIGHT),
+            ColumnDefinition(f"Day +{cashFlowHorizon}", lambda c: as_price(c.balances[-1]), lambda _: fg.boldcyan, alignment=TextAlignment.RIGHT),
+            ColumnDefinition("Lowest"              , lambda c: f"{as_price(c.lowest)} (day +{c.lowestDay})",
+                                                     lambda c: fg.red if c.lowest < 0 else "", alignment=TextAlignment.RIGHT),
+        ], lambda c: c.name, lambda c: {
+            "scenario": c.name,
+            "upfrontCost": c.upfrontCost,
+            "dailyProfitChange": c.dailyProfitChange,
+            "balances": c.balances,
+            "lowest": c.lowest,
+            "shortOfMoneyDay": c.shortDay,
+        })
+        section.summary |= {"horizon": cashFlowHorizon, "storeDailyProfit": projection.storeDailyProfit,
+                            "dailyWages": projection.dailyWages, "dailyExpenses": projection.dailyExpenses}
+        section.notes.append((fg.green, f"Estimated profit of the store {as_price(projection.storeDailyProfit)}/day, "
+                                        f"cashier wages {as_price(projection.dailyWages)}/day, bills and rents {as_price(projection.dailyExpenses)}/day on average."))
+        self.sections.append(section)
+
+
+    def render(self, screenWidth: int = None) -> str:
+        """Renders the whole report for the console, as a single string."""
+        if screenWidth is None:
+            screenWidth = ConsoleTable.get_screen_width()
+        lines: list[str] = []
+        for section in self.sections:
+            if section.is_shown():
+                lines += section.render(screenWidth)
+        return "\n".join(lines)
+
+    def print(self):
+        print(self.render())
+
+    def to_json(self) -> dict:
+        return {s.key: s.to_json() for s in self.sections}
@@ -0,0 +1,249 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+from typing import Union
+
+from report import Report
+
+
+
+def compute_report_delta(previous: dict, current: dict) -> dict:
+    """Computes the changes between two JSON reports (as returned by Report.to_json()).
+
+    Only the sections that changed are present in the delta. For each of them, the delta
+    contains the changed rows ("upserted"), the ids of the removed rows ("removed"), the new
+    order of the rows if it changed ("order") and the title, notes and summary if they changed."""
+    delta = {}
+    for key, section in current.items():
+        prevSection = previous.get(key, {"rows": {}})
+        prevRows = prevSection["rows"]
+        rows = section["rows"]
+        sectionDelta = {}
+        for field in ("title", "notes", "summary"):
+            if prevSection.get(field) != section[field]:
+                sectionDelta[field] = section[field]
+        upserted = {rowId: row for rowId, row in rows.items() if prevRows.get(rowId) != row}
+        if len(upserted) > 0:
+            sectionDelta["upserted"] = upserted
+        removed = [rowId for rowId in prevRows if rowId not in rows]
+        if len(removed) > 0:
+            sectionDelta["removed"] = removed
+        if list(prevRows.keys()) != list(rows.keys()):
+            sectionDelta["order"] = list(rows.keys())
+        if len(sectionDelta) > 0:
+            delta[key] = sectionDelta
+    for key in previous:
+        if key not in current:
+            delta[key] = {"removed": list(previous[key]["rows"].keys()), "order": []}
+    return delta
+
+
+
+class ReportMessages:
+    """The NDJSON lines describing one refresh of the report.
+    They are serialized at most once, whatever the number of outputs and clients."""
+
+    def __init__(self, refresh: int, previousJson: Union[dict, None], reportJson: dict):
+        self.refresh = refresh
+        self.previousJson = previousJson
+        self.reportJson = reportJson
+        self._full: str = None
+        self._delta: str = None
+
+    def get_full(self) -> str:
+        """The whole report."""
+        if self._full is None:
+            self._full = json.dumps({"type": "report", "refresh": self.refresh, "sections": self.reportJson}, ensure_ascii=False)
+        return self._full
+
+    def get_delta(self) -> str:
+        """The changes since the previous refresh, or the whole report for the first refresh."""
+        if self.previousJson is None:
+            return self.get_full()
+        if self._delta is None:
+            self._delta = json.dumps({"type": "delta", "refresh": self.refresh, "sections": compute_report_delta(self.previousJson, self.reportJson)}, ensure_ascii=False)
+        return self._delta
+
+    def get(self, deltas: bool) -> str:
+        return self.get_delta() if deltas else self.get_full()
+
+
+
+class ReportStream:
+    """Publishes each refresh of the report as NDJSON lines to a set of outputs.
+
+    Each refresh is published as a 'report' line containing the whole report, or, if
+    deltas are enabled, as a 'delta' line only containing the changes since the previous
+    refresh (see compute_report_delta()). Outputs that start listening late always receive
+    a whole report first: they register their new clients under the lock held while a
+    refresh is published, so a client gets the deltas that follow the report it received."""
+
+    def __init__(self, deltas: bool = False):
+        self.deltas = deltas
+        self.refreshCount = 0
+        self.lastMessages: ReportMessages = None
+        self.outputs: list["ReportOutput"] = []
+        self.lock = threading.Lock()
+
+    def add_output(self, output: "ReportOutput"):
+        self.outputs.append(output)
+        output.stream = self
+
+    def publish(self, report: Report):
+        self.publish_json(report.to_json())
+
+    def publish_json(self, reportJson: dict):
+        with self.lock:
+            self.refreshCount += 1
+            previousJson = self.lastMessages.reportJson if self.lastMessages is not None else None
+            self.lastMessages = ReportMessages(self.refreshCount, previousJson, reportJson)
+            for output in self.outputs:
+                output.send(self.lastMessages)
+
+    def close(self):
+        for output in self.outputs:
+            output.close()
+
+
+
+class ReportOutput:
+    """Destination of the lines of a ReportStream."""
+
+    def __init__(self):
+        self.stream: ReportStream = None
+
+    def send(self, messages: ReportMessages):
+        pass
+
+    def close(self):
+        pass
+
+
+
+class StdoutReportOutput(ReportOutput):
+
+    def send(self, messages: ReportMessages):
+        sys.stdout.write(messages.get(self.stream.deltas) + "\n")
+        sys.stdout.flush()
+
+
+
+class SocketClient:
+    """A client of a socket output. The lines are sent by a thread of the client, from a bounded queue, so a
+    slow client doesn't stall the refreshes. A client that falls more than maxPending lines behind is dropped."""
+
+    def __init__(self, sock: socket.socket, maxPending: int = 8):
+        self.sock = sock
+        self.queue: queue.Queue[str] = queue.Queue(maxPending)
+        self.closed = False
+        threading.Thread(target=self.write_loop, name="report-socket-client", daemon=True).start()
+
+    def push(self, line: str) -> bool:
+        """Queues a line. Return False if the client is closed, or dropped because it is too far behind."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(line)
+            return True
+        except queue.Full:
+            self.close()
+            return False
+
+    def write_loop(self):
+        while not self.closed:
+            line = self.queue.get()
+            if line is None:
+                break
+            try:
+                self.sock.sendall((line + "\n").encode("utf-8"))
+            except OSError:
+                break
+        self.closed = True
+        self.sock.close()
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR) # interrupts a blocked send
+        except OSError:
+            pass
+        try:
+            self.queue.put_nowait(None) # wakes up the thread if it waits for a line
+        except queue.Full:
+            pass
+
+
+
+class UnixSocketReportOutput(ReportOutput):
+    """Listens on a local Unix socket. Each connected client receives the last whole
+    report on connection, then every refresh."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("Unix sockets are not supported on this platform.")
+        self.path = path
+        if os.path.exists(path):
+            os.remove(path) # left by a previous run
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+        self.clients: list[SocketClient] = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self.accept_loop, name="report-socket", daemon=True).start()
+
+    def accept_loop(self):
+        while True:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return # server closed
+            client = SocketClient(sock)
+            if self.stream is None:
+                with self.lock:
+                    self.clients.append(client)
+                continue
+            with self.stream.lock: # no refresh is published between the whole report and the registration
+                messages = self.stream.lastMessages
+                if messages is not None and not client.push(messages.get_full()):
+                    continue
+                with self.lock:
+                    self.clients.append(client)
+
+    def send(self, messages: ReportMessages):
+        line = messages.get(self.stream.deltas)
+        with self.lock:
+            self.clients = [c for c in self.clients if c.push(line)]
+
+    def close(self):
+        self.server.close()
+        with self.lock:
+            for c in self.clients:
+                c.close()
+            self.clients = []
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,171 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import heapq
+import random
+from collections import deque
+
+from products import Product, ProductsData
+from salessimulator import CustomerModel, SalesSimulator, poisson_inverse
+
+
+
+class Shelf:
+    """State of the display slots of a product during a simulated day, and of its boxes in the storage racks."""
+
+    def __init__(self, product: Product):
+        self.product = product
+        self.perSlot = product.productSO.productAmountOnDisplay
+        self.initialSlots = product.get_nb_displayed_items_per_slot()
+        self.initialBoxes = [n for slot in product.get_nb_items_in_stored_boxes() for n in slot if n > 0]
+        self.purchaseProbability = min(100.0, product.get_purchase_chance()) / 100
+        self.reset()
+
+    def reset(self):
+        self.slots = list(self.initialSlots)
+        self.boxes = list(self.initialBoxes)
+        self.items = sum(self.slots)
+        self.restockQueued = False
+        self.emptyTime: float = None # when the last item is taken, or when a customer finds the slots already empty
+        self.soldItems = 0
+        self.missedSales = 0
+
+    def needs_restock(self) -> bool:
+        """Restockers refill a product when one of its slots is less than half full, if there are boxes in storage."""
+        return len(self.boxes) > 0 and any(n * 2 < self.perSlot for n in self.slots)
+
+    def take_item(self):
+        for i, n in enumerate(self.slots):
+            if n > 0:
+                self.slots[i] = n - 1
+                self.items -= 1
+                return
+
+    def refill(self):
+        """Fills the slots from the boxes in storage, the emptiest box first like a player emptying the opened boxes."""
+        self.boxes.sort()
+        for i, n in enumerate(self.slots):
+            while n < self.perSlot and len(self.boxes) > 0:
+                moved = min(self.perSlot - n, self.boxes[0])
+                n += moved
+                self.items += moved
+                if moved == self.boxes[0]:
+                    self.boxes.pop(0)
+                else:
+                    self.boxes[0] -= moved
+            self.slots[i] = n
+
+
+
+class ShelfPrediction:
+    """What happened to the shelf of a product over the simulated days."""
+
+    def __init__(self, shelf: Shelf, days: int, emptyDays: int, emptyTimeSum: float, soldSum: int, missedSum: int):
+        self.product = shelf.product
+        self.emptyProbability = emptyDays / days
+        self.averageEmptyTime = emptyTimeSum / emptyDays if emptyDays > 0 else None # fraction of the day
+        self.expectedSales = soldSum / days
+        self.expectedMissedSales = missedSum / days
+
+
+
+class RestockerSimulator:
+    """Discrete-event simulation of the customers and the restockers during a game day, on the real display slots
+    and stored boxes of the save, to tell which shelves will be empty before they are refilled.
+
+    The customers come at random times during the day and take items from the display slots (same model as the
+    sales forecast). When a slot of a product is less than half full, the product is queued for the restockers.
+    A free restocker takes the first product of the queue, and refills all its slots from its boxes in the storage
+    racks after restockTime. Without restockers, nothing is refilled during the day. The times are fractions of
+    the day, and the events of a day are processed in time order with a heap."""
+
+    def __init__(self, customerModel: CustomerModel, days: int = 100, restockTime: float = 0.01, seed: int = None):
+        self.customerModel = customerModel
+        self.days = days
+        self.restockTime = restockTime # from taking a product in the queue to its refilled slots
+        self.seed = seed
+
+    def simulate_day(self, shelves: list[Shelf], nbRestockers: int, rng: random.Random):
+        for shelf in shelves:
+            shelf.reset()
+        customers = poisson_inverse(self.customerModel.customersPerDay, rng.random())
+        arrivals = sorted(rng.random() for _ in range(customers))
+        queue: deque[Shelf] = deque()
+        freeRestockers = nbRestockers
+        refills: list[tuple[float, int, Shelf]] = [] # (time, sequence, shelf) of the restockers at work
+        sequence = 0
+
+        def request_restock(shelf: Shelf, time: float):
+            nonlocal freeRestockers, sequence
+            if shelf.restockQueued or nbRestockers == 0 or not shelf.needs_restock():
+                return
+            shelf.restockQueued = True
+            if freeRestockers > 0:
+                freeRestockers -= 1
+                sequence += 1
+                heapq.heappush(refills, (time + self.restockTime, sequence, shelf))
+            else:
+                queue.append(shelf)
+
+        for shelf in shelves:
+            request_restock(shelf, 0.0)
+        for arrival in arrivals:
+            while len(refills) > 0 and refills[0][0] <= arrival:
+                time, _, shelf = heapq.heappop(refills)
+                shelf.refill()
+                shelf.restockQueued = False
+                freeRestockers += 1
+                if len(queue) > 0:
+                    freeRestockers -= 1
+                    sequence += 1
+                    heapq.heappush(refills, (time + self.restockTime, sequence, queue.popleft()))
+                request_restock(shelf, time)
+            for _ in range(poisson_inverse(self.customerModel.productsPerCustomer, rng.random())):
+                shelf = shelves[rng.randrange(len(shelves))]
+                if rng.random() >= shelf.purchaseProbability:
+                    continue
+                if shelf.items == 0:
+                    shelf.missedSales += 1
+                    if shelf.emptyTime is None:
+                        shelf.emptyTime = arrival
+                    continue
+                shelf.take_item()
+                shelf.soldItems += 1
+                if shelf.items == 0 and shelf.emptyTime is None:
+                    shelf.emptyTime = arrival
+                request_restock(shelf, arrival)
+
+    def predict(self, productsData: ProductsData) -> list[ShelfPrediction]:
+        shelves = [Shelf(p) for p in SalesSimulator.get_simulated_products(productsData)]
+        if len(shelves) == 0:
+            return []
+        nbRestockers = len(productsData.saveData.employees.restockers)
+        rng = random.Random(self.seed)
+        totals = [[0, 0.0, 0, 0] for _ in shelves] # empty days, sum of the empty times, sold items, missed sales
+        for _ in range(self.days):
+            self.simulate_day(shelves, nbRestockers, rng)
+            for shelf, total in zip(shelves, totals):
+                if shelf.emptyTime is not None:
+                    total[0] += 1
+                    total[1] += shelf.emptyTime
+                total[2] += shelf.soldItems
+                total[3] += shelf.missedSales
+        return [ShelfPrediction(shelf, self.days, *total) for shelf, total in zip(shelves, totals)]
@@ -0,0 +1,215 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import math
+import os
+import random
+
+from products import Product, ProductsData
+
+
+
+class CustomerModel:
+    """How the customers come to the store during a game day.
+
+    The number of customers of a day follows a Poisson distribution of mean customersPerDay.
+    Each customer looks for productsPerCustomer products on average, picked uniformly among the
+    products on display, and takes each of them with its purchase chance at the shelf price."""
+
+    def __init__(self, customersPerDay: float = 150, productsPerCustomer: float = 3):
+        self.customersPerDay = customersPerDay
+        self.productsPerCustomer = productsPerCustomer
+
+
+
+class ProductProfitModel:
+    """Daily profit of the products from the customer model, without simulating the days: each product on display
+    receives an equal share of the customer visits, is bought with its purchase chance at the recommended price, and
+    its sales are limited by what the shelves hold during a day (one display slot, and one storage slot if restockers
+    refill it). Shared by the license planner and the display planner."""
+
+    def __init__(self, productsData: ProductsData, customerModel: CustomerModel):
+        self.productsData = productsData
+        self.customerModel = customerModel
+        self.hasRestockers = len(productsData.saveData.employees.restockers) > 0
+        self.profitTerms: dict[int, tuple[float, int, float]] = {} # by product id
+
+    def get_visits_per_product(self, nbDisplayedProducts: int) -> float:
+        return self.customerModel.customersPerDay * self.customerModel.productsPerCustomer / max(1, nbDisplayedProducts)
+
+    def get_profit_terms(self, product: Product) -> tuple[float, int, float]:
+        """The sales of a product per customer visit, the number of items the shelves hold during a day, and the profit per sale.
+        The daily profit for v visits is min(v * salesPerVisit, capacity) * margin."""
+        terms = self.profitTerms.get(product.productSO.id)
+        if terms is None:
+            pSO = product.productSO
+            price = product.get_recommended_price()
+            capacity = pSO.productAmountOnDisplay
+            if self.hasRestockers:
+                capacity += self.productsData.gameData.boxes.byBoxSize[pSO.boxSize].boxCountInStorage * pSO.productAmountOnPurchase
+            terms = (min(100.0, product.get_purchase_chance_of_sell_price(price)) / 100, capacity, price - product.currentPrice)
+            self.profitTerms[pSO.id] = terms
+        return terms
+
+
+
+class SalesEstimate:
+    """Simulated sales of one product during a day, at one price."""
+
+    def __init__(self, product: Product, price: float, days: int, soldSum: int, soldSquareSum: int, stockOutDays: int):
+        self.product = product
+        self.price = price
+        self.expectedSales = soldSum / days
+        self.salesStdDev = math.sqrt(max(0.0, soldSquareSum / days - self.expectedSales ** 2))
+        self.stockOutProbability = stockOutDays / days # a customer wanted the product after the shelf was empty
+        self.expectedRevenue = self.expectedSales * price
+        self.expectedProfit = self.expectedSales * (price - product.currentPrice)
+
+
+
+class SalesForecast:
+    """Simulated sales of the products on display, at their current price and at the recommended price."""
+
+    def __init__(self, customerModel: CustomerModel, days: int, current: list[SalesEstimate], recommended: list[SalesEstimate]):
+        self.customerModel = customerModel
+        self.days = days
+        self.current = current
+        self.recommended = recommended
+
+    def get_rows(self) -> list[tuple[SalesEstimate, SalesEstimate]]:
+        return list(zip(self.current, self.recommended))
+
+
+
+def poisson_inverse(mean: float, u: float) -> int:
+    """The value of a Poisson distribution of the provided mean at the quantile u.
+    Drawing with the inverse of the distribution allows to use the same random number for
+    several means, so the price scenarios are compared on the same simulated customers."""
+    if mean >= 30:
+        from statistics import NormalDist # only imported when needed, it takes a noticeable part of the startup time
+        return max(0, round(mean + math.sqrt(mean) * NormalDist().inv_cdf(max(u, 1e-12)))) # normal approximation
+    k = 0
+    p = math.exp(-mean)
+    cumulated = p
+    while u > cumulated and p > 0:
+        k += 1
+        p *= mean / k
+        cumulated += p
+    return k
+
+def simulate_days(purchaseProbabilities: list[list[float]], stocks: list[int], customersPerDay: float, productsPerCustomer: float,
+                  days: int, seed: int) -> list[list[tuple[int, int, int]]]:
+    """Simulates days of sales, for each price scenario (one purchase probability per product).
+    Return, for each scenario and each product, the sum of the sold items, the sum of their squares, and the number of days with a stock-out.
+    Module level function, to be called in a worker process."""
+    rng = random.Random(seed)
+    nbProducts = len(stocks)
+    results = [[[0, 0, 0] for _ in range(nbProducts)] for _ in purchaseProbabilities]
+    visitsPerCustomer = productsPerCustomer / nbProducts
+    for _ in range(days):
+        customers = poisson_inverse(customersPerDay, rng.random())
+        visits = customers * visitsPerCustomer
+        for i in range(nbProducts):
+            u = rng.random()
+            stock = stocks[i]
+            for scenario, probabilities in enumerate(purchaseProbabilities):
+                # the wishes of a product follow a Poisson distribution, and so do the purchases among them
+                demand = poisson_inverse(visits * probabilities[i], u)
+                sold = demand if demand < stock else stock
+                result = results[scenario][i]
+                result[0] += sold
+                result[1] += sold * sold
+                if demand > stock:
+                    result[2] += 1
+    return [[tuple(r) for r in scenario] for scenario in results]
+
+
+
+class SalesSimulator:
+    """Monte Carlo estimation of the sales of the next game day, from the purchase chance curves of the products.
+
+    The days are split between worker processes when there are enough to simulate. The process pool
+    is kept between two forecasts, call close() when the simulator is not needed anymore."""
+
+    # below this number of product-days, the simulation is faster than starting the worker processes
+    PARALLEL_MIN_WORK = 200_000
+
+    def __init__(self, customerModel: CustomerModel, days: int = 5000, workers: int = None, seed: int = None):
+        self.customerModel = customerModel
+        self.days = days
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.seed = seed
+        self.pool = None
+
+    @staticmethod
+    def get_simulated_products(productsData: ProductsData) -> list[Product]:
+        """The products that can be sold: the unlocked products with at least one display slot."""
+        return [p for p in productsData.unlocked if len(p.displaySlots) > 0]
+
+    @staticmethod
+    def get_available_stock(product: Product, hasRestockers: bool) -> int:
+        """Items that can be sold during the day: the displayed items, and the items in the storage racks if restockers refill the shelves."""
+        stock = product.get_nb_displayed_items()
+        if hasRestockers:
+            stock += product.get_nb_stored_items()
+        return stock
+
+    def forecast(self, productsData: ProductsData) -> SalesForecast:
+        products = SalesSimulator.get_simulated_products(productsData)
+        hasRestockers = len(productsData.saveData.employees.restockers) > 0
+        prices = [[p.selling_price() for p in products], [p.get_recommended_price() for p in products]]
+        probabilities = [[min(100.0, p.get_purchase_chance_of_sell_price(price)) / 100 for p, price in zip(products, scenarioPrices)]
+                         for scenarioPrices in prices]
+        stocks = [SalesSimulator.get_available_stock(p, hasRestockers) for p in products]
+
+        results = self.run(probabilities, stocks)
+
+        estimates = [[SalesEstimate(p, price, self.days, *result) for p, price, result in zip(products, scenarioPrices, scenarioResults)]
+                     for scenarioPrices, scenarioResults in zip(prices, results)]
+        return SalesForecast(self.customerModel, self.days, estimates[0], estimates[1])
+
+    def run(self, probabilities: list[list[float]], stocks: list[int]) -> list[list[tuple[int, int, int]]]:
+        """Runs the simulation of all the days, split between the worker processes if it's worth it."""
+        model = self.customerModel
+        seed = self.seed if self.seed is not None else random.randrange(1 << 32)
+        if len(stocks) == 0:
+            return [[] for _ in probabilities]
+        if self.workers <= 1 or self.days * len(stocks) * len(probabilities) < SalesSimulator.PARALLEL_MIN_WORK:
+            return simulate_days(probabilities, stocks, model.customersPerDay, model.productsPerCustomer, self.days, seed)
+
+        if self.pool is None:
+            from concurrent.futures import ProcessPoolExecutor # only imported when needed, it takes a noticeable part of the startup time
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        chunks = [self.days // self.workers + (1 if i < self.days % self.workers else 0) for i in range(self.workers)]
+        futures = [self.pool.submit(simulate_days, probabilities, stocks, model.customersPerDay, model.productsPerCustomer, days, seed + i)
+                   for i, days in enumerate(chunks) if days > 0]
+        results = [[[0, 0, 0] for _ in stocks] for _ in probabilities]
+        for future in futures:
+            for scenario, scenarioResults in enumerate(future.result()):
+                for i, result in enumerate(scenarioResults):
+                    for k in range(3):
+                        results[scenario][i][k] += result[k]
+        return [[tuple(r) for r in scenario] for scenario in results]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,138 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import os
+import time
+from pathlib import Path
+from typing import Union
+
+
+
+class SaveFileEntry:
+    """A file of the save directory, as seen during the last listing of the directory."""
+
+    def __init__(self, path: Path, mtime: float, size: int):
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+
+
+
+class SaveDirectoryIndex:
+    """Keeps track of the save files present in a directory, without globing and sorting
+    the whole directory every time we need the last save.
+
+    While the modification time of the directory does not change, no file was added, removed or renamed,
+    so refresh() only checks the newest save, that the game rewrites in place. Otherwise, and at least every
+    fullScanInterval seconds to see the other files rewritten in place, it lists the directory with os.scandir
+    (that provides the file metadata for free on Windows) and only updates the entries that have changed."""
+
+    def __init__(self, directory: Path, suffix: str = ".es3", fullScanInterval: float = 5.0):
+        self.directory = directory
+        self.suffix = suffix
+        self.fullScanInterval = fullScanInterval
+        self.entries: dict[str, SaveFileEntry] = {}
+        self.newest: SaveFileEntry = None
+        self.sortedHistory: list[SaveFileEntry] = None # lazily sorted from newest to oldest
+        self.directoryMtime: int = None # of the last full scan, in nanoseconds
+        self.lastFullScan = 0.0
+
+    def refresh(self) -> bool:
+        """Update the index from the current content of the directory.
+        Return True if any entry was added, modified or removed."""
+        try:
+            directoryMtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            directoryMtime = None
+        now = time.monotonic()
+        if directoryMtime is not None and directoryMtime == self.directoryMtime and now - self.lastFullScan < self.fullScanInterval:
+            return self.refresh_newest()
+        self.directoryMtime = directoryMtime
+        self.lastFullScan = now
+        return self.refresh_all()
+
+    def refresh_newest(self) -> bool:
+        """Update the newest entry only, the directory listing is not changed."""
+        entry = self.newest
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(entry.path)
+        except OSError:
+            return self.refresh_all() # removed, the directory will be listed again
+        if entry.mtime == stat.st_mtime and entry.size == stat.st_size:
+            return False
+        wentBack = stat.st_mtime < entry.mtime
+        entry.mtime = stat.st_mtime
+        entry.size = stat.st_size
+        if wentBack:
+            self.newest = max(self.entries.values(), key=lambda e: e.mtime, default=None)
+        self.sortedHistory = None
+        return True
+
+    def refresh_all(self) -> bool:
+        """Update the index from a listing of the directory."""
+        try:
+            with os.scandir(self.directory) as it:
+                scanned = {e.name: e for e in it if e.name.endswith(self.suffix) and e.is_file()}
+        except OSError:
+            scanned = {}
+
+        changed = False
+        newestRemoved = False
+        for name in [n for n in self.entries if n not in scanned]:
+            newestRemoved |= self.entries.pop(name) is self.newest
+            changed = True
+
+        for name, dirEntry in scanned.items():
+            try:
+                stat = dirEntry.stat()
+            except OSError:
+                continue # removed since the listing
+            entry = self.entries.get(name)
+            if entry is not None and entry.mtime == stat.st_mtime and entry.size == stat.st_size:
+                continue
+            if entry is None:
+                entry = SaveFileEntry(Path(dirEntry.path), stat.st_mtime, stat.st_size)
+                self.entries[name] = entry
+            else:
+                newestRemoved |= entry is self.newest and stat.st_mtime < entry.mtime
+                entry.mtime = stat.st_mtime
+                entry.size = stat.st_size
+            if self.newest is None or entry.mtime > self.newest.mtime:
+                self.newest = entry
+            changed = True
+
+        if newestRemoved:
+            # only happens when the newest save is deleted or goes back in time
+            self.newest = max(self.entries.values(), key=lambda e: e.mtime, default=None)
+        if changed:
+            self.sortedHistory = None
+        return changed
+
+    def get_newest(self) -> Union[SaveFileEntry, None]:
+        return self.newest
+
+    def get_history(self) -> list[SaveFileEntry]:
+        """All the indexed save files, from the newest to the oldest."""
+        if self.sortedHistory is None:
+            self.sortedHistory = sorted(self.entries.values(), key=lambda e: -e.mtime)
+        return self.sortedHistory
@@ -18,26 +18,39 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import copy
+from enum import Enum
 from pathlib import Path
 from typing import Union
 
 from es3json import load_es3_json_file
 from gamedata import GameData
+from savedirectory import SaveDirectoryIndex
 
 
 class Expense:
-    def __init__(self, data, gameData: GameData):
+    def __init__(self, data, saveData: "SaveData"):
+        self.saveData = saveData
         self.date = int(data["Date"])
         self.amount = float(data["Amount"])
-        self.paymentType = gameData.playerPaymentTypeEnum(int(data["PaymentType"]))
+        self.paymentTypeId = int(data["PaymentType"])
         self.latePaymentFee = float(data["LatePaymentFee"])
 
+    def get_amount_to_pay(self, currentDay: int) -> float:
+        """The amount, and the late payment fee if the expense is from a previous day."""
+        return self.amount + (self.latePaymentFee if self.date < currentDay else 0.0)
+
+    @property
+    def paymentType(self) -> Enum:
+        # resolved through the save data so the game data can be swapped without rebuilding the expenses
+        return self.saveData.gameData.playerPaymentTypeEnum(self.paymentTypeId)
+
 class SaveDataExpenses:
-    def __init__(self, data, gameData: GameData):
+    def __init__(self, data, saveData: "SaveData"):
         data = data["value"]
-        self.bills:          list[Expense] = [Expense(d, gameData) for d in data["Bills"]]
-        self.rents:          list[Expense] = [Expense(d, gameData) for d in data["Rents"]]
-        self.loanRepayments: list[Expense] = [Expense(d, gameData) for d in data["LoanRepayments"]]
+        self.bills:          list[Expense] = [Expense(d, saveData) for d in data["Bills"]]
+        self.rents:          list[Expense] = [Expense(d, saveData) for d in data["Rents"]]
+        self.loanRepayments: list[Expense] = [Expense(d, saveData) for d in data["LoanRepayments"]]
 
 
 
@@ -125,36 +138,45 @@ class SaveDataEmployees:
 class SaveData:
 
     saveDir: Path = Path.home().joinpath("AppData", "LocalLow", "Nokta Games", "Supermarket Simulator")
+    saveDirIndex: SaveDirectoryIndex = SaveDirectoryIndex(saveDir)
 
     def __init__(self, data, mtime: float, gameData: GameData):
         self.rawData = data
         self.modificationTime: float = mtime
+        self.gameData = gameData
 
-        self.expenses = SaveDataExpenses(data["Expenses"], gameData)
+        self.expenses = SaveDataExpenses(data["Expenses"], self)
         self.price = SaveDataPrice(data["Price"])
         self.progression = SaveDataProgression(data["Progression"])
         self.employees = SaveDataEmployees(data["Employees"])
 
+    def with_game_data(self, gameData: GameData) -> "SaveData":
+        """A copy of this save data that uses another game data instance, without parsing the save data again.
+        Every game data dependant value of the save data is resolved through this reference. This instance is
+        not modified, as it may be read by another thread (the precomputation of the next day)."""
+        saveData = copy.copy(self)
+        saveData.gameData = gameData
+        saveData.expenses = SaveDataExpenses(self.rawData["Expenses"], saveData) # the expenses resolve the game data through their save data
+        return saveData
+
 
     @staticmethod
-    def from_file(path: Path, gameData: GameData):
-        return SaveData(load_es3_json_file(path), path.stat().st_mtime, gameData)
+    def from_file(path: Path, gameData: GameData, es3Password: str = None):
+        return SaveData(load_es3_json_file(path, es3Password), path.stat().st_mtime, gameData)
     
     @staticmethod
     def get_last_save_path() -> Union[Path, None]:
-        saves = [f for f in SaveData.saveDir.glob("*.es3")]
-        saves = sorted(saves, key=lambda f: -f.stat().st_mtime)
-        if len(saves) == 0:
-            return None
-        return saves[0]
+        SaveData.saveDirIndex.refresh()
+        newest = SaveData.saveDirIndex.get_newest()
+        return None if newest is None else newest.path
 
     
     @staticmethod
-    def from_live_game_savedir(gameData: GameData):
+    def from_live_game_savedir(gameData: GameData, es3Password: str = None):
         savePath = SaveData.get_last_save_path()
         if savePath is None:
             print("No savefile found in game save folder")
             return None
-        return SaveData.from_file(savePath, gameData)
+        return SaveData.from_file(savePath, gameData, es3Password)
 
 
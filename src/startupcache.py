@@ -0,0 +1,116 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import marshal
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Any, Union
+
+from es3json import FileFingerprint
+
+
+
+class StartupCache:
+    """Files kept between two runs, to show something as soon as possible on startup:
+    - the parsed content of the game data file, that only changes with the game updates,
+      so it is not parsed again on each launch, and its secondary indexes;
+    - the last screen printed in the console, shown while the current save is loaded.
+
+    The cache is only an optimization: any error while reading or writing it is ignored."""
+
+    GAME_DATA_FILE = "game-data.cache"
+    LAST_SCREEN_FILE = "last-screen.txt"
+
+    # magic, format version, python version (marshal is not stable across versions), file size, file digest
+    _HEADER = struct.Struct("<4sBBBQ16s")
+    _MAGIC = b"SMAC"
+    _FORMAT_VERSION = 2
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    @staticmethod
+    def get_default_directory() -> Path:
+        if sys.platform == "win32" and "LOCALAPPDATA" in os.environ:
+            return Path(os.environ["LOCALAPPDATA"]).joinpath("SupermarketAssistant")
+        if "XDG_CACHE_HOME" in os.environ:
+            return Path(os.environ["XDG_CACHE_HOME"]).joinpath("SupermarketAssistant")
+        return Path.home().joinpath(".cache", "SupermarketAssistant")
+
+    @staticmethod
+    def _make_header(fingerprint: FileFingerprint) -> bytes:
+        return StartupCache._HEADER.pack(StartupCache._MAGIC, StartupCache._FORMAT_VERSION,
+                                         sys.version_info.major, sys.version_info.minor, fingerprint.size, fingerprint.digest)
+
+    def _write(self, name: str, content: bytes):
+        """Writes the file in one go, so a concurrent reader never sees a partial file."""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory.joinpath(name)
+            tmpPath = path.with_name(path.name + ".tmp")
+            tmpPath.write_bytes(content)
+            os.replace(tmpPath, path)
+        except OSError:
+            pass
+
+    # ### Game data
+
+    def has_game_data(self, fingerprint: FileFingerprint) -> bool:
+        """Tells if the parsed content of the game data file with the provided fingerprint is cached, without loading it."""
+        try:
+            with open(self.directory.joinpath(StartupCache.GAME_DATA_FILE), "rb") as fp:
+                return fp.read(StartupCache._HEADER.size) == StartupCache._make_header(fingerprint)
+        except OSError:
+            return False
+
+    def load_game_data(self, fingerprint: FileFingerprint) -> Union[tuple[Any, Any], None]:
+        """The cached parsed content of the game data file with the provided fingerprint and its indexes, or None."""
+        try:
+            content = self.directory.joinpath(StartupCache.GAME_DATA_FILE).read_bytes()
+            header = StartupCache._make_header(fingerprint)
+            if not content.startswith(header):
+                return None
+            raw, indexesRaw = marshal.loads(memoryview(content)[len(header):])
+            return raw, indexesRaw
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def store_game_data(self, fingerprint: FileFingerprint, raw: Any, indexesRaw: Any):
+        try:
+            content = marshal.dumps((raw, indexesRaw))
+        except ValueError:
+            return # unsupported types, should not happen with the parsed ES3 files
+        self._write(StartupCache.GAME_DATA_FILE, StartupCache._make_header(fingerprint) + content)
+
+    # ### Last screen
+
+    def load_screen(self) -> Union[tuple[int, str], None]:
+        """The last screen printed in the console, with the terminal width it was rendered for, or None."""
+        try:
+            columns, text = self.directory.joinpath(StartupCache.LAST_SCREEN_FILE).read_text(encoding="utf-8").split("\n", 1)
+            return int(columns), text
+        except (OSError, ValueError):
+            return None
+
+    def store_screen(self, columns: int, text: str):
+        self._write(StartupCache.LAST_SCREEN_FILE, f"{columns}\n{text}".encode("utf-8"))
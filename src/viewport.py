@@ -0,0 +1,300 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import re
+import shutil
+import signal
+import sys
+import time
+
+from ansi.colour import fg, fx
+
+from consolekeys import KeyReader
+from report import Report, ReportSection
+from startupcache import StartupCache
+
+
+
+def get_sort_key(text: str) -> tuple:
+    """Sort key of a cell text: numeric cells (prices, percentages, counts) are sorted by value, before the other texts."""
+    m = _NUMBER_IN_TEXT.match(text)
+    if m is not None:
+        return (0, float(m.group(1)), text)
+    return (1, 0.0, text.lower())
+
+_NUMBER_IN_TEXT = re.compile(r"\s*(-?[0-9]+(?:\.[0-9]+)?)")
+
+
+
+class TerminalResizeWatcher:
+    """Detects the resizing of the terminal, with the SIGWINCH signal when available,
+    or by comparing the terminal size on each call otherwise (Windows)."""
+
+    def __init__(self):
+        self.lastSize = shutil.get_terminal_size((120, 40))
+        self.resized = False
+        if hasattr(signal, "SIGWINCH"):
+            signal.signal(signal.SIGWINCH, self.on_resize)
+            self.usesSignal = True
+        else:
+            self.usesSignal = False
+
+    def on_resize(self, signum, frame):
+        self.resized = True
+
+    def has_resized(self) -> bool:
+        """Return True if the terminal was resized since the last call."""
+        if self.usesSignal and not self.resized:
+            return False
+        self.resized = False
+        size = shutil.get_terminal_size((120, 40))
+        if size == self.lastSize:
+            return False
+        self.lastSize = size
+        return True
+
+
+
+class ConsoleReportView:
+    """Non-interactive console view of the report: the whole report is printed, and printed
+    again from the last report (without analyzing the save again) when the terminal is resized."""
+
+    def __init__(self, cache: StartupCache = None):
+        self.report: Report = None
+        self.resizeWatcher = TerminalResizeWatcher()
+        self.cache = cache # the last screen is saved to be shown on the next startup
+
+    def set_report(self, report: Report):
+        self.report = report
+        self.draw()
+
+    def idle(self, timeout: float):
+        """Watches the terminal size during the provided time. To use while waiting for a file update."""
+        end = time.monotonic() + timeout
+        while True:
+            if self.resizeWatcher.has_resized():
+                self.draw()
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 0.05))
+
+    def draw(self):
+        if self.report is None:
+            return
+        columns = self.resizeWatcher.lastSize.columns
+        text = self.report.render(columns)
+        print("\033c", end="")
+        print(text)
+        if self.cache is not None:
+            self.cache.store_screen(columns, text)
+
+
+
+class SectionViewState:
+    """How a section of the report is shown in the viewport. Kept between two reports."""
+
+    def __init__(self):
+        self.collapsed = False
+        self.scroll = 0
+        self.sortColumn: int = None
+        self.sortDescending = False
+
+
+
+class ReportViewport:
+    """Interactive console view of a report: sections can be collapsed, long tables are
+    scrolled and only their visible rows are rendered, rows can be sorted and filtered.
+
+    Everything is computed from the last report, key presses never reload or analyze the save."""
+
+    def __init__(self):
+        self.report: Report = None
+        self.states: dict[str, SectionViewState] = {}
+        self.selected = 0 # index in the shown sections
+        self.filter = ""
+        self.editingFilter = False
+        self.quitRequested = False
+        self.resizeWatcher = TerminalResizeWatcher()
+
+    def set_report(self, report: Report):
+        self.report = report
+        self.selected = min(self.selected, max(len(self.get_sections()) - 1, 0))
+        self.draw()
+
+    def get_sections(self) -> list[ReportSection]:
+        return [s for s in self.report.sections if s.is_shown()] if self.report is not None else []
+
+    def get_state(self, section: ReportSection) -> SectionViewState:
+        if section.key not in self.states:
+            self.states[section.key] = SectionViewState()
+        return self.states[section.key]
+
+    def get_texts(self, section: ReportSection, index: int) -> list[str]:
+        return section.get_row_texts(section.rows[index]) # cached by the section
+
+    def get_visible_row_indexes(self, section: ReportSection) -> list[int]:
+        """Indexes of the rows of the section after filtering and sorting."""
+        state = self.get_state(section)
+        indexes = list(range(len(section.rows)))
+        if self.filter != "":
+            f = self.filter.lower()
+            indexes = [i for i in indexes if any(f in t.lower() for t in self.get_texts(section, i))]
+        if state.sortColumn is not None:
+            indexes.sort(key=lambda i: get_sort_key(self.get_texts(section, i)[state.sortColumn]), reverse=state.sortDescending)
+        return indexes
+
+
+
+    def idle(self, timeout: float):
+        """Handles the key presses during the provided time. To use while waiting for a file update."""
+        end = time.monotonic() + timeout
+        with KeyReader() as keys:
+            while True:
+                key = keys.read_key(min(max(end - time.monotonic(), 0), 0.1))
+                if key is not None:
+                    while key is not None:
+                        self.handle_key(key)
+                        if self.quitRequested:
+                            raise KeyboardInterrupt()
+                        key = keys.read_key(0) # process the pending keys before drawing
+                    self.draw()
+                elif self.resizeWatcher.has_resized():
+                    self.draw()
+                if time.monotonic() >= end:
+                    return
+
+    def handle_key(self, key: str):
+        sections = self.get_sections()
+        if len(sections) == 0:
+            if key == "q":
+                self.quitRequested = True
+            return
+        section = sections[self.selected]
+        state = self.get_state(section)
+        pageSize = self.get_page_size(shutil.get_terminal_size((120, 40)).lines)
+
+        if self.editingFilter:
+            if key == "enter":
+                self.editingFilter = False
+            elif key == "escape":
+                self.editingFilter = False
+                self.filter = ""
+            elif key == "backspace":
+                self.filter = self.filter[:-1]
+            elif len(key) == 1 and key.isprintable():
+                self.filter += key
+            for s in sections:
+                self.get_state(s).scroll = 0
+            return
+
+        if key == "q":
+            self.quitRequested = True
+        elif key in ("tab", "right"):
+            self.selected = (self.selected + 1) % len(sections)
+        elif key in ("backtab", "left"):
+            self.selected = (self.selected - 1) % len(sections)
+        elif key in ("enter", " "):
+            state.collapsed = not state.collapsed
+        elif key == "c":
+            for s in sections:
+                self.get_state(s).collapsed = True
+        elif key == "e":
+            for s in sections:
+                self.get_state(s).collapsed = False
+        elif key == "up":
+            state.scroll -= 1
+        elif key == "down":
+            state.scroll += 1
+        elif key == "pageup":
+            state.scroll -= pageSize
+        elif key == "pagedown":
+            state.scroll += pageSize
+        elif key == "home":
+            state.scroll = 0
+        elif key == "end":
+            state.scroll = len(section.rows)
+        elif key == "s":
+            nbColumns = len(section.columns)
+            state.sortColumn = 0 if state.sortColumn is None else (state.sortColumn + 1 if state.sortColumn + 1 < nbColumns else None)
+        elif key == "r":
+            state.sortDescending = not state.sortDescending
+        elif key == "/":
+            self.editingFilter = True
+        elif key == "escape":
+            self.filter = ""
+
+
+
+    def get_page_size(self, screenHeight: int) -> int:
+        """Number of rows shown for the selected section."""
+        return max(screenHeight - 12, 3)
+
+    def render(self, screenWidth: int, screenHeight: int) -> str:
+        sections = self.get_sections()
+        lines: list[str] = []
+        selectedStart = 0
+        pageSize = self.get_page_size(screenHeight)
+        for i, section in enumerate(sections):
+            state = self.get_state(section)
+            isSelected = i == self.selected
+            if isSelected:
+                selectedStart = len(lines)
+            head = section.render_head()
+            marker = "[+]" if state.collapsed else "[-]"
+            head[0] = (f"{fx.inverse}" if isSelected else "") + f"{marker} {head[0]}"
+            indexes = self.get_visible_row_indexes(section)
+            if state.collapsed:
+                lines.append(head[0] + f"{fg.gray} ({len(indexes)} rows){fx.reset}")
+                continue
+            lines += head
+            # other sections only show their first rows, the selected one uses the remaining space
+            visibleCount = pageSize if isSelected else 5
+            state.scroll = max(min(state.scroll, len(indexes) - visibleCount), 0)
+            shownIndexes = indexes[state.scroll:state.scroll + visibleCount]
+            if len(shownIndexes) > 0 or section.alwaysShown:
+                lines += section.render_rows([section.rows[r] for r in shownIndexes], screenWidth)
+            hidden = len(indexes) - len(shownIndexes)
+            if hidden > 0:
+                lines.append(f"{fg.gray}  rows {state.scroll + 1}-{state.scroll + len(shownIndexes)} of {len(indexes)}{fx.reset}")
+            lines += section.render_foot()
+            lines.append("")
+
+        # scroll the whole screen so the selected section is visible
+        available = screenHeight - 2
+        if len(lines) > available:
+            start = min(selectedStart, len(lines) - available)
+            lines = lines[start:start + available]
+
+        sortState = self.get_state(sections[self.selected]) if len(sections) > 0 else SectionViewState()
+        sortText = "none" if sortState.sortColumn is None else \
+            sections[self.selected].columns[sortState.sortColumn].header + (" desc" if sortState.sortDescending else " asc")
+        filterText = f"{self.filter}_" if self.editingFilter else (self.filter if self.filter != "" else "none")
+        lines.append(f"{fg.gray}[Tab/←→] section  [Enter] collapse  [c/e] collapse/expand all  [↑↓ PgUp PgDn] scroll  "
+                     f"[s/r] sort: {sortText}  [/] filter: {filterText}  [q] quit{fx.reset}")
+        return "\n".join(lines)
+
+    def draw(self):
+        if self.report is None:
+            return
+        size = shutil.get_terminal_size((120, 40))
+        sys.stdout.write("\033[H\033[2J" + self.render(size.columns, size.lines))
+        sys.stdout.flush()
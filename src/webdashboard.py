@@ -0,0 +1,233 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from reportstream import ReportMessages, ReportOutput
+
+
+
+class WebDashboardReportOutput(ReportOutput):
+    """Serves a dashboard page over HTTP, that receives the reports with server-sent events.
+
+    Each connected page receives the whole last report, then only the changes of each refresh.
+    The report is computed and serialized once per refresh, whatever the number of pages."""
+
+    def __init__(self, host: str, port: int):
+        super().__init__()
+        self.clients: list[queue.Queue] = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.create_handler_class())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="web-dashboard", daemon=True).start()
+
+    def get_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{'localhost' if host in ('127.0.0.1', '0.0.0.0') else host}:{port}/"
+
+    def send(self, messages: ReportMessages):
+        line = messages.get_delta()
+        with self.lock:
+            for client in self.clients:
+                client.put(line)
+
+    def close(self):
+        with self.lock:
+            for client in self.clients:
+                client.put(None)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def subscribe(self) -> queue.Queue:
+        client = queue.Queue()
+        with self.lock:
+            messages = self.stream.lastMessages if self.stream is not None else None
+            if messages is not None:
+                client.put(messages.get_full())
+            self.clients.append(client)
+        return client
+
+    def unsubscribe(self, client: queue.Queue):
+        with self.lock:
+            self.clients.remove(client)
+
+    def create_handler_class(self):
+        dashboard = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path == "/":
+                    content = DASHBOARD_PAGE.encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(content)))
+                    self.end_headers()
+                    self.wfile.write(content)
+                elif self.path == "/events":
+                    self.send_events()
+                else:
+                    self.send_error(404)
+
+            def send_events(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                client = dashboard.subscribe()
+                try:
+                    while True:
+                        try:
+                            line = client.get(timeout=15)
+                        except queue.Empty:
+                            self.wfile.write(b": keep-alive\n\n") # also detects closed connections
+                            self.wfile.flush()
+                            continue
+                        if line is None:
+                            return
+                        self.wfile.write(f"data: {line}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                except OSError:
+                    pass # page closed
+                finally:
+                    dashboard.unsubscribe(client)
+
+            def log_message(self, format, *args):
+                pass # don't mess with the console output
+
+        return Handler
+
+
+
+DASHBOARD_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Supermarket Assistant</title>
+<style>
+body { background: #111; color: #ddd; font-family: sans-serif; font-size: 14px; margin: 1em; }
+h2 { font-size: 1.1em; margin: 1.2em 0 0.3em 0; color: #f55; }
+h2.general, h2.licenses { color: #5f5; }
+p { margin: 0.2em 0; color: #5a5; }
+table { border-collapse: collapse; }
+th { text-align: left; color: #58f; padding: 2px 8px; }
+td { padding: 2px 8px; white-space: nowrap; }
+td.number { text-align: right; }
+tr.changed td { animation: changed 3s; }
+@keyframes changed { from { background: #453; } to { background: transparent; } }
+#status { color: #888; font-size: 0.9em; }
+</style>
+</head>
+<body>
+<div id="status">Waiting for the first report...</div>
+<div id="report"></div>
+<script>
+const sections = {};
+const sectionOrder = [];
+
+function formatValue(v) {
+    if (typeof v === "number") return Number.isInteger(v) ? String(v) : v.toFixed(2);
+    if (Array.isArray(v)) return "[" + v.map(formatValue).join(",") + "]";
+    if (v !== null && typeof v === "object") return Object.values(v).map(formatValue).join(" ");
+    return v === null ? "" : String(v);
+}
+
+function applyReport(msg) {
+    for (const key of Object.keys(sections)) delete sections[key];
+    sectionOrder.length = 0;
+    for (const [key, s] of Object.entries(msg.sections)) {
+        sections[key] = { title: s.title, notes: s.notes, summary: s.summary, rows: s.rows, order: Object.keys(s.rows), changed: new Set() };
+        sectionOrder.push(key);
+    }
+}
+
+function applyDelta(msg) {
+    for (const [key, d] of Object.entries(msg.sections)) {
+        let s = sections[key];
+        if (!s) {
+            s = sections[key] = { title: key, notes: [], summary: {}, rows: {}, order: [], changed: new Set() };
+            sectionOrder.push(key);
+        }
+        s.changed = new Set();
+        for (const field of ["title", "notes", "summary"]) if (field in d) s[field] = d[field];
+        for (const [id, row] of Object.entries(d.upserted || {})) { s.rows[id] = row; s.changed.add(id); }
+        for (const id of d.removed || []) delete s.rows[id];
+        if (d.order) s.order = d.order;
+        else s.order = s.order.filter(id => id in s.rows).concat(Object.keys(s.rows).filter(id => !s.order.includes(id)));
+        renderSection(key);
+    }
+}
+
+function renderSection(key) {
+    const s = sections[key];
+    let el = document.getElementById("section-" + key);
+    if (!el) {
+        el = document.createElement("div");
+        el.id = "section-" + key;
+        document.getElementById("report").appendChild(el);
+    }
+    if (s.order.length === 0 && key !== "general") { el.innerHTML = ""; return; }
+    const columns = [];
+    for (const id of s.order) for (const c of Object.keys(s.rows[id])) if (!columns.includes(c)) columns.push(c);
+    const h2 = document.createElement("h2");
+    h2.className = key;
+    h2.textContent = s.title;
+    const table = document.createElement("table");
+    const head = table.insertRow();
+    for (const c of columns) { const th = document.createElement("th"); th.textContent = c; head.appendChild(th); }
+    for (const id of s.order) {
+        const tr = table.insertRow();
+        if (s.changed.has(id)) tr.className = "changed";
+        for (const c of columns) {
+            const td = tr.insertCell();
+            const v = s.rows[id][c];
+            td.textContent = formatValue(v);
+            if (typeof v === "number") td.className = "number";
+        }
+    }
+    el.replaceChildren(h2, ...s.notes.map(n => { const p = document.createElement("p"); p.textContent = n; return p; }), table);
+    for (const [k, v] of Object.entries(s.summary)) if (k === "total") {
+        const p = document.createElement("p");
+        p.textContent = "Total: " + formatValue(v) + "$";
+        el.appendChild(p);
+    }
+}
+
+const events = new EventSource("/events");
+events.onmessage = e => {
+    const msg = JSON.parse(e.data);
+    if (msg.type === "report") {
+        applyReport(msg);
+        document.getElementById("report").innerHTML = "";
+        for (const key of sectionOrder) renderSection(key);
+    } else {
+        applyDelta(msg);
+    }
+    document.getElementById("status").textContent = "Last update: " + new Date().toLocaleTimeString() + " (refresh " + msg.refresh + ")";
+};
+events.onerror = () => document.getElementById("status").textContent = "Disconnected, reconnecting...";
+</script>
+</body>
+</html>
+"""
@@ -0,0 +1,66 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Run with `python -m unittest discover tests` from the root of the repository."""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath("src"))) # the modules of the assistant are imported as top level modules
+
+from cashflow import CashFlowProjection
+
+
+
+class FakeExpense:
+    """Only what the projection reads from an expense."""
+
+    def __init__(self, date: int, amount: float):
+        self.date = date
+        self.amount = amount
+
+
+
+class CashFlowProjectionTest(unittest.TestCase):
+
+    def test_expense_on_a_single_day_is_assumed_daily(self):
+        schedule = CashFlowProjection.get_expense_schedule([FakeExpense(3, 100.0)])
+        self.assertEqual(schedule, (CashFlowProjection.DEFAULT_EXPENSE_PERIOD, 100.0, 3))
+        self.assertEqual(CashFlowProjection.DEFAULT_EXPENSE_PERIOD, 1)
+
+    def test_expense_period_is_the_average_gap_between_its_days(self):
+        schedule = CashFlowProjection.get_expense_schedule([FakeExpense(1, 90.0), FakeExpense(8, 100.0), FakeExpense(15, 100.0)])
+        self.assertEqual(schedule, (7, 100.0, 15))
+
+    def test_amount_is_the_sum_of_the_last_day(self):
+        schedule = CashFlowProjection.get_expense_schedule([FakeExpense(2, 10.0), FakeExpense(4, 12.5), FakeExpense(4, 2.5)])
+        self.assertEqual(schedule, (2, 15.0, 4))
+
+    def test_expenses_come_back_on_the_days_of_their_period(self):
+        schedules = [(7, 100.0, 15), (1, 10.0, 15)]
+        days = {day: CashFlowProjection.get_expenses_of_day(schedules, day) for day in range(15, 23)}
+        self.assertEqual(days, {15: 0.0, 16: 10.0, 17: 10.0, 18: 10.0, 19: 10.0, 20: 10.0, 21: 10.0, 22: 110.0})
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# Copyright (c) 2024 Marc Baloup
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Run with `python -m unittest discover tests` from the root of the repository."""
+
+import random
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath("src"))) # the modules of the assistant are imported as top level modules
+
+from restockersimulator import RestockerSimulator, Shelf
+from salessimulator import CustomerModel
+
+
+
+class FakeProductSO:
+    productAmountOnDisplay = 10
+
+class FakeProduct:
+    """Only what a Shelf reads from a product."""
+
+    def __init__(self, slots: list[int], storedBoxes: list[int]):
+        self.productSO = FakeProductSO()
+        self.slots = slots
+        self.storedBoxes = storedBoxes
+
+    def get_nb_displayed_items_per_slot(self) -> list[int]:
+        return self.slots
+
+    def get_nb_items_in_stored_boxes(self) -> list[list[int]]:
+        return [self.storedBoxes]
+
+    def get_purchase_chance(self) -> float:
+        return 100
+
+
+
+class RestockerSimulatorTest(unittest.TestCase):
+
+    def simulate(self, shelf: Shelf, nbRestockers: int, restockTime: float, days: int = 20) -> list[float]:
+        """The empty time of the shelf on each simulated day."""
+        simulator = RestockerSimulator(CustomerModel(150, 3), restockTime=restockTime)
+        rng = random.Random(1)
+        emptyTimes = []
+        for _ in range(days):
+            simulator.simulate_day([shelf], nbRestockers, rng)
+            emptyTimes.append(shelf.emptyTime)
+        return emptyTimes
+
+    def test_shelf_empty_without_stock_is_empty_from_the_first_missed_sale(self):
+        shelf = Shelf(FakeProduct([0, 0], []))
+        emptyTimes = self.simulate(shelf, 0, 0.01)
+        self.assertTrue(all(t is not None and t > 0 for t in emptyTimes))
+        self.assertGreater(shelf.missedSales, 0)
+
+    def test_shelf_refilled_before_the_first_customer_is_not_empty(self):
+        shelf = Shelf(FakeProduct([0, 0], [1000] * 5))
+        emptyTimes = self.simulate(shelf, 1, 0.0)
+        self.assertEqual(emptyTimes, [None] * len(emptyTimes))
+
+    def test_shelf_emptied_by_the_customers_is_empty_when_the_last_item_is_taken(self):
+        shelf = Shelf(FakeProduct([3, 2], []))
+        emptyTimes = self.simulate(shelf, 0, 0.01)
+        self.assertTrue(all(t is not None for t in emptyTimes))
+        self.assertEqual(shelf.soldItems, 5)
+
+
+
+if __name__ == "__main__":
+    unittest.main()